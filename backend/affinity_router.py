@@ -0,0 +1,195 @@
+"""
+VarunaPoC Affinity Router - Routeur frontal optionnel
+
+Répartiteur ASGI minimal devant plusieurs serveurs Varuna (workers d'un
+hôte ou nœuds): toutes les requêtes d'une lame vont au même backend
+(hachage cohérent sur l'ID de lame), une lame très demandée déborde vers
+les backends suivants de l'anneau (charge bornée, utils/slide_affinity.py).
+
+Pourquoi:
+Avec uvicorn --workers N derrière un load balancer aléatoire, chaque worker
+ouvre les mêmes lames et chauffe les mêmes caches. Un backend par lame
+= un jeu de handles et de tuiles en cache par lame.
+
+Run (un backend par port, le routeur en un seul processus):
+    uvicorn main:app --port 8001 &
+    uvicorn main:app --port 8002 &
+    VARUNA_AFFINITY_BACKENDS=http://127.0.0.1:8001,http://127.0.0.1:8002 \\
+        uvicorn affinity_router:app --port 8000
+
+Configuration (variables d'environnement):
+- VARUNA_AFFINITY_BACKENDS: URLs des backends, séparées par des virgules
+- VARUNA_AFFINITY_LOAD_FACTOR: charge max d'un backend vs moyenne (défaut: 1.25)
+- VARUNA_AFFINITY_TIMEOUT: timeout de lecture d'une réponse backend (s, défaut: 60)
+
+Réponses:
+- X-Varuna-Backend: backend ayant servi la requête
+- X-Varuna-Affinity: home (backend préféré de la lame) | spill (débordement) | none
+- GET /router/status: requêtes en cours, routées et état par backend
+
+Technical Notes:
+- Routes /api/slides/{slide_id}/... routées par lame, autres routes (liste,
+  scan, admin, santé) vers le backend le moins chargé
+- Backend injoignable: écarté 5 s, requête GET/HEAD rejouée sur le suivant
+  de l'anneau; autres méthodes → 502
+- Réponses relayées en streaming (pas de copie complète en mémoire)
+- Alternative sans ce processus: HAProxy "balance uri" + "hash-type consistent"
+  + "hash-balance-factor 125" implémente le même algorithme (voir README)
+"""
+
+import json
+import logging
+import os
+from typing import List, Optional
+
+import httpx
+
+from utils.slide_affinity import AffinityBalancer, slide_id_from_path
+
+logger = logging.getLogger(__name__)
+
+AFFINITY_BACKENDS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("VARUNA_AFFINITY_BACKENDS", "").split(",")
+    if url.strip()
+]
+AFFINITY_LOAD_FACTOR = float(os.environ.get("VARUNA_AFFINITY_LOAD_FACTOR", "1.25"))
+AFFINITY_TIMEOUT = float(os.environ.get("VARUNA_AFFINITY_TIMEOUT", "60"))
+
+# En-têtes propres à une connexion (RFC 9110 §7.6.1), jamais relayés
+HOP_BY_HOP = {
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade", b"host",
+}
+
+REPLAYABLE_METHODS = {"GET", "HEAD"}
+
+
+class AffinityRouter:
+    """
+    Application ASGI relayant chaque requête HTTP vers un backend choisi par lame.
+
+    Technical Notes:
+        - Un client httpx (pool keep-alive) partagé, créé au premier appel,
+          fermé à l'arrêt (protocole lifespan)
+        - Compteurs de charge locaux: lancer le routeur sans --workers
+    """
+
+    def __init__(
+        self,
+        backends: List[str],
+        load_factor: float = AFFINITY_LOAD_FACTOR,
+        timeout: float = AFFINITY_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.balancer = AffinityBalancer(backends, load_factor) if backends else None
+        self.timeout = timeout
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        # WebSocket: non utilisé par Varuna
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.balancer is None:
+                    await send({"type": "lifespan.startup.failed", "message": "VARUNA_AFFINITY_BACKENDS is empty"})
+                    return
+                logger.info(f"Affinity router: {len(self.balancer.ring.nodes)} backends")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        if self.balancer is None:
+            await _reply(send, 503, b"No backend configured (VARUNA_AFFINITY_BACKENDS)")
+            return
+        if scope["path"] == "/router/status":
+            body = json.dumps(self.balancer.status()).encode()
+            await _reply(send, 200, body, b"application/json")
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(self.timeout, connect=2.0),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=64)
+            )
+
+        slide_id = slide_id_from_path(scope["path"])
+        headers = [(name, value) for name, value in scope["headers"] if name.lower() not in HOP_BY_HOP]
+        client = scope.get("client")
+        if client:
+            headers.append((b"x-forwarded-for", client[0].encode()))
+        target = scope["raw_path"].decode("latin-1") if scope.get("raw_path") else scope["path"]
+        if scope.get("query_string"):
+            target += "?" + scope["query_string"].decode("latin-1")
+
+        tried: List[str] = []
+        while True:
+            try:
+                backend, spilled = self.balancer.acquire(slide_id, exclude=tried)
+            except LookupError:
+                await _reply(send, 502, b"No backend reachable")
+                return
+            tried.append(backend)
+            try:
+                request = self._client.build_request(scope["method"], backend + target, headers=headers, content=body)
+                response = await self._client.send(request, stream=True)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                self.balancer.release(backend)
+                self.balancer.mark_down(backend)
+                logger.warning(f"Backend {backend} unreachable: {e}")
+                if scope["method"] in REPLAYABLE_METHODS:
+                    continue
+                await _reply(send, 502, b"Backend unreachable")
+                return
+            except httpx.HTTPError as e:
+                self.balancer.release(backend)
+                logger.warning(f"Backend {backend} failed: {e}")
+                await _reply(send, 504 if isinstance(e, httpx.TimeoutException) else 502, b"Backend error")
+                return
+            break
+
+        try:
+            self.balancer.mark_up(backend)
+            affinity = b"none" if slide_id is None else (b"spill" if spilled else b"home")
+            response_headers = [
+                (name, value) for name, value in response.headers.raw if name.lower() not in HOP_BY_HOP
+            ]
+            response_headers += [(b"x-varuna-backend", backend.encode()), (b"x-varuna-affinity", affinity)]
+            await send({"type": "http.response.start", "status": response.status_code, "headers": response_headers})
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+            self.balancer.release(backend)
+
+
+async def _reply(send, status: int, body: bytes, content_type: bytes = b"text/plain; charset=utf-8"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = AffinityRouter(AFFINITY_BACKENDS)
@@ -0,0 +1,37 @@
+"""
+ASGI Client
+
+Requête GET minimale via l'interface ASGI: benchmarks des routes sans
+serveur HTTP ni client externe (le coût mesuré est celui de l'application).
+"""
+
+from typing import Tuple
+
+
+async def asgi_get(app, path: str, query_string: bytes = b"") -> Tuple[int, int]:
+    """
+    GET `path` sur l'application ASGI.
+
+    Returns:
+        (code HTTP, taille du corps en octets); code 0 si aucune réponse
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query_string, "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 8000),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    response = {"status": 0, "size": 0}
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["size"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["size"]
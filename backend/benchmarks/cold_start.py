@@ -0,0 +1,155 @@
+"""
+Cold Start Benchmark
+
+Mesure le démarrage à froid d'un worker API et échoue au-delà d'un budget.
+
+Mesure (process neuf à chaque essai, comme un worker uvicorn / un scale-out):
+1. Lancement de l'interpréteur
+2. `import main` (toutes les routes et services)
+3. Démarrage du lifespan
+4. Première requête servie (GET /api/health, appel ASGI direct)
+
+Conditions réelles: préchauffage et watcher /Slides actifs sur une
+arborescence synthétique de --tree-dirs dossiers (le coût de démarrage du
+watcher croît avec l'arborescence; il doit rester hors du chemin de la
+première requête).
+
+Vérifie aussi qu'OpenSlide n'est PAS importé au démarrage (import différé,
+voir utils/openslide_loader.py).
+
+Usage (depuis backend/):
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 7 --budget 2.5 --profile
+    python benchmarks/cold_start.py --tree-dirs 20000
+
+Code de sortie:
+    0 si médiane <= budget et OpenSlide non chargé, 1 sinon (utilisable en CI)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from asgi_client import asgi_get
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Budget par défaut: temps jusqu'à la première réponse (secondes)
+DEFAULT_BUDGET = float(os.environ.get("VARUNA_COLD_START_BUDGET", "3.0"))
+DEFAULT_RUNS = 5
+DEFAULT_TREE_DIRS = 5000
+
+
+def run_child():
+    """Process mesuré: import main → lifespan → première requête."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    openslide_at_import = "openslide" in sys.modules
+
+    async def first_request():
+        async with main.app.router.lifespan_context(main.app):
+            lifespan = time.perf_counter()
+            status, _ = await asgi_get(main.app, "/api/health")
+            # Mesuré avant l'arrêt du lifespan (attente des threads d'arrière-plan)
+            return lifespan, status, time.perf_counter()
+
+    lifespan, status, served = asyncio.run(first_request())
+
+    from utils import startup_report
+    print(json.dumps({
+        "import_s": imported - start,
+        "lifespan_s": lifespan - start,
+        "first_request_s": served - start,
+        "status": status,
+        "openslide_at_import": openslide_at_import,
+        "report": startup_report.report(),
+    }))
+
+
+def run_parent(args) -> int:
+    env = dict(os.environ)
+    # Préchauffage et watcher actifs (défauts): ils ne doivent pas retarder la première réponse
+    env.setdefault("VARUNA_ENRICH", "0")
+    if args.profile:
+        env["VARUNA_STARTUP_PROFILE"] = "1"
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env.setdefault("VARUNA_CATALOG_DB", str(Path(tmp) / "catalog.sqlite3"))
+        if "SLIDES_DIR" not in env:
+            env["SLIDES_DIR"] = str(_make_tree(Path(tmp) / "Slides", args.tree_dirs))
+        for _ in range(args.runs):
+            spawn = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, __file__, "--child"],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            wall = time.perf_counter() - spawn
+            result = json.loads(output.strip().splitlines()[-1])
+            result["wall_s"] = wall
+            results.append(result)
+
+    median_wall = statistics.median(r["wall_s"] for r in results)
+    median_import = statistics.median(r["import_s"] for r in results)
+    median_first = statistics.median(r["first_request_s"] for r in results)
+    openslide_loaded = any(r["openslide_at_import"] for r in results)
+    failed_requests = [r["status"] for r in results if r["status"] != 200]
+
+    print(f"Cold start ({args.runs} runs, median, {args.tree_dirs} dirs under {env['SLIDES_DIR']}):")
+    print(f"  import main                  {median_import * 1000:8.1f} ms")
+    print(f"  first request (in-process)   {median_first * 1000:8.1f} ms")
+    print(f"  spawn → first request        {median_wall * 1000:8.1f} ms  (budget {args.budget * 1000:.0f} ms)")
+    print(f"  openslide imported at startup: {openslide_loaded}")
+    slowest = results[-1]["report"]["slowest_imports_ms"]
+    if slowest:
+        print("  slowest imports (last run):")
+        for name, ms in slowest.items():
+            print(f"    {name:<40} {ms:8.1f} ms")
+
+    ok = median_wall <= args.budget and not openslide_loaded and not failed_requests
+    if median_wall > args.budget:
+        print(f"FAIL: cold start {median_wall:.2f}s exceeds budget {args.budget:.2f}s")
+    if openslide_loaded:
+        print("FAIL: openslide imported at startup (should be lazy)")
+    if failed_requests:
+        print(f"FAIL: /api/health returned {failed_requests}")
+    return 0 if ok else 1
+
+
+def _make_tree(root: Path, dirs: int) -> Path:
+    """Arborescence de dossiers vides (sqrt(dirs) dossiers de sqrt(dirs) sous-dossiers)."""
+    width = max(1, int(dirs ** 0.5))
+    for index in range(dirs):
+        (root / f"project_{index // width:04d}" / f"case_{index % width:04d}").mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the API process")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Seconds, spawn to first response")
+    parser.add_argument("--profile", action="store_true", help="Per-module import times (VARUNA_STARTUP_PROFILE=1)")
+    parser.add_argument("--tree-dirs", type=int, default=DEFAULT_TREE_DIRS,
+                        help="Directories in the synthetic /Slides tree (ignored if SLIDES_DIR is set)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return 0
+    return run_parent(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark Report
+
+Éléments communs des rapports JSON de benchmark: contexte d'exécution
+(commit, plateforme, surcharges VARUNA_*) et pic RSS du process.
+"""
+
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_metadata(benchmark: str) -> Dict:
+    """
+    En-tête d'un rapport: de quoi comparer deux runs de commits différents.
+
+    Returns:
+        {"benchmark", "timestamp", "git_commit", "python", "platform", "cpu_count", "env"}
+    """
+    return {
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "env": {key: value for key, value in sorted(os.environ.items()) if key.startswith("VARUNA_")},
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Commit courant (court), suffixé "-dirty" si l'arbre de travail est modifié."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout
+        return commit + ("-dirty" if dirty.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du process courant (Mo), None si indisponible."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: Ko, macOS: octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
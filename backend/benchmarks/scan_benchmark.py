@@ -0,0 +1,434 @@
+"""
+Scan Benchmark
+
+Temps et appels système du scan, du browse et du lookup par ID sur des
+arborescences /Slides synthétiques (benchmarks/synthetic_tree.py).
+
+Phases (chacune dans un process neuf, catalogue SQLite propre à la forme):
+- scan: scan_slides_directory() à froid (index vide → scan complet), à
+  chaud (servi par l'index), puis refresh=True sans aucun changement
+- browse: browse_directory() à froid puis à chaud sur la racine, le dossier
+  le plus large, le plus profond et une série DICOM
+- lookup: get_slide_path_by_id() à froid (process neuf, index existant),
+  à chaud (mémoire), ID inconnu (rescan ciblé) puis ID inconnu répété
+  (cache négatif)
+
+Compteurs par mesure:
+- open / scandir / listdir: hook d'audit Python (sys.addaudithook)
+- stat / lstat: os.stat, os.lstat (pathlib, os.path.exists, ...)
+- entry_stat: DirEntry.stat() des entrées de os.scandir
+- read_syscalls: appels read() du process vus par le noyau (/proc/self/io,
+  Linux uniquement: inclut SQLite et les bibliothèques natives)
+- openslide_detect / openslide_open: OpenSlide.detect_format(), OpenSlide()
+- detections: fichiers passés au détecteur de leur format (après pré-filtre
+  et cache de détection, histogramme DETECTION_SECONDS)
+
+Usage (depuis backend/):
+    python benchmarks/scan_benchmark.py
+    python benchmarks/scan_benchmark.py --shapes wide --slides 2000 --mirax-dat 5000
+    python benchmarks/scan_benchmark.py --output after.json --baseline before.json
+
+Code de sortie:
+    0, ou 1 si --baseline est donné et qu'une mesure régresse (durée au-delà
+    de --tolerance, ou davantage d'appels système / OpenSlide)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from report import BACKEND_DIR, peak_rss_mb, run_metadata
+from synthetic_tree import SHAPES, TreeSpec, ensure_tree
+
+PHASES = ("scan", "browse", "lookup")
+DEFAULT_WORK_DIR = Path(tempfile.gettempdir()) / "varuna-scan-benchmark"
+DEFAULT_LOOKUPS = 200
+
+# Compteurs comparés à la référence (read_syscalls varie avec le cache de pages et SQLite)
+STABLE_COUNTERS = ("open", "scandir", "listdir", "stat", "lstat", "entry_stat", "openslide_detect", "openslide_open")
+
+# Durées trop courtes pour être comparées de façon fiable (secondes)
+MIN_COMPARABLE_SECONDS = 0.002
+
+
+# =============================================================================
+# COMPTEURS (PROCESS ENFANT)
+# =============================================================================
+
+class _CallCounters:
+    """Compteurs d'appels du process, installés une fois avant les mesures."""
+
+    AUDIT_EVENTS = {"open": "open", "os.scandir": "scandir", "os.listdir": "listdir"}
+
+    def __init__(self):
+        self.counts: Dict[str, int] = dict.fromkeys(STABLE_COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def install(self, openslide):
+        events = self.AUDIT_EVENTS
+
+        def audit(event, args):
+            name = events.get(event)
+            if name is not None:
+                self.add(name)
+
+        sys.addaudithook(audit)
+
+        os.stat = self._counted("stat", os.stat)
+        os.lstat = self._counted("lstat", os.lstat)
+
+        scandir = os.scandir
+        counters = self
+
+        def counted_scandir(*args, **kwargs):
+            return _ScandirProxy(scandir(*args, **kwargs), counters)
+
+        os.scandir = counted_scandir
+
+        detect_format = openslide.OpenSlide.detect_format
+        init = openslide.OpenSlide.__init__
+
+        def counted_detect_format(cls, filename):
+            self.add("openslide_detect")
+            return detect_format(filename)
+
+        def counted_init(slide, *args, **kwargs):
+            self.add("openslide_open")
+            init(slide, *args, **kwargs)
+
+        openslide.OpenSlide.detect_format = classmethod(counted_detect_format)
+        openslide.OpenSlide.__init__ = counted_init
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self.counts)
+        counts["read_syscalls"] = _read_syscalls()
+        counts["detections"] = _detections()
+        return counts
+
+    def _counted(self, name: str, func: Callable) -> Callable:
+        def counted(*args, **kwargs):
+            self.add(name)
+            return func(*args, **kwargs)
+        return counted
+
+
+class _ScandirProxy:
+    """Itérateur os.scandir dont les entrées comptent leurs appels à stat()."""
+
+    def __init__(self, iterator, counters: _CallCounters):
+        self._iterator = iterator
+        self._counters = counters
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _EntryProxy(next(self._iterator), self._counters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._iterator.close()
+
+    def close(self):
+        self._iterator.close()
+
+
+class _EntryProxy:
+    """os.DirEntry dont stat() est compté (is_dir/is_file restent sans appel système via d_type)."""
+
+    __slots__ = ("_entry", "_counters")
+
+    def __init__(self, entry, counters: _CallCounters):
+        self._entry = entry
+        self._counters = counters
+
+    def stat(self, *, follow_symlinks: bool = True):
+        self._counters.add("entry_stat")
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def __repr__(self):
+        return repr(self._entry)
+
+
+def _read_syscalls() -> Optional[int]:
+    """Compteur syscr du noyau (un seul pread sur un descripteur ouvert une fois)."""
+    global _proc_io_fd
+    if _proc_io_fd is None:
+        try:
+            _proc_io_fd = os.open("/proc/self/io", os.O_RDONLY)
+        except OSError:
+            _proc_io_fd = -1
+    if _proc_io_fd < 0:
+        return None
+    for line in os.pread(_proc_io_fd, 4096, 0).decode().splitlines():
+        if line.startswith("syscr:"):
+            return int(line.split()[1])
+    return None
+
+
+_proc_io_fd: Optional[int] = None
+
+
+def _detections() -> int:
+    from services.format_detector import DETECTION_SECONDS
+    return sum(count for count, _ in DETECTION_SECONDS.snapshot().values())
+
+
+# =============================================================================
+# PHASES (PROCESS ENFANT)
+# =============================================================================
+
+def run_child(config: Dict):
+    """Une phase sur une arborescence, dans un process neuf; JSON sur stdout."""
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from utils.openslide_loader import get_openslide
+
+    counters = _CallCounters()
+    if config["count"]:
+        _read_syscalls()
+        counters.install(get_openslide())
+
+    measurements = []
+
+    def measure(name: str, func: Callable[[], int]):
+        before = counters.snapshot()
+        start = time.perf_counter()
+        items = func()
+        seconds = time.perf_counter() - start
+        after = counters.snapshot()
+        calls = {
+            key: after[key] - before[key]
+            for key in after
+            if after[key] is not None and before[key] is not None
+        }
+        if "read_syscalls" in calls:
+            # pread de /proc/self/io par le snapshot de fin
+            calls["read_syscalls"] -= 1
+        measurements.append({
+            "phase": config["phase"], "name": name, "seconds": round(seconds, 6), "items": items,
+            "calls": calls if config["count"] else {},
+        })
+
+    root = config["root"]
+    PHASE_RUNNERS[config["phase"]](config, root, measure)
+
+    print(json.dumps({"measurements": measurements, "peak_rss_mb": peak_rss_mb()}))
+
+
+def _phase_index(config: Dict, root: str, measure):
+    """Construit l'index (non mesuré) quand la phase lookup tourne sans la phase scan."""
+    from services.slide_scanner import scan_slides_directory
+    scan_slides_directory(root)
+
+
+def _phase_scan(config: Dict, root: str, measure):
+    from services.slide_scanner import scan_slides_directory
+
+    measure("scan cold", lambda: len(scan_slides_directory(root)))
+    measure("scan warm", lambda: len(scan_slides_directory(root)))
+    measure("scan refresh (unchanged)", lambda: len(scan_slides_directory(root, refresh=True)))
+
+
+def _phase_browse(config: Dict, root: str, measure):
+    from services import folder_browser
+
+    folder_browser.SLIDES_ROOT = Path(root)
+
+    def browse(path: str) -> int:
+        result = folder_browser.browse_directory(path)
+        return len(result["folders"]) + len(result["slides"]) + len(result["files"])
+
+    for label, path in config["browse_targets"]:
+        measure(f"browse {label} cold", lambda: browse(path))
+        measure(f"browse {label} warm", lambda: browse(path))
+
+
+def _phase_lookup(config: Dict, root: str, measure):
+    from services.slide_catalog import slide_catalog
+    from services.slide_scanner import get_slide_path_by_id
+
+    # IDs lus directement dans l'index (non mesuré, ne remplit pas le cache mémoire)
+    slide_ids = [slide["id"] for slide in slide_catalog.list_slides(Path(root).resolve())]
+    slide_ids = slide_ids[:config["lookups"]]
+    unknown = "0" * 32
+
+    def lookup_all() -> int:
+        return sum(get_slide_path_by_id(slide_id, root) is not None for slide_id in slide_ids)
+
+    measure("lookup cold", lookup_all)
+    measure("lookup warm", lookup_all)
+    measure("lookup unknown", lambda: int(get_slide_path_by_id(unknown, root) is not None))
+    measure("lookup unknown repeated", lambda: sum(
+        get_slide_path_by_id(unknown, root) is not None for _ in range(len(slide_ids))
+    ))
+
+
+PHASE_RUNNERS = {
+    "index": _phase_index,
+    "scan": _phase_scan,
+    "browse": _phase_browse,
+    "lookup": _phase_lookup,
+}
+
+
+# =============================================================================
+# ORCHESTRATION (PROCESS PARENT)
+# =============================================================================
+
+def run_parent(args) -> int:
+    work_dir = args.work_dir.resolve()
+    env = dict(os.environ)
+    # Mesure du scan seul: pas de tâches de fond
+    env.setdefault("VARUNA_WARMUP", "0")
+    env.setdefault("VARUNA_WATCH_MODE", "off")
+    env.setdefault("VARUNA_ENRICH", "0")
+
+    trees = {}
+    results = []
+    for shape in args.shapes:
+        spec = TreeSpec(
+            shape=shape, slides=args.slides, depth=args.depth, folders=args.folders,
+            mirax_dat=args.mirax_dat, dicom_instances=args.dicom_instances, seed=args.seed,
+        )
+        manifest = ensure_tree(work_dir, spec, log=lambda line: print(line, file=sys.stderr))
+        trees[shape] = {key: manifest[key] for key in ("spec", "structures", "files")}
+        trees[shape]["folders"] = len(manifest["folders"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            child_env = dict(env, VARUNA_CATALOG_DB=str(Path(tmp) / "catalog.sqlite3"))
+            phases = list(args.phases)
+            if "lookup" in phases and "scan" not in phases:
+                phases.insert(phases.index("lookup"), "index")
+            for phase in phases:
+                config = {
+                    "phase": phase, "root": manifest["root"], "count": not args.no_count,
+                    "lookups": args.lookups, "browse_targets": _browse_targets(manifest),
+                }
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", json.dumps(config)],
+                    env=child_env, capture_output=True, text=True, check=True
+                ).stdout
+                child = json.loads(output.strip().splitlines()[-1])
+                for measurement in child["measurements"]:
+                    result = dict(shape=shape, peak_rss_mb=child["peak_rss_mb"], **measurement)
+                    results.append(result)
+                    if not args.json:
+                        _print_result(result)
+
+    report = {
+        **run_metadata("scan"),
+        "trees": trees,
+        "counted": not args.no_count,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        return _compare(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+    return 0
+
+
+def _browse_targets(manifest: Dict) -> List[List[str]]:
+    """(libellé, chemin relatif) des dossiers parcourus par la phase browse."""
+    targets = [["root", "/"]]
+    if manifest["widest"]:
+        targets.append(["widest", "/" + manifest["widest"]])
+    if manifest["deepest"] and manifest["deepest"] != manifest["widest"]:
+        targets.append(["deepest", "/" + manifest["deepest"]])
+    series = manifest["samples"].get("dicom-series")
+    if series:
+        targets.append(["dicom-series", "/" + series])
+    return targets
+
+
+def _print_result(result: Dict):
+    calls = result["calls"]
+    counted = "  ".join(
+        f"{key} {calls[key]}"
+        for key in ("open", "scandir", "stat", "entry_stat", "read_syscalls", "openslide_detect", "openslide_open", "detections")
+        if calls.get(key)
+    )
+    print(
+        f"{result['shape']:<6} {result['name']:<28} {result['seconds'] * 1000:10.2f} ms  "
+        f"items {result['items']:<6} {counted}"
+    )
+
+
+def _compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> int:
+    """Compare au fichier de référence; 1 si une mesure est plus lente ou fait plus d'appels."""
+    previous = {(r["shape"], r["name"]): r for r in baseline}
+    regressions = 0
+    print(f"\nBaseline comparison (tolerance {tolerance:.0%}):")
+    for result in results:
+        key = (result["shape"], result["name"])
+        before = previous.get(key)
+        if before is None:
+            continue
+        notes = []
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else 1.0
+        if before["seconds"] >= MIN_COMPARABLE_SECONDS and ratio > 1 + tolerance:
+            notes.append(f"time x{ratio:.2f}")
+        for counter in STABLE_COUNTERS:
+            old, new = before["calls"].get(counter), result["calls"].get(counter)
+            if old is not None and new is not None and new > old:
+                notes.append(f"{counter} {old}->{new}")
+        regressions += bool(notes)
+        print(
+            f"  {key[0]:<6} {key[1]:<28} time x{ratio:.2f}"
+            + (f"  REGRESSION ({', '.join(notes)})" if notes else "")
+        )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan / browse / lookup benchmark on synthetic /Slides trees")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--slides", type=int, default=TreeSpec.slides)
+    parser.add_argument("--depth", type=int, default=TreeSpec.depth, help="Nesting depth of the deep shape")
+    parser.add_argument("--folders", type=int, default=TreeSpec.folders, help="Root folders of the wide shape")
+    parser.add_argument("--mirax-dat", type=int, default=TreeSpec.mirax_dat, help="Data*.dat per MIRAX companion dir")
+    parser.add_argument("--dicom-instances", type=int, default=TreeSpec.dicom_instances)
+    parser.add_argument("--lookups", type=int, default=DEFAULT_LOOKUPS, help="Slide IDs resolved per lookup measurement")
+    parser.add_argument("--seed", type=int, default=TreeSpec.seed)
+    parser.add_argument("--no-count", action="store_true", help="Timings only (no call counters installed)")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR, help="Generated trees (reused between runs)")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the table")
+    parser.add_argument("--baseline", type=Path, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return 0
+    return run_parent(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
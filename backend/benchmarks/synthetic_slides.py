@@ -0,0 +1,365 @@
+"""
+Synthetic Slides
+
+Génère des TIFF pyramidaux tuilés (détectés "generic-tiff" par OpenSlide)
+pour les benchmarks: les vraies lames ne peuvent pas être versionnées.
+
+Paramètres (SlideSpec):
+- Dimensions niveau 0, taille de tuile
+- Compression: jpeg (YCbCr 4:2:0, Pillow), deflate (zlib) ou none
+- Fraction de tissu: zones texturées (rose/violet type H&E) sur fond
+  blanc cassé, le reste du slide est du fond (tuiles quasi vides comme
+  sur une vraie lame)
+
+Usage (depuis backend/):
+    python benchmarks/synthetic_slides.py /tmp/Slides --count 3
+    python benchmarks/synthetic_slides.py /tmp/Slides --width 100000 --height 80000 --compression deflate
+
+Technical Notes:
+    - Écriture BigTIFF en flux (tuile par tuile): mémoire constante, pas de
+      limite à 4 Go, aucune dépendance en dehors de Pillow (déjà requis)
+    - Niveaux réduits marqués NewSubfileType=1 (sinon OpenSlide n'en lit
+      que le premier)
+    - Même champ de tissu pour tous les niveaux: le contenu est cohérent
+      d'un niveau à l'autre (zoom réaliste)
+    - Déterministe: même SlideSpec → même fichier (graine)
+"""
+
+import argparse
+import io
+import random
+import struct
+import sys
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from PIL import Image, ImageFilter, ImageOps
+
+COMPRESSIONS = ("jpeg", "deflate", "none")
+
+# Codes TIFF: Compression (259) et PhotometricInterpretation (262)
+_COMPRESSION_CODES = {"none": 1, "jpeg": 7, "deflate": 8}
+_PHOTOMETRIC_RGB = 2
+_PHOTOMETRIC_YCBCR = 6
+
+# Pixels niveau 0 par pixel du champ de tissu
+_FIELD_CELL = 64
+
+# Textures de tissu distinctes (réutilisées, choisies par position de tuile)
+_TEXTURES = 16
+
+_BACKGROUND = (240, 240, 238)
+
+
+@dataclass(frozen=True)
+class SlideSpec:
+    """Paramètres d'une lame synthétique."""
+    width: int = 32768
+    height: int = 24576
+    tile_size: int = 256
+    compression: str = "jpeg"
+    quality: int = 80
+    tissue_fraction: float = 0.4
+    seed: int = 0
+
+    def filename(self) -> str:
+        return (
+            f"synthetic_{self.width}x{self.height}_t{self.tile_size}_{self.compression}"
+            f"_q{self.quality}_tf{round(self.tissue_fraction * 100)}_s{self.seed}.tif"
+        )
+
+    def level_dimensions(self) -> List[Tuple[int, int]]:
+        """Dimensions par niveau (facteur 2) jusqu'à tenir dans une tuile."""
+        levels = [(self.width, self.height)]
+        while max(levels[-1]) > self.tile_size:
+            width, height = levels[-1]
+            levels.append(((width + 1) // 2, (height + 1) // 2))
+        return levels
+
+
+def write_slide(path: Path, spec: SlideSpec) -> Dict:
+    """
+    Écrit une lame synthétique.
+
+    Returns:
+        {"path", "levels", "tiles", "bytes", "seconds"}
+
+    Raises:
+        ValueError: Compression inconnue
+    """
+    if spec.compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {spec.compression!r} (expected one of {COMPRESSIONS})")
+
+    start = time.perf_counter()
+    painter = _TilePainter(spec)
+    levels = spec.level_dimensions()
+    tiles = 0
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with _BigTiffWriter(tmp_path) as writer:
+        for level, (width, height) in enumerate(levels):
+            cols = -(-width // spec.tile_size)
+            rows = -(-height // spec.tile_size)
+            tiles += cols * rows
+            writer.write_level(
+                width, height, spec.tile_size,
+                painter.tiles(2 ** level, cols, rows),
+                compression=_COMPRESSION_CODES[spec.compression],
+                photometric=_PHOTOMETRIC_YCBCR if spec.compression == "jpeg" else _PHOTOMETRIC_RGB,
+                reduced=level > 0,
+                description=f"Varuna synthetic slide {spec.filename()}" if level == 0 else None,
+            )
+    tmp_path.replace(path)
+
+    return {
+        "path": str(path),
+        "levels": levels,
+        "tiles": tiles,
+        "bytes": path.stat().st_size,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def ensure_slides(directory: Path, spec: SlideSpec, count: int = 1, log=None) -> List[Path]:
+    """
+    `count` lames (graines spec.seed .. spec.seed + count - 1) dans `directory`.
+
+    Les fichiers déjà présents (même nom = mêmes paramètres) sont réutilisés.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(count):
+        slide_spec = SlideSpec(**dict(asdict(spec), seed=spec.seed + index))
+        path = directory / slide_spec.filename()
+        if not path.exists():
+            info = write_slide(path, slide_spec)
+            if log:
+                log(
+                    f"Generated {path.name}: {len(info['levels'])} levels, {info['tiles']} tiles, "
+                    f"{info['bytes'] / 1e6:.1f} MB in {info['seconds']:.1f}s"
+                )
+        paths.append(path)
+    return paths
+
+
+# =============================================================================
+# CONTENU DES TUILES
+# =============================================================================
+
+class _TilePainter:
+    """
+    Tuiles encodées d'un niveau, dessinées depuis un champ de tissu basse résolution.
+
+    Technical Notes:
+        - Champ = bruit basse fréquence (deux octaves, amas de tissu), seuillé
+          au quantile qui donne tissue_fraction
+        - Tuile entièrement hors tissu → octets du fond, encodés une seule fois
+        - Bord du tissu: champ rééchantillonné (bilinéaire) puis seuillé,
+          contour lisse à tous les niveaux
+    """
+
+    def __init__(self, spec: SlideSpec):
+        self.spec = spec
+        rng = random.Random(spec.seed)
+        size = spec.tile_size
+
+        field_size = (max(2, -(-spec.width // _FIELD_CELL)), max(2, -(-spec.height // _FIELD_CELL)))
+        coarse = _smooth_noise(rng, field_size, 12)
+        fine = _smooth_noise(rng, field_size, 48)
+        self.field = ImageOps.autocontrast(Image.blend(coarse, fine, 0.3))
+        self.threshold = _threshold_for_fraction(self.field, spec.tissue_fraction)
+        self._lut = [255 if value >= self.threshold else 0 for value in range(256)]
+
+        self.textures = []
+        for _ in range(_TEXTURES):
+            grain = Image.frombytes("L", (size, size), rng.randbytes(size * size))
+            grain = ImageOps.autocontrast(grain.filter(ImageFilter.GaussianBlur(1.2)))
+            self.textures.append(ImageOps.colorize(grain, black=(105, 35, 115), white=(245, 175, 210)))
+
+        self.background = Image.new("RGB", (size, size), _BACKGROUND)
+        self._background_bytes = self._encode(self.background)
+
+    def tiles(self, downsample: int, cols: int, rows: int) -> Iterator[bytes]:
+        """Tuiles encodées, ligne par ligne (ordre TIFF)."""
+        size = self.spec.tile_size
+        cell = size * downsample / _FIELD_CELL
+        for row in range(rows):
+            for col in range(cols):
+                box = (col * cell, row * cell, (col + 1) * cell, (row + 1) * cell)
+                low, high = self.field.crop(tuple(int(v) for v in _expand(box))).getextrema()
+                if high < self.threshold:
+                    yield self._background_bytes
+                    continue
+                texture = self.textures[(col * 7 + row * 13 + downsample) % _TEXTURES]
+                if low >= self.threshold:
+                    yield self._encode(texture)
+                    continue
+                mask = self.field.transform((size, size), Image.Transform.EXTENT, box, Image.Resampling.BILINEAR)
+                yield self._encode(Image.composite(texture, self.background, mask.point(self._lut)))
+
+    def _encode(self, tile: Image.Image) -> bytes:
+        if self.spec.compression == "jpeg":
+            buffer = io.BytesIO()
+            tile.save(buffer, format="JPEG", quality=self.spec.quality, subsampling=2)
+            return buffer.getvalue()
+        if self.spec.compression == "deflate":
+            return zlib.compress(tile.tobytes(), 6)
+        return tile.tobytes()
+
+
+def _smooth_noise(rng: random.Random, size: Tuple[int, int], cells: int) -> Image.Image:
+    """Bruit basse fréquence: `cells` valeurs aléatoires sur la largeur, interpolées (bicubique)."""
+    width, height = size
+    grid = (cells, max(2, round(cells * height / width)))
+    noise = Image.frombytes("L", grid, rng.randbytes(grid[0] * grid[1]))
+    return noise.resize(size, Image.Resampling.BICUBIC)
+
+
+def _threshold_for_fraction(field: Image.Image, fraction: float) -> int:
+    """Seuil tel qu'environ `fraction` des pixels du champ soient >= seuil."""
+    if fraction <= 0:
+        return 256
+    histogram = field.histogram()
+    target = fraction * sum(histogram)
+    above = 0
+    for value in range(255, -1, -1):
+        above += histogram[value]
+        if above >= target:
+            return value
+    return 0
+
+
+def _expand(box: Tuple[float, float, float, float]) -> Tuple[float, float, float, float]:
+    """Boîte élargie d'un pixel (extrema couvrant l'interpolation bilinéaire)."""
+    x0, y0, x1, y1 = box
+    return (x0 - 1, y0 - 1, x1 + 2, y1 + 2)
+
+
+# =============================================================================
+# ÉCRITURE BIGTIFF
+# =============================================================================
+
+# Types TIFF: (code, format struct)
+_SHORT = (3, "H")
+_LONG = (4, "I")
+_LONG8 = (16, "Q")
+_ASCII = (2, "s")
+
+
+class _BigTiffWriter:
+    """
+    BigTIFF tuilé minimal, écrit en flux (un IFD par niveau).
+
+    Technical Notes:
+        - Tuiles écrites au fil de l'eau, IFD (et tableaux d'offsets) après
+          les tuiles du niveau, chaîné depuis l'IFD précédent
+        - JPEG: flux JPEG complets par tuile (pas de JPEGTables partagées)
+    """
+
+    def __init__(self, path: Path):
+        self._file = open(path, "wb")
+        # En-tête: "II", version 43, taille des offsets 8, offset du premier IFD
+        self._file.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, 0))
+        self._next_ifd_pointer = 8
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def write_level(
+        self,
+        width: int,
+        height: int,
+        tile_size: int,
+        tiles: Iterator[bytes],
+        compression: int,
+        photometric: int,
+        reduced: bool,
+        description: str = None
+    ):
+        offsets, counts = [], []
+        for data in tiles:
+            offsets.append(self._file.tell())
+            counts.append(len(data))
+            self._file.write(data)
+
+        tags = [
+            (254, _LONG, [1 if reduced else 0]),        # NewSubfileType
+            (256, _LONG, [width]),                      # ImageWidth
+            (257, _LONG, [height]),                     # ImageLength
+            (258, _SHORT, [8, 8, 8]),                   # BitsPerSample
+            (259, _SHORT, [compression]),               # Compression
+            (262, _SHORT, [photometric]),               # PhotometricInterpretation
+            (277, _SHORT, [3]),                         # SamplesPerPixel
+            (284, _SHORT, [1]),                         # PlanarConfiguration (contig)
+            (322, _LONG, [tile_size]),                  # TileWidth
+            (323, _LONG, [tile_size]),                  # TileLength
+            (324, _LONG8, offsets),                     # TileOffsets
+            (325, _LONG8, counts),                      # TileByteCounts
+        ]
+        if description:
+            tags.append((270, _ASCII, [description.encode("ascii") + b"\0"]))
+        if photometric == _PHOTOMETRIC_YCBCR:
+            tags.append((530, _SHORT, [2, 2]))          # YCbCrSubSampling (4:2:0)
+        self._write_ifd(sorted(tags, key=lambda tag: tag[0]))
+
+    def _write_ifd(self, tags):
+        entries = []
+        for tag, (type_code, fmt), values in tags:
+            if fmt == "s":
+                payload, count = values[0], len(values[0])
+            else:
+                payload, count = struct.pack(f"<{len(values)}{fmt}", *values), len(values)
+            if len(payload) <= 8:
+                value_field = payload.ljust(8, b"\0")
+            else:
+                # Valeurs hors IFD (alignées sur 2 octets)
+                self._align()
+                value_field = struct.pack("<Q", self._file.tell())
+                self._file.write(payload)
+            entries.append(struct.pack("<HHQ", tag, type_code, count) + value_field)
+
+        self._align()
+        ifd_offset = self._file.tell()
+        self._file.write(struct.pack("<Q", len(entries)) + b"".join(entries) + struct.pack("<Q", 0))
+        end = self._file.tell()
+
+        self._file.seek(self._next_ifd_pointer)
+        self._file.write(struct.pack("<Q", ifd_offset))
+        self._file.seek(end)
+        self._next_ifd_pointer = end - 8
+
+    def _align(self):
+        if self._file.tell() % 2:
+            self._file.write(b"\0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic pyramidal TIFF slides (OpenSlide generic-tiff)")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--width", type=int, default=SlideSpec.width)
+    parser.add_argument("--height", type=int, default=SlideSpec.height)
+    parser.add_argument("--tile-size", type=int, default=SlideSpec.tile_size)
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=SlideSpec.compression)
+    parser.add_argument("--quality", type=int, default=SlideSpec.quality, help="JPEG quality")
+    parser.add_argument("--tissue-fraction", type=float, default=SlideSpec.tissue_fraction)
+    parser.add_argument("--seed", type=int, default=SlideSpec.seed)
+    args = parser.parse_args()
+
+    spec = SlideSpec(
+        width=args.width, height=args.height, tile_size=args.tile_size, compression=args.compression,
+        quality=args.quality, tissue_fraction=args.tissue_fraction, seed=args.seed,
+    )
+    for path in ensure_slides(args.directory, spec, args.count, log=print):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+Synthetic Tree
+
+Génère une arborescence /Slides synthétique avec toutes les structures que
+FormatDetector sait reconnaître, pour mesurer scan et browse.
+
+Structures (une "lame" = une structure):
+- generic-tiff, svs, ndpi, bif: TIFF pyramidal tuilé (benchmarks/synthetic_slides.py),
+  lié en dur (pas de copie) sous l'extension du format
+- trestle: TIFF + fichiers adjacents .tif-1b, .tif-2b
+- mirax: sample.mrxs + sample/ (Slidedat.ini, Index.dat, des milliers de Data*.dat)
+- vms / vmu: index INI + tuiles .jpg / .ngr (+ .opt, _macro, _map)
+- dicom-wsi: instances DICOM avec SOP Class WSI (passent le pré-filtre)
+- dicom-series: série de DICOM non-WSI (CT) + DICOMDIR (rejetés par le pré-filtre)
+- czi, zvi, svslide: signatures Zeiss / Sakura
+Plus des fichiers parasites dans chaque dossier (txt, xml, jpg, TIFF en
+strips, fichiers sans extension, .DS_Store, Thumbs.db).
+
+Formes:
+- mixed: Projet/Année/Cas/ (archive réaliste)
+- wide: beaucoup de dossiers sous la racine
+- deep: une chaîne de dossiers imbriqués
+
+Seules les structures TIFF sont de vraies lames; les autres ont des en-têtes
+valides (pré-filtre) mais un contenu factice: OpenSlide les refuse, ce qui
+suffit à compter ses appels et les accès disque.
+
+Usage (depuis backend/):
+    python benchmarks/synthetic_tree.py /tmp/bench/Slides --shape wide --slides 500
+    python benchmarks/synthetic_tree.py /tmp/bench/Slides --mirax-dat 5000 --dicom-instances 2000
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image
+
+from synthetic_slides import SlideSpec, write_slide
+
+STRUCTURES = (
+    "generic-tiff", "svs", "ndpi", "bif", "trestle", "mirax", "vms", "vmu",
+    "dicom-wsi", "dicom-series", "czi", "zvi", "svslide",
+)
+SHAPES = ("mixed", "wide", "deep")
+
+# Poids par défaut: archive dominée par les TIFF et MIRAX, quelques formats rares
+DEFAULT_WEIGHTS = {
+    "generic-tiff": 6, "svs": 4, "ndpi": 3, "bif": 2, "trestle": 1, "mirax": 4, "vms": 1,
+    "vmu": 1, "dicom-wsi": 1, "dicom-series": 1, "czi": 1, "zvi": 1, "svslide": 1,
+}
+
+# SOP Class UIDs: VL Whole Slide Microscopy / CT Image Storage
+_DICOM_WSI_SOP_CLASS = "1.2.840.10008.5.1.4.1.1.77.1.6"
+_DICOM_CT_SOP_CLASS = "1.2.840.10008.5.1.4.1.1.2"
+
+# Lame TIFF source (petite: le scan mesure la détection, pas la lecture des pixels)
+_TEMPLATE_SPEC = SlideSpec(width=2048, height=1536, compression="jpeg", tissue_fraction=0.5)
+
+
+@dataclass(frozen=True)
+class TreeSpec:
+    """Paramètres d'une arborescence synthétique."""
+    shape: str = "mixed"
+    slides: int = 300
+    depth: int = 12             # deep: profondeur de la chaîne
+    folders: int = 200          # wide: dossiers sous la racine
+    mirax_dat: int = 1000       # Data*.dat par dossier compagnon MIRAX
+    dicom_instances: int = 200  # instances par série DICOM non-WSI
+    junk_per_folder: int = 8
+    seed: int = 0
+
+    def key(self) -> str:
+        return (
+            f"{self.shape}_n{self.slides}_d{self.depth}_f{self.folders}_m{self.mirax_dat}"
+            f"_i{self.dicom_instances}_j{self.junk_per_folder}_s{self.seed}"
+        )
+
+
+def generate_tree(root: Path, spec: TreeSpec) -> Dict:
+    """
+    Écrit l'arborescence dans `root` (qui doit être vide ou absent).
+
+    Returns:
+        Manifeste: {"spec", "folders": [chemins relatifs], "structures": {nom: nombre},
+        "samples": {nom: chemin relatif du premier exemplaire}, "deepest", "widest",
+        "files", "seconds"}
+    """
+    if spec.shape not in SHAPES:
+        raise ValueError(f"Unknown shape {spec.shape!r} (expected one of {SHAPES})")
+    if root.exists() and any(root.iterdir()):
+        raise FileExistsError(f"Not empty: {root}")
+
+    start = time.perf_counter()
+    rng = random.Random(spec.seed)
+    root.mkdir(parents=True, exist_ok=True)
+    leaves = _leaf_folders(spec, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = Path(tmp) / "template.tif"
+        write_slide(template, _TEMPLATE_SPEC)
+        writer = _StructureWriter(root, template, spec, rng)
+
+        names = list(DEFAULT_WEIGHTS)
+        weights = [DEFAULT_WEIGHTS[name] for name in names]
+        counts: Dict[str, int] = {}
+        samples: Dict[str, str] = {}
+        for index in range(spec.slides):
+            structure = rng.choices(names, weights)[0]
+            folder = leaves[index % len(leaves)]
+            samples.setdefault(structure, writer.write(structure, folder, f"slide_{index:05d}"))
+            counts[structure] = counts.get(structure, 0) + 1
+
+        folders = sorted({"/".join(leaf.split("/")[:i]) for leaf in leaves for i in range(1, leaf.count("/") + 2)})
+        for folder in [""] + folders:
+            writer.write_junk(folder)
+
+    files = sum(len(names) for _, _, names in os.walk(root))
+    entries_by_folder = {folder: len(os.listdir(root / folder)) for folder in folders}
+    return {
+        "spec": asdict(spec),
+        "folders": folders,
+        "structures": counts,
+        "samples": samples,
+        "deepest": max(folders, key=lambda f: (f.count("/"), f)) if folders else "",
+        "widest": max(entries_by_folder, key=lambda f: (entries_by_folder[f], f)) if folders else "",
+        "files": files,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def ensure_tree(directory: Path, spec: TreeSpec, log=None) -> Dict:
+    """
+    Arborescence `spec` dans `directory`/<clé>/Slides, réutilisée si déjà générée.
+
+    Returns:
+        Manifeste (voir generate_tree) + "root" (chemin absolu de Slides/)
+    """
+    base = directory / spec.key()
+    root = base / "Slides"
+    manifest_path = base / "manifest.json"
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+    else:
+        if root.exists():
+            shutil.rmtree(root)
+        manifest = generate_tree(root, spec)
+        manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
+        if log:
+            log(
+                f"Generated {spec.shape} tree: {spec.slides} slides, {len(manifest['folders'])} folders, "
+                f"{manifest['files']} files in {manifest['seconds']:.1f}s"
+            )
+    manifest["root"] = str(root.resolve())
+    return manifest
+
+
+def _leaf_folders(spec: TreeSpec, rng: random.Random) -> List[str]:
+    """Dossiers qui reçoivent les lames (chemins relatifs, séparateur "/")."""
+    if spec.shape == "wide":
+        return [f"folder_{index:04d}" for index in range(spec.folders)]
+    if spec.shape == "deep":
+        chain = [f"level_{index:02d}" for index in range(spec.depth)]
+        return ["/".join(chain[:depth]) for depth in range(1, spec.depth + 1)]
+
+    leaves = []
+    for project in range(max(1, spec.slides // 60)):
+        for year in range(2019, 2019 + rng.randint(2, 5)):
+            for case in range(rng.randint(3, 8)):
+                leaves.append(f"Project_{project:02d}/{year}/Case_{project:02d}{year % 100:02d}{case:02d}")
+    return leaves
+
+
+class _StructureWriter:
+    """Écriture des fichiers de chaque structure."""
+
+    def __init__(self, root: Path, template: Path, spec: TreeSpec, rng: random.Random):
+        self.root = root
+        self.template = template
+        self.spec = spec
+        self.rng = rng
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), (200, 160, 190)).save(buffer, format="JPEG")
+        self.jpeg = buffer.getvalue()
+        buffer = io.BytesIO()
+        # TIFF en strips (pas de tuiles): rejeté par le pré-filtre
+        Image.new("RGB", (64, 48), (255, 255, 255)).save(buffer, format="TIFF")
+        self.strip_tiff = buffer.getvalue()
+
+    def write(self, structure: str, folder: str, name: str) -> str:
+        """Écrit une structure; retourne le chemin relatif de son point d'entrée (ou de la série DICOM)."""
+        directory = self.root / folder
+        directory.mkdir(parents=True, exist_ok=True)
+        entry = getattr(self, "_" + structure.replace("-", "_"))(directory, name)
+        return entry.relative_to(self.root).as_posix()
+
+    def write_junk(self, folder: str):
+        directory = self.root / folder
+        directory.mkdir(parents=True, exist_ok=True)
+        junk = [
+            ("README.txt", b"Scanned slides\n"),
+            ("metadata.xml", b"<case/>\n"),
+            ("preview.jpg", self.jpeg),
+            ("scan.tif", self.strip_tiff),
+            ("LABEL", b"no extension\n"),
+            (".DS_Store", b"\0" * 64),
+            ("Thumbs.db", b"\0" * 64),
+            ("export.csv", b"id,stain\n"),
+        ]
+        for index in range(self.spec.junk_per_folder):
+            name, data = junk[index % len(junk)]
+            if index >= len(junk):
+                stem, dot, ext = name.partition(".")
+                name = f"{stem}_{index // len(junk)}{dot}{ext}"
+            (directory / name).write_bytes(data)
+
+    # Lames TIFF (vraies lames, liées en dur)
+    def _link(self, target: Path) -> Path:
+        try:
+            os.link(self.template, target)
+        except OSError:
+            shutil.copyfile(self.template, target)
+        return target
+
+    def _generic_tiff(self, directory: Path, name: str) -> Path:
+        return self._link(directory / f"{name}.tif")
+
+    def _svs(self, directory: Path, name: str) -> Path:
+        return self._link(directory / f"{name}.svs")
+
+    def _ndpi(self, directory: Path, name: str) -> Path:
+        return self._link(directory / f"{name}.ndpi")
+
+    def _bif(self, directory: Path, name: str) -> Path:
+        return self._link(directory / f"{name}.bif")
+
+    def _trestle(self, directory: Path, name: str) -> Path:
+        self._link(directory / f"{name}.tif")
+        for index in (1, 2):
+            (directory / f"{name}.tif-{index}b").write_bytes(b"\0" * 128)
+        return directory / f"{name}.tif"
+
+    # Structures multi-fichiers (contenu factice)
+    def _mirax(self, directory: Path, name: str) -> Path:
+        (directory / f"{name}.mrxs").write_bytes(b"\0" * 256)
+        companion = directory / name
+        companion.mkdir()
+        (companion / "Slidedat.ini").write_text("[GENERAL]\nSLIDE_VERSION=01.02\n")
+        (companion / "Index.dat").write_bytes(b"\0" * 256)
+        for index in range(self.spec.mirax_dat):
+            (companion / f"Data{index:04d}.dat").write_bytes(b"")
+        return directory / f"{name}.mrxs"
+
+    def _vms(self, directory: Path, name: str) -> Path:
+        (directory / f"{name}.vms").write_text(
+            f"[Virtual Microscope Specimen]\nNoLayers=1\nImageFile={name}(0,0).jpg\n"
+        )
+        for x, y in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            (directory / f"{name}({x},{y}).jpg").write_bytes(self.jpeg)
+        (directory / f"{name}_macro.jpg").write_bytes(self.jpeg)
+        (directory / f"{name}_map.jpg").write_bytes(self.jpeg)
+        (directory / f"{name}.opt").write_bytes(b"\0" * 64)
+        return directory / f"{name}.vms"
+
+    def _vmu(self, directory: Path, name: str) -> Path:
+        (directory / f"{name}.vmu").write_text(
+            f"[Uncompressed Virtual Microscope Specimen]\nImageFile={name}.ngr\n"
+        )
+        (directory / f"{name}.ngr").write_bytes(b"GN" + b"\0" * 62)
+        return directory / f"{name}.vmu"
+
+    def _dicom_wsi(self, directory: Path, name: str) -> Path:
+        series = directory / f"{name}_wsi"
+        series.mkdir()
+        for index in range(4):
+            (series / f"{index:04d}.dcm").write_bytes(_dicom(_DICOM_WSI_SOP_CLASS, f"1.2.3.{index}"))
+        return series / "0000.dcm"
+
+    def _dicom_series(self, directory: Path, name: str) -> Path:
+        series = directory / f"{name}_ct"
+        series.mkdir()
+        for index in range(self.spec.dicom_instances):
+            (series / f"IM{index:05d}.dcm").write_bytes(_dicom(_DICOM_CT_SOP_CLASS, f"1.2.4.{index}"))
+        (series / "DICOMDIR").write_bytes(_dicom("1.2.840.10008.1.3.10", "1.2.5"))
+        return series
+
+    def _czi(self, directory: Path, name: str) -> Path:
+        path = directory / f"{name}.czi"
+        path.write_bytes(b"ZISRAWFILE" + b"\0" * 502)
+        return path
+
+    def _zvi(self, directory: Path, name: str) -> Path:
+        path = directory / f"{name}.zvi"
+        path.write_bytes(self.rng.randbytes(512))
+        return path
+
+    def _svslide(self, directory: Path, name: str) -> Path:
+        path = directory / f"{name}.svslide"
+        path.write_bytes(b"SQLite format 3\0" + b"\0" * 496)
+        return path
+
+
+def _dicom(sop_class_uid: str, instance_uid: str) -> bytes:
+    """Préambule + méta-header DICOM Part 10 minimal (explicit VR little endian)."""
+    def element(element_number: int, vr: bytes, value: bytes) -> bytes:
+        if len(value) % 2:
+            value += b"\0"
+        return struct.pack("<HH", 0x0002, element_number) + vr + struct.pack("<H", len(value)) + value
+
+    meta = (
+        element(0x0002, b"UI", sop_class_uid.encode())
+        + element(0x0003, b"UI", instance_uid.encode())
+        + element(0x0010, b"UI", b"1.2.840.10008.1.2.1")
+    )
+    group_length = struct.pack("<HH", 0x0002, 0x0000) + b"UL" + struct.pack("<HI", 4, len(meta))
+    return b"\0" * 128 + b"DICM" + group_length + meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic /Slides tree for scan/browse benchmarks")
+    parser.add_argument("directory", type=Path, help="Target directory (must be empty or absent)")
+    parser.add_argument("--shape", choices=SHAPES, default=TreeSpec.shape)
+    parser.add_argument("--slides", type=int, default=TreeSpec.slides)
+    parser.add_argument("--depth", type=int, default=TreeSpec.depth)
+    parser.add_argument("--folders", type=int, default=TreeSpec.folders)
+    parser.add_argument("--mirax-dat", type=int, default=TreeSpec.mirax_dat)
+    parser.add_argument("--dicom-instances", type=int, default=TreeSpec.dicom_instances)
+    parser.add_argument("--junk-per-folder", type=int, default=TreeSpec.junk_per_folder)
+    parser.add_argument("--seed", type=int, default=TreeSpec.seed)
+    args = parser.parse_args()
+
+    spec = TreeSpec(
+        shape=args.shape, slides=args.slides, depth=args.depth, folders=args.folders,
+        mirax_dat=args.mirax_dat, dicom_instances=args.dicom_instances,
+        junk_per_folder=args.junk_per_folder, seed=args.seed,
+    )
+    manifest = generate_tree(args.directory, spec)
+    print(json.dumps({key: manifest[key] for key in ("structures", "samples", "deepest", "widest", "files", "seconds")}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
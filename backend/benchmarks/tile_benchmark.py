@@ -0,0 +1,392 @@
+"""
+Tile Benchmark
+
+Débit et latence du service de tuiles sur des lames synthétiques
+(benchmarks/synthetic_slides.py), avec des parcours de type viewer.
+
+Modes:
+- direct: TileServer.get_tile() appelé depuis N threads (service seul)
+- http: route GET /api/slides/{id}/tiles/{level}/{col}_{row}.jpg via
+  l'interface ASGI, N viewers concurrents (routage, pool de threads des
+  tuiles, Server-Timing inclus)
+
+Parcours (un par viewer, déterministe):
+- pan: déplacement tuile par tuile à un niveau intermédiaire, seules les
+  tuiles qui entrent dans la fenêtre sont demandées
+- zoom: zoom avant jusqu'au niveau 0 autour d'un point, puis zoom arrière
+- random: tuiles uniformément aléatoires (pire cas pour le cache)
+
+Sortie: tuiles/s, latence p50/p95/p99, pic RSS, ratio de cache, par
+(mode, parcours, concurrence). Chaque scénario tourne dans un process neuf
+(caches froids, pic RSS propre au scénario).
+
+Usage (depuis backend/):
+    python benchmarks/tile_benchmark.py
+    python benchmarks/tile_benchmark.py --modes direct --patterns pan --concurrency 1 8 32
+    python benchmarks/tile_benchmark.py --output after.json --baseline before.json
+
+Code de sortie:
+    0, ou 1 si --baseline est donné et qu'un scénario régresse au-delà de
+    --tolerance (débit en baisse ou p95 en hausse)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from report import BACKEND_DIR, peak_rss_mb, run_metadata
+from synthetic_slides import COMPRESSIONS, SlideSpec, ensure_slides
+
+MODES = ("direct", "http")
+PATTERNS = ("pan", "zoom", "random")
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_REQUESTS = 200
+DEFAULT_SLIDES = 3
+DEFAULT_WORK_DIR = Path(tempfile.gettempdir()) / "varuna-tile-benchmark"
+
+# Fenêtre du viewer en tuiles (écran ~1536 x 1024 pour des tuiles de 256)
+VIEWPORT = (6, 4)
+
+# Tuile demandée: (niveau, colonne, ligne)
+TileRequest = Tuple[int, int, int]
+
+
+# =============================================================================
+# PARCOURS
+# =============================================================================
+
+def build_session(
+    pattern: str,
+    levels: List[Tuple[int, int]],
+    tile_size: int,
+    requests: int,
+    rng: random.Random
+) -> List[TileRequest]:
+    """Suite de `requests` tuiles demandées par un viewer sur une lame."""
+    grids = [(-(-width // tile_size), -(-height // tile_size)) for width, height in levels]
+    if pattern == "pan":
+        session = _pan(grids, requests, rng)
+    elif pattern == "zoom":
+        session = _zoom(grids, requests, rng)
+    elif pattern == "random":
+        session = []
+        while len(session) < requests:
+            level = rng.randrange(len(grids))
+            cols, rows = grids[level]
+            session.append((level, rng.randrange(cols), rng.randrange(rows)))
+    else:
+        raise ValueError(f"Unknown pattern {pattern!r}")
+    return session[:requests]
+
+
+def _viewport(level: int, x: int, y: int, width: int, height: int) -> List[TileRequest]:
+    return [(level, col, row) for row in range(y, y + height) for col in range(x, x + width)]
+
+
+def _pan(grids: List[Tuple[int, int]], requests: int, rng: random.Random) -> List[TileRequest]:
+    # Niveau assez grand pour se déplacer (au moins deux fenêtres par axe)
+    candidates = [
+        level for level, (cols, rows) in enumerate(grids)
+        if cols >= 2 * VIEWPORT[0] and rows >= 2 * VIEWPORT[1]
+    ]
+    level = rng.choice(candidates) if candidates else 0
+    cols, rows = grids[level]
+    width, height = min(VIEWPORT[0], cols), min(VIEWPORT[1], rows)
+    x, y = rng.randrange(cols - width + 1), rng.randrange(rows - height + 1)
+
+    session = _viewport(level, x, y, width, height)
+    direction = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+    while len(session) < requests:
+        moves = [
+            (dx, dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= x + dx <= cols - width and 0 <= y + dy <= rows - height
+        ]
+        if not moves:
+            # Lame plus petite que la fenêtre: le viewer redemande la vue
+            session.extend(_viewport(level, x, y, width, height))
+            continue
+        if direction not in moves or rng.random() < 0.3:
+            direction = rng.choice(moves)
+        dx, dy = direction
+        x, y = x + dx, y + dy
+        # Seule la bande qui entre dans la fenêtre est demandée
+        if dx:
+            col = x + width - 1 if dx > 0 else x
+            session.extend((level, col, row) for row in range(y, y + height))
+        else:
+            row = y + height - 1 if dy > 0 else y
+            session.extend((level, col, row) for col in range(x, x + width))
+    return session
+
+
+def _zoom(grids: List[Tuple[int, int]], requests: int, rng: random.Random) -> List[TileRequest]:
+    top = len(grids) - 1
+    session: List[TileRequest] = []
+    while len(session) < requests:
+        target_x, target_y = rng.random(), rng.random()
+        for level in list(range(top, -1, -1)) + list(range(1, top + 1)):
+            cols, rows = grids[level]
+            width, height = min(VIEWPORT[0], cols), min(VIEWPORT[1], rows)
+            x = min(max(0, int(target_x * cols) - width // 2), cols - width)
+            y = min(max(0, int(target_y * rows) - height // 2), rows - height)
+            session.extend(_viewport(level, x, y, width, height))
+    return session
+
+
+# =============================================================================
+# SCÉNARIO (PROCESS ENFANT)
+# =============================================================================
+
+def run_child(config: Dict):
+    """Un scénario (mode, parcours, concurrence) dans un process neuf; JSON sur stdout."""
+    work_dir = Path(config["work_dir"])
+    # Racine des lames du benchmark (lue à l'import de services.slide_catalog)
+    os.environ["SLIDES_DIR"] = str(work_dir / "Slides")
+    run_dir = work_dir / "run"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(run_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from utils.openslide_loader import get_openslide
+
+    openslide = get_openslide()
+    slide_paths = [str(Path(path).resolve()) for path in config["slides"]]
+    levels = []
+    for path in slide_paths:
+        slide = openslide.OpenSlide(path)
+        levels.append(list(slide.level_dimensions))
+        slide.close()
+
+    sessions = []
+    for viewer in range(config["concurrency"]):
+        slide_index = viewer % len(slide_paths)
+        rng = random.Random(f"{config['seed']}:{config['pattern']}:{viewer}")
+        session = build_session(config["pattern"], levels[slide_index], config["tile_size"], config["requests"], rng)
+        sessions.append((slide_index, session))
+
+    if config["mode"] == "direct":
+        latencies, errors, seconds = _run_direct(slide_paths, sessions, config["tile_size"])
+    else:
+        latencies, errors, seconds = asyncio.run(_run_http(slide_paths, sessions))
+
+    from services.tile_server import TILE_REQUESTS
+    hits, misses = TILE_REQUESTS.value(("hit",)), TILE_REQUESTS.value(("miss",))
+
+    print(json.dumps({
+        "mode": config["mode"],
+        "pattern": config["pattern"],
+        "concurrency": config["concurrency"],
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "tiles_per_s": round(len(latencies) / seconds, 1) if seconds else None,
+        "latency_ms": _latency_summary(latencies),
+        "tile_cache_hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def _run_direct(slide_paths: List[str], sessions, tile_size: int) -> Tuple[List[float], int, float]:
+    from services.tile_server import tile_server
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(sessions) + 1)
+
+    def viewer(slide_index: int, session: List[TileRequest]):
+        nonlocal errors
+        path = slide_paths[slide_index]
+        local, failed = [], 0
+        barrier.wait()
+        for level, col, row in session:
+            start = time.perf_counter()
+            tile = tile_server.get_tile(path, level, col, row, tile_size)
+            local.append(time.perf_counter() - start)
+            failed += tile is None
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=viewer, args=session) for session in sessions]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+async def _run_http(slide_paths: List[str], sessions) -> Tuple[List[float], int, float]:
+    from asgi_client import asgi_get
+
+    import main
+    from services.slide_scanner import scan_slides_directory
+
+    latencies: List[float] = []
+    errors = 0
+
+    async with main.app.router.lifespan_context(main.app):
+        ids_by_path = {str(Path(slide["path"]).resolve()): slide["id"] for slide in scan_slides_directory()}
+        slide_ids = [ids_by_path[path] for path in slide_paths]
+
+        async def viewer(slide_index: int, session: List[TileRequest]):
+            nonlocal errors
+            slide_id = slide_ids[slide_index]
+            for level, col, row in session:
+                start = time.perf_counter()
+                status, _ = await asgi_get(main.app, f"/api/slides/{slide_id}/tiles/{level}/{col}_{row}.jpg")
+                latencies.append(time.perf_counter() - start)
+                errors += status != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(viewer(*session) for session in sessions))
+        seconds = time.perf_counter() - start
+    return latencies, errors, seconds
+
+
+def _latency_summary(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {}
+    ms = sorted(value * 1000 for value in latencies)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        "p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+        "mean": round(statistics.fmean(ms), 3), "max": round(ms[-1], 3),
+    }
+
+
+# =============================================================================
+# ORCHESTRATION (PROCESS PARENT)
+# =============================================================================
+
+def run_parent(args) -> int:
+    spec = SlideSpec(
+        width=args.width, height=args.height, tile_size=args.tile_size, compression=args.compression,
+        quality=args.quality, tissue_fraction=args.tissue_fraction, seed=args.seed,
+    )
+    work_dir = args.work_dir.resolve()
+    slides = ensure_slides(work_dir / "Slides", spec, args.slides, log=lambda line: print(line, file=sys.stderr))
+
+    env = dict(os.environ)
+    # Mesure du service de tuiles seul: pas de tâches de fond
+    env.setdefault("VARUNA_WARMUP", "0")
+    env.setdefault("VARUNA_WATCH_MODE", "off")
+    env.setdefault("VARUNA_ENRICH", "0")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env.setdefault("VARUNA_CATALOG_DB", str(Path(tmp) / "catalog.sqlite3"))
+        for mode in args.modes:
+            for pattern in args.patterns:
+                for concurrency in args.concurrency:
+                    config = {
+                        "mode": mode, "pattern": pattern, "concurrency": concurrency,
+                        "requests": args.requests, "seed": args.seed, "tile_size": args.tile_size,
+                        "work_dir": str(work_dir), "slides": [str(path) for path in slides],
+                    }
+                    output = subprocess.run(
+                        [sys.executable, __file__, "--child", json.dumps(config)],
+                        env=env, capture_output=True, text=True, check=True
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    results.append(result)
+                    if not args.json:
+                        _print_result(result)
+
+    report = {
+        **run_metadata("tiles"),
+        "slides": dict(asdict(spec), count=len(slides), levels=len(spec.level_dimensions())),
+        "requests_per_viewer": args.requests,
+        "viewport_tiles": list(VIEWPORT),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        return _compare(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+    return 0
+
+
+def _print_result(result: Dict):
+    latency = result["latency_ms"]
+    hit_ratio = "-" if result["tile_cache_hit_ratio"] is None else f"{result['tile_cache_hit_ratio']:.2f}"
+    print(
+        f"{result['mode']:<7} {result['pattern']:<7} c={result['concurrency']:<3} "
+        f"{result['tiles_per_s']:>9.1f} tiles/s  "
+        f"p50 {latency['p50']:7.2f}  p95 {latency['p95']:7.2f}  p99 {latency['p99']:7.2f} ms  "
+        f"hit {hit_ratio}  rss {result['peak_rss_mb']} MB"
+        + (f"  errors {result['errors']}" if result["errors"] else "")
+    )
+
+
+def _compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> int:
+    """Compare au fichier de référence; 1 si un scénario régresse au-delà de la tolérance."""
+    previous = {(r["mode"], r["pattern"], r["concurrency"]): r for r in baseline}
+    regressions = 0
+    print(f"\nBaseline comparison (tolerance {tolerance:.0%}):")
+    for result in results:
+        key = (result["mode"], result["pattern"], result["concurrency"])
+        before = previous.get(key)
+        if before is None:
+            continue
+        throughput = result["tiles_per_s"] / before["tiles_per_s"]
+        p95 = result["latency_ms"]["p95"] / before["latency_ms"]["p95"]
+        regressed = throughput < 1 - tolerance or p95 > 1 + tolerance
+        regressions += regressed
+        print(
+            f"  {key[0]:<7} {key[1]:<7} c={key[2]:<3} tiles/s x{throughput:.2f}  p95 x{p95:.2f}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tile serving benchmark on synthetic pyramidal slides")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--patterns", nargs="+", choices=PATTERNS, default=list(PATTERNS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Tiles per viewer")
+    parser.add_argument("--slides", type=int, default=DEFAULT_SLIDES, help="Synthetic slides (viewers spread over them)")
+    parser.add_argument("--width", type=int, default=SlideSpec.width)
+    parser.add_argument("--height", type=int, default=SlideSpec.height)
+    parser.add_argument("--tile-size", type=int, default=SlideSpec.tile_size)
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=SlideSpec.compression)
+    parser.add_argument("--quality", type=int, default=SlideSpec.quality, help="JPEG quality of the slide tiles")
+    parser.add_argument("--tissue-fraction", type=float, default=SlideSpec.tissue_fraction)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR, help="Generated slides (reused between runs)")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the table")
+    parser.add_argument("--baseline", type=Path, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return 0
+    return run_parent(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
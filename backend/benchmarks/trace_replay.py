@@ -0,0 +1,353 @@
+"""
+Trace Replay
+
+Rejoue une trace de requêtes de tuiles (utils/tile_trace.py, VARUNA_TILE_TRACE)
+contre un modèle du cache de TileServer, pour chaque combinaison de budget,
+politique d'éviction, taille de tuile et préchargement. Aucun serveur, aucune
+lame: seuls les identifiants et tailles enregistrés sont utilisés.
+
+Modèle (TileServer actuel = --policies lru, --prefetch none, tuiles 256):
+- Cache de tuiles borné en octets (VARUNA_TILE_CACHE_MB), taille de chaque
+  tuile = taille JPEG enregistrée (mise à l'échelle de l'aire si la taille
+  de tuile simulée diffère)
+- Politiques: lru (actuelle), fifo, lfu (LRU entre fréquences égales)
+- Handles OpenSlide: FIFO de --handles lames (actuel: 5), ouvertures comptées
+- Autre taille de tuile: une requête couvre les tuiles simulées qui
+  recouvrent sa région (hit si toutes sont en cache)
+- Préchargement après chaque requête, tuiles non en cache seulement:
+  ring1 / ring2 (voisines au même niveau), pan (3 tuiles devant, dans la
+  direction du dernier déplacement du client)
+- Limites de chaque niveau déduites de la trace (plus grandes col/ligne
+  demandées): pas de préchargement hors lame
+
+Limites:
+- Préchargement supposé terminé avant la requête suivante (borne optimiste)
+- Requêtes hors limites rejouées sans rendu ni cache (comme le serveur)
+
+Usage (depuis backend/):
+    python benchmarks/trace_replay.py tiles.4242.trace.1 tiles.4242.trace
+    python benchmarks/trace_replay.py tiles.4242.trace --cache-mb 64 256 1024 --policies lru lfu
+    python benchmarks/trace_replay.py tiles.4242.trace --tile-sizes 256 512 --prefetch none ring1 pan --json
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.tile_trace import TraceRecord, read_trace  # noqa: E402
+
+POLICIES = ("lru", "fifo", "lfu")
+PREFETCH = ("none", "ring1", "ring2", "pan")
+DEFAULT_CACHE_MB = (64, 256, 1024)
+DEFAULT_HANDLES = 5
+
+# Tuile simulée: (lame, niveau, colonne, ligne)
+TileKey = Tuple[str, int, int, int]
+
+
+# =============================================================================
+# CACHES
+# =============================================================================
+
+class _LRUCache:
+    """Cache borné en octets, éviction du moins récemment utilisé (TileServer)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[TileKey, int]" = OrderedDict()
+
+    def __contains__(self, key: TileKey) -> bool:
+        return key in self._entries
+
+    def touch(self, key: TileKey):
+        self._entries.move_to_end(key)
+
+    def store(self, key: TileKey, size: int) -> List[TileKey]:
+        if size > self.max_bytes or key in self._entries:
+            return []
+        self._entries[key] = size
+        self.bytes += size
+        evicted = []
+        while self.bytes > self.max_bytes:
+            old_key, old_size = self._entries.popitem(last=False)
+            self.bytes -= old_size
+            evicted.append(old_key)
+        self.evictions += len(evicted)
+        return evicted
+
+
+class _FIFOCache(_LRUCache):
+    """Ordre d'insertion seul: un hit ne rajeunit pas la tuile."""
+
+    def touch(self, key: TileKey):
+        pass
+
+
+class _LFUCache:
+    """Éviction de la tuile la moins demandée (la plus ancienne à fréquence égale)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: Dict[TileKey, List[int]] = {}  # {key: [taille, fréquence, dernier accès]}
+        self._heap: List[Tuple[int, int, TileKey]] = []  # Entrées périmées ignorées au pop
+        self._clock = itertools.count()
+
+    def __contains__(self, key: TileKey) -> bool:
+        return key in self._entries
+
+    def touch(self, key: TileKey):
+        entry = self._entries[key]
+        entry[1] += 1
+        entry[2] = next(self._clock)
+        heapq.heappush(self._heap, (entry[1], entry[2], key))
+
+    def store(self, key: TileKey, size: int) -> List[TileKey]:
+        if size > self.max_bytes or key in self._entries:
+            return []
+        tick = next(self._clock)
+        self._entries[key] = [size, 1, tick]
+        heapq.heappush(self._heap, (1, tick, key))
+        self.bytes += size
+        evicted = []
+        while self.bytes > self.max_bytes:
+            frequency, tick, old_key = heapq.heappop(self._heap)
+            entry = self._entries.get(old_key)
+            if entry is None or entry[1] != frequency or entry[2] != tick:
+                continue
+            del self._entries[old_key]
+            self.bytes -= entry[0]
+            evicted.append(old_key)
+        self.evictions += len(evicted)
+        if len(self._heap) > 4 * len(self._entries) + 1024:
+            self._heap = [(entry[1], entry[2], k) for k, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+        return evicted
+
+
+CACHES = {"lru": _LRUCache, "fifo": _FIFOCache, "lfu": _LFUCache}
+
+
+# =============================================================================
+# SIMULATION
+# =============================================================================
+
+def simulate(
+    records: List[TraceRecord],
+    cache_bytes: int,
+    policy: str = "lru",
+    tile_size: int = 256,
+    prefetch: str = "none",
+    handles: int = DEFAULT_HANDLES,
+    bounds: Optional[Dict[Tuple[str, int, int], Tuple[int, int]]] = None
+) -> Dict:
+    """
+    Rejoue `records` contre un cache simulé.
+
+    Returns:
+        {
+            "requests", "hits", "hit_ratio",
+            "rendered": int,            # Tuiles rendues (misses + préchargement)
+            "prefetch_rendered": int,
+            "prefetch_used": int,       # Préchargées puis demandées avant éviction
+            "evictions", "handle_opens"
+        }
+    """
+    bounds = bounds if bounds is not None else trace_bounds(records)
+    cache = CACHES[policy](cache_bytes)
+    open_handles: "OrderedDict[str, None]" = OrderedDict()
+    prefetched = set()
+    last_position: Dict[str, Tuple[str, int, int, int]] = {}
+    stats = dict.fromkeys(
+        ("requests", "hits", "rendered", "prefetch_rendered", "prefetch_used", "handle_opens"), 0
+    )
+
+    def checkout(slide_id: str):
+        if slide_id in open_handles:
+            return
+        stats["handle_opens"] += 1
+        if len(open_handles) >= handles:
+            open_handles.popitem(last=False)
+        open_handles[slide_id] = None
+
+    def render(key: TileKey, size: int, is_prefetch: bool):
+        checkout(key[0])
+        stats["rendered"] += 1
+        for old_key in cache.store(key, size):
+            prefetched.discard(old_key)
+        if is_prefetch:
+            stats["prefetch_rendered"] += 1
+            prefetched.add(key)
+
+    for record in records:
+        if record.out_of_bounds:
+            checkout(record.slide_id)
+            continue
+        stats["requests"] += 1
+        keys, size = _covering_tiles(record, tile_size)
+        hit = True
+        for key in keys:
+            if key in cache:
+                cache.touch(key)
+                if key in prefetched:
+                    prefetched.discard(key)
+                    stats["prefetch_used"] += 1
+            else:
+                hit = False
+                render(key, size, is_prefetch=False)
+        stats["hits"] += hit
+
+        if prefetch != "none":
+            for key in _prefetch_keys(prefetch, record, keys, last_position, bounds, tile_size):
+                if key not in cache:
+                    render(key, size, is_prefetch=True)
+        last_position[record.client] = (record.slide_id, record.level, record.col, record.row)
+
+    stats["hit_ratio"] = round(stats["hits"] / stats["requests"], 4) if stats["requests"] else None
+    stats["evictions"] = cache.evictions
+    return stats
+
+
+def trace_bounds(records: List[TraceRecord]) -> Dict[Tuple[str, int, int], Tuple[int, int]]:
+    """{(lame, niveau, taille tuile): (dernière colonne, dernière ligne)} vues dans la trace."""
+    bounds: Dict[Tuple[str, int, int], Tuple[int, int]] = {}
+    for record in records:
+        if record.out_of_bounds:
+            continue
+        key = (record.slide_id, record.level, record.tile_size)
+        col, row = bounds.get(key, (0, 0))
+        bounds[key] = (max(col, record.col), max(row, record.row))
+    return bounds
+
+
+def _covering_tiles(record: TraceRecord, tile_size: int) -> Tuple[List[TileKey], int]:
+    """Tuiles simulées recouvrant la tuile demandée, taille estimée de chacune (octets)."""
+    source = record.tile_size
+    size = max(1, round(record.size * (tile_size / source) ** 2))
+    x0, y0 = record.col * source, record.row * source
+    cols = range(x0 // tile_size, (x0 + source - 1) // tile_size + 1)
+    rows = range(y0 // tile_size, (y0 + source - 1) // tile_size + 1)
+    return [(record.slide_id, record.level, col, row) for row in rows for col in cols], size
+
+
+def _prefetch_keys(
+    prefetch: str,
+    record: TraceRecord,
+    keys: List[TileKey],
+    last_position: Dict[str, Tuple[str, int, int, int]],
+    bounds: Dict[Tuple[str, int, int], Tuple[int, int]],
+    tile_size: int
+) -> Iterator[TileKey]:
+    last_col, last_row = bounds.get((record.slide_id, record.level, record.tile_size), (0, 0))
+    # Limites du niveau converties dans la grille simulée
+    max_col = ((last_col + 1) * record.tile_size - 1) // tile_size
+    max_row = ((last_row + 1) * record.tile_size - 1) // tile_size
+    _, level, col, row = keys[0]
+
+    if prefetch.startswith("ring"):
+        radius = int(prefetch[4:])
+        offsets = [(dx, dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1) if dx or dy]
+    else:  # pan: dans la direction du dernier déplacement du client
+        previous = last_position.get(record.client)
+        if previous is None or previous[:2] != (record.slide_id, record.level):
+            return
+        dx = (record.col > previous[2]) - (record.col < previous[2])
+        dy = (record.row > previous[3]) - (record.row < previous[3])
+        if not dx and not dy:
+            return
+        offsets = [(dx * step, dy * step) for step in (1, 2, 3)]
+
+    for dx, dy in offsets:
+        x, y = col + dx, row + dy
+        if 0 <= x <= max_col and 0 <= y <= max_row:
+            yield (record.slide_id, level, x, y)
+
+
+def summarize_trace(records: List[TraceRecord]) -> Dict:
+    """Volume de la trace, ratio de hit observé en production et borne des misses obligatoires."""
+    served = [record for record in records if not record.out_of_bounds]
+    unique = {(r.slide_id, r.level, r.col, r.row, r.tile_size) for r in served}
+    recorded_hits = sum(record.hit for record in served)
+    return {
+        "requests": len(records),
+        "out_of_bounds": len(records) - len(served),
+        "duration_s": round(records[-1].timestamp - records[0].timestamp, 1) if records else 0,
+        "slides": len({record.slide_id for record in records}),
+        "clients": len({record.client for record in records}),
+        "unique_tiles": len(unique),
+        "unique_tile_bytes": sum({(r.slide_id, r.level, r.col, r.row, r.tile_size): r.size for r in served}.values()),
+        # Même un cache infini manque chaque tuile une fois
+        "max_hit_ratio": round(1 - len(unique) / len(served), 4) if served else None,
+        "recorded_hit_ratio": round(recorded_hits / len(served), 4) if served else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a tile request trace against simulated tile caches")
+    parser.add_argument("traces", nargs="+", type=Path, help="Trace files of one worker, oldest first (e.g. tiles.4242.trace.1 tiles.4242.trace)")
+    parser.add_argument("--cache-mb", nargs="+", type=float, default=list(DEFAULT_CACHE_MB))
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=["lru"])
+    parser.add_argument("--tile-sizes", nargs="+", type=int, default=[256])
+    parser.add_argument("--prefetch", nargs="+", choices=PREFETCH, default=["none"])
+    parser.add_argument("--handles", type=int, default=DEFAULT_HANDLES, help="Open slide handles (TileServer: 5)")
+    parser.add_argument("--slide", help="Only replay requests for this slide ID")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the table")
+    args = parser.parse_args()
+
+    records = [
+        record for record in read_trace(args.traces)
+        if args.slide is None or record.slide_id == args.slide
+    ]
+    if not records:
+        print("Empty trace", file=sys.stderr)
+        return 1
+    summary = summarize_trace(records)
+    bounds = trace_bounds(records)
+
+    results = []
+    if not args.json:
+        print(
+            f"{summary['requests']} requests, {summary['slides']} slides, {summary['clients']} clients, "
+            f"{summary['duration_s']}s; unique tiles {summary['unique_tiles']} "
+            f"({summary['unique_tile_bytes'] / 1024 / 1024:.1f} MB), max hit ratio {summary['max_hit_ratio']}, "
+            f"recorded hit ratio {summary['recorded_hit_ratio']}"
+        )
+    for cache_mb, policy, tile_size, prefetch in itertools.product(
+        args.cache_mb, args.policies, args.tile_sizes, args.prefetch
+    ):
+        result = simulate(
+            records, int(cache_mb * 1024 * 1024), policy, tile_size, prefetch, args.handles, bounds
+        )
+        result = dict(cache_mb=cache_mb, policy=policy, tile_size=tile_size, prefetch=prefetch, **result)
+        results.append(result)
+        if not args.json:
+            print(
+                f"{cache_mb:>7g} MB {policy:<4} {tile_size:>4}px prefetch {prefetch:<5} "
+                f"hit {result['hit_ratio']:.3f}  rendered {result['rendered']:>8}  "
+                f"prefetched {result['prefetch_rendered']:>7} (used {result['prefetch_used']})  "
+                f"evictions {result['evictions']:>7}  opens {result['handle_opens']}"
+            )
+
+    report = {"benchmark": "trace-replay", "traces": [str(path) for path in args.traces], "trace": summary,
+              "handles": args.handles, "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
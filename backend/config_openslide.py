@@ -2,7 +2,8 @@ r"""
 Configuration OpenSlide pour Windows
 
 IMPORTANT: Sur Windows, OpenSlide nécessite que les DLLs soient accessibles.
-Ce fichier doit être importé AVANT tout import d'openslide.
+configure_openslide_path() doit être appelé AVANT tout import d'openslide:
+c'est fait par utils/openslide_loader.get_openslide() au premier usage.
 
 Installation OpenSlide Windows:
 1. Télécharger depuis: https://openslide.org/download/
@@ -56,6 +57,3 @@ def configure_openslide_path():
         print(f"[OK] OpenSlide added to PATH: {OPENSLIDE_PATH}")
         return True
 
-
-# Auto-configure au import
-configure_openslide_path()
@@ -16,13 +16,61 @@ API Docs:
     http://localhost:8000/redoc (ReDoc)
 """
 
-# IMPORTANT: Configure OpenSlide DLL path AVANT tout import
-# (Nécessaire sur Windows pour trouver libopenslide-0.dll)
-import config_openslide
+# Rapport de démarrage: importé en premier pour chronométrer les autres imports
+from utils import startup_report
+startup_report.install_import_timer()
 
+# NOTE: OpenSlide (et la configuration DLL Windows de config_openslide) est
+# chargé au premier usage par utils/openslide_loader.py, pas au démarrage
+
+from contextlib import asynccontextmanager
+from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import slides
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routes import admin, slides
+from services.admission import AdmissionMiddleware
+from services.health import capacity_monitor
+from services.slide_catalog import slide_catalog
+from services.slide_enricher import slide_enricher
+from services.slide_scanner import SLIDES_DIR
+from services.slide_watcher import SlideWatcher
+from services.tile_server import tile_server
+from services.warmup import warmup
+from utils import metrics
+from utils.tile_trace import tile_trace
+
+# Surveillance /Slides → catalogue et cache ID->Path à jour sans redémarrage
+slide_watcher = SlideWatcher(Path(SLIDES_DIR).resolve())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Cycle de vie du serveur.
+
+    Démarrage:
+        - Préchauffage en arrière-plan (watcher /Slides, catalogue, cache
+          ID->Path, lames chaudes): le serveur répond immédiatement,
+          /api/ready passe à 200 une fois chaud
+        - Enrichissement des métadonnées en arrière-plan (pool de processus)
+
+    Arrêt:
+        - Watcher, préchauffage et enrichissement stoppés
+        - Handles OpenSlide fermés, trace des tuiles vidée, connexion catalogue fermée
+    """
+    warmup.start(slide_watcher)
+    slide_enricher.start(Path(SLIDES_DIR).resolve())
+    startup_report.mark("lifespan_started")
+    yield
+    warmup.stop()
+    slide_enricher.stop()
+    slide_watcher.stop()
+    # Pools de tuiles arrêtés avant de fermer les handles (lectures en cours)
+    tile_server.close_all()
+    tile_trace.close()
+    slide_catalog.close()
+
 
 app = FastAPI(
     title="VarunaPoC Backend API",
@@ -53,6 +101,7 @@ VarunaPoC est une visionneuse web de lames histologiques haute résolution déve
 Voir `/docs/Manuel/` pour le guide utilisateur complet.
     """,
     version="1.7.0",
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_tags=[
@@ -67,10 +116,19 @@ Voir `/docs/Manuel/` pour le guide utilisateur complet.
         {
             "name": "visualization",
             "description": "Chargement et affichage des lames"
+        },
+        {
+            "name": "admin",
+            "description": "Diagnostic opérateur (jeton VARUNA_ADMIN_TOKEN)"
         }
     ]
 )
 
+# Contrôle d'admission (tuiles, overview, scan): 503 + Retry-After au-delà des files
+# (pose aussi le jalon "first_request" du rapport de démarrage)
+# Ajouté avant CORS → exécuté sous CORS: les rejets portent les en-têtes CORS
+app.add_middleware(AdmissionMiddleware)
+
 # CORS pour Vite dev server (http://localhost:5173)
 # IMPORTANT: Restreindre origins en production!
 app.add_middleware(
@@ -79,10 +137,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET"],  # Read-only pour PoC
     allow_headers=["*"],
+    # Lisibles par le viewer: 503 d'admission, tuiles dégradées
+    expose_headers=["Retry-After", "X-Varuna-Tile-Quality", "X-Varuna-Tile-Source-Level"],
 )
 
 # Routes
 app.include_router(slides.router)
+app.include_router(admin.router)
 
 
 @app.get("/", tags=["health"])
@@ -110,10 +171,94 @@ async def root():
 @app.get("/api/health", tags=["health"])
 async def health():
     """
-    API health check.
+    Sonde de vie (livenessProbe) + capacité courante du worker.
+
+    Returns:
+        {
+            "status": "healthy" | "unhealthy",
+            "reasons": [str],
+            "capacity": {
+                "queue_depth": int, "tile_workers": int,
+                "reads_in_flight": int, "oldest_read_s": float,
+                "open_handles": int, "max_handles": int,
+                "tile_cache_entries": int, "tile_cache_bytes": int, "tile_cache_max_bytes": int,
+                "catalog_age_s": float | null, "catalog_refreshing": bool
+            }
+        }
 
     Technical Notes:
         - Utilisé par frontend pour vérifier backend disponible
-        - Pas de dépendances externes (OpenSlide, filesystem)
+        - 200 tant que le process répond; 503 seulement si une lecture de
+          tuile est bloquée au-delà de VARUNA_LIVE_MAX_READ_SECONDS (désactivé par défaut)
+        - Pas d'accès aux lames (compteurs en mémoire, date du dernier rescan)
     """
-    return {"status": "healthy"}
+    alive, reasons, capacity = capacity_monitor.liveness()
+    return JSONResponse(
+        {"status": "healthy" if alive else "unhealthy", "reasons": reasons, "capacity": capacity},
+        status_code=200 if alive else 503
+    )
+
+
+@app.get("/api/ready", tags=["health"])
+async def ready():
+    """
+    Readiness: 200 une fois le préchauffage terminé et hors saturation, 503 sinon.
+
+    Returns:
+        État du préchauffage (ready, state, error, timings_ms, slides_opened) +
+        {"saturated": bool, "reasons": [str], "capacity": {... "saturated_since": float | null}}
+
+    Technical Notes:
+        - Pour les load balancers / probes Kubernetes (readinessProbe)
+        - /api/health reste la sonde de vie
+        - "degraded": préchauffage en échec, le service répond quand même
+        - Saturation (services/health.py): file de tuiles > VARUNA_READY_MAX_QUEUE,
+          lecture en cours depuis plus de VARUNA_READY_MAX_READ_SECONDS, catalogue
+          plus vieux que VARUNA_READY_MAX_CATALOG_AGE; retour à 200 sous la moitié
+          des seuils
+    """
+    status = warmup.status()
+    saturated, reasons, capacity = capacity_monitor.readiness()
+    status.update(ready=status["ready"] and not saturated, saturated=saturated, reasons=reasons, capacity=capacity)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/api/startup", tags=["health"])
+async def startup():
+    """
+    Rapport de démarrage à froid.
+
+    Returns:
+        {
+            "milestones_ms": {"app_imported": float, "lifespan_started": float, "first_request": float},
+            "openslide_loaded": bool,
+            "openslide_load_ms": float | null,
+            "import_profile": bool,          # VARUNA_STARTUP_PROFILE=1
+            "slowest_imports_ms": {module: float}
+        }
+    """
+    return startup_report.report()
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Métriques au format texte Prometheus (scrape).
+
+    Métriques principales:
+        - varuna_tile_stage_seconds{stage, format, level}: latence par étape
+          (queue, cache, checkout, read_region, convert, pad, encode)
+        - varuna_tile_requests_total{outcome}, varuna_tile_cache_hit_ratio
+        - varuna_slide_handle_requests_total{result}, varuna_open_slide_handles
+        - varuna_tile_queue_depth, varuna_tile_reads_in_flight, varuna_tile_bytes_served_total{format}
+        - varuna_catalog_refresh_seconds{mode}, varuna_detection_seconds{ext}
+        - varuna_admission_requests_total{lane, result}, varuna_admission_queued{lane},
+          varuna_admission_in_flight{lane}, varuna_admission_wait_seconds{lane}
+
+    Technical Notes:
+        - Enregistrement en mémoire (utils/metrics.py), jauges calculées au scrape
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+startup_report.mark("app_imported")
@@ -0,0 +1,255 @@
+"""
+Admin API Routes
+
+Endpoints de diagnostic réservés aux opérateurs.
+
+API Design:
+- GET /api/admin/slow-requests → Requêtes lentes échantillonnées (Server-Timing détaillé)
+- GET /api/admin/tile-trace → État de l'enregistrement des requêtes de tuiles
+- POST /api/admin/profile/start → Profilage (sampling | deterministic) des chemins tile / scan
+- POST /api/admin/profile/stop, GET /api/admin/profile → Arrêt, état de la session
+- GET /api/admin/profile/result?format= → Piles repliées (flamegraph), pstats ou texte
+- POST /api/admin/profile/memory/start|stop, GET /api/admin/profile/memory → tracemalloc
+  attribué au cache de tuiles, aux handles OpenSlide et au catalogue
+
+Sécurité:
+- En-tête `X-Admin-Token` comparé à VARUNA_ADMIN_TOKEN
+- VARUNA_ADMIN_TOKEN absent → routes admin désactivées (404)
+"""
+
+import hmac
+import os
+import sys
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+from services import slide_catalog as slide_catalog_module
+from services import slide_scanner as slide_scanner_module
+from services.format_detector import FormatDetector
+from services.slide_catalog import SlideCatalog
+from services.tile_server import TileServer, tile_server
+from utils.profiling import ProfilerBusy, memory, profiler
+from utils.request_timing import slow_requests
+from utils.tile_trace import tile_trace
+
+ADMIN_TOKEN = os.environ.get("VARUNA_ADMIN_TOKEN", "")
+
+# Chemins profilables: la première méthode de chaque groupe compte les requêtes
+PROFILE_TARGETS = {
+    "tile": [(TileServer, "get_tile")],
+    "scan": [(SlideCatalog, "refresh"), (FormatDetector, "detect_format")],
+}
+
+PROFILE_FORMATS = {
+    "collapsed": ("text/plain", "profile.collapsed"),
+    "pstats": ("application/octet-stream", "profile.pstats"),
+    "text": ("text/plain", "profile.txt"),
+}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Dépendance FastAPI: refuse la requête sans jeton admin valide.
+
+    Raises:
+        404: Admin désactivé (aucun jeton configuré)
+        403: Jeton absent ou invalide
+
+    Technical Notes:
+        - hmac.compare_digest: comparaison en temps constant
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Invalid admin token")
+
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-requests", tags=["admin"])
+async def list_slow_requests(
+    limit: Optional[int] = Query(None, ge=1, description="Nombre max de requêtes (plus récentes d'abord)"),
+    route: Optional[str] = Query(None, description="Filtre: tile, overview, info, browse")
+):
+    """
+    Requêtes au-dessus du seuil VARUNA_SLOW_REQUEST_MS.
+
+    Returns:
+        {
+            "threshold_ms": float,
+            "capacity": int,             # Taille du buffer circulaire
+            "recorded": int,             # Requêtes lentes depuis le démarrage
+            "entries": [
+                {
+                    "at": float,         # Horodatage Unix
+                    "route": str,
+                    "status": int,
+                    "total_ms": float,
+                    "stages_ms": {str: float},
+                    "cache": str | null,
+                    ...                  # Contexte: slide_id, level, col, row, path
+                }
+            ]
+        }
+    """
+    return {
+        "threshold_ms": slow_requests.threshold_ms,
+        "capacity": slow_requests.capacity,
+        "recorded": slow_requests.recorded,
+        "entries": slow_requests.entries(limit=limit, route=route),
+    }
+
+
+@router.get("/tile-trace", tags=["admin"])
+async def tile_trace_status():
+    """
+    État de la trace des tuiles (VARUNA_TILE_TRACE).
+
+    Returns:
+        {
+            "enabled": bool,
+            "path": str | null,      # Fichier courant (rotation en .1)
+            "recorded": int,         # Requêtes enregistrées depuis le démarrage
+            "bytes": int,            # Taille du fichier courant
+            "max_bytes": int         # Seuil de rotation
+        }
+    """
+    return tile_trace.status()
+
+
+@router.post("/profile/start", tags=["admin"])
+async def start_profile(
+    mode: str = Query("sampling", pattern="^(sampling|deterministic)$"),
+    target: List[str] = Query(["tile", "scan"], description="Chemins profilés: tile, scan"),
+    seconds: Optional[float] = Query(None, gt=0, description="Durée max (plafond 600 s)"),
+    requests: Optional[int] = Query(None, ge=1, description="Arrêt après N requêtes"),
+    interval_ms: float = Query(5.0, ge=0.5, le=1000, description="Période d'échantillonnage (sampling)")
+):
+    """
+    Démarre une session de profilage sur les chemins demandés.
+
+    Returns:
+        État de la session (voir GET /api/admin/profile)
+
+    Raises:
+        400: Chemin inconnu
+        409: Session déjà en cours
+
+    Technical Notes:
+        - tile: TileServer.get_tile (une requête = une tuile)
+        - scan: SlideCatalog.refresh (une requête = un rescan) + FormatDetector.detect_format
+          (browse et threads de détection)
+        - Wrappers installés pour la session seulement (aucun coût hors session)
+    """
+    unknown = sorted(set(target) - set(PROFILE_TARGETS))
+    if unknown:
+        raise HTTPException(400, f"Unknown profile target(s): {', '.join(unknown)}")
+    try:
+        return profiler.start(
+            mode, {name: PROFILE_TARGETS[name] for name in target},
+            seconds=seconds, requests=requests, interval=interval_ms / 1000
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(409, str(e))
+
+
+@router.post("/profile/stop", tags=["admin"])
+def stop_profile():
+    """Termine la session en cours (attend les appels profilés encore en cours)."""
+    return profiler.stop()
+
+
+@router.get("/profile", tags=["admin"])
+async def profile_status():
+    """
+    État de la session de profilage.
+
+    Returns:
+        {
+            "state": "idle" | "running" | "stopping" | "done",
+            "mode": str, "targets": [str], "seconds": float, "requests": int | null,
+            "interval": float, "started_at": float, "elapsed_s": float,
+            "requests_seen": int,    # Requêtes terminées sur les chemins profilés
+            "samples": int           # Piles relevées (sampling)
+        }
+    """
+    return profiler.status()
+
+
+@router.get("/profile/result", tags=["admin"])
+async def profile_result(
+    format: str = Query("collapsed", pattern="^(collapsed|pstats|text)$",
+                        description="collapsed (sampling), pstats ou text (deterministic)")
+):
+    """
+    Télécharge le résultat de la dernière session terminée.
+
+    Formats:
+        - collapsed: une ligne "groupe;module.fonction;... N" par pile
+          (flamegraph.pl, speedscope, inferno)
+        - pstats: fichier cProfile (snakeviz, flameprof, pstats.Stats)
+        - text: 60 fonctions les plus coûteuses (temps cumulé)
+
+    Raises:
+        409: Aucune session terminée, ou format sans objet pour le mode
+    """
+    try:
+        content = profiler.result(format)
+    except LookupError as e:
+        raise HTTPException(409, str(e))
+    media_type, filename = PROFILE_FORMATS[format]
+    return Response(
+        content=content, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/profile/memory/start", tags=["admin"])
+async def start_memory_profile(frames: int = Query(16, ge=1, le=128, description="Profondeur des piles d'allocation")):
+    """Démarre tracemalloc (seules les allocations suivantes sont tracées)."""
+    return memory.start(frames)
+
+
+@router.post("/profile/memory/stop", tags=["admin"])
+async def stop_memory_profile():
+    """Arrête tracemalloc et libère ses traces."""
+    return memory.stop()
+
+
+@router.get("/profile/memory", tags=["admin"])
+def memory_profile(top: int = Query(20, ge=1, le=500, description="Lignes d'allocation les plus lourdes")):
+    """
+    Instantané tracemalloc attribué par composant.
+
+    Returns:
+        {
+            "tracing": true, "traced_bytes": int, "peak_bytes": int, "overhead_bytes": int,
+            "components": {
+                "tile_cache" | "handle_cache" | "catalog" | "other": {"bytes": int, "blocks": int}
+            },
+            "top": [{"location": "fichier:ligne", "component": str, "bytes": int, "blocks": int}],
+            "live": {"tile_cache_tiles": int, "tile_cache_bytes": int, "open_slides": int}
+        }
+
+    Raises:
+        409: tracemalloc non démarré
+
+    Technical Notes:
+        - Allocations Python seulement: la mémoire native d'OpenSlide
+          (handles, cache de tuiles C) n'est pas visible
+        - "live": tailles exactes tenues par les caches eux-mêmes
+    """
+    components = {
+        "tile_cache": [TileServer.get_tile, TileServer._store_tile],
+        "handle_cache": [TileServer.get_slide] + [m for m in (sys.modules.get("openslide"),) if m is not None],
+        "catalog": [slide_catalog_module, slide_scanner_module],
+    }
+    try:
+        report = memory.report(components, top=top)
+    except LookupError as e:
+        raise HTTPException(409, str(e))
+    tiles, tile_bytes = tile_server.tile_cache_usage()
+    report["live"] = {"tile_cache_tiles": tiles, "tile_cache_bytes": tile_bytes, "open_slides": tile_server.open_slides}
+    return report
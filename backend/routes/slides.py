@@ -4,53 +4,287 @@ Slides API Routes
 Endpoints pour lister et charger les lames histologiques.
 
 API Design:
-- GET /api/slides → Liste toutes les lames (scan récursif complet)
+- GET /api/slides → Liste des lames (catalogue persistant, filtres, pagination par curseur)
+- GET /api/slides/stream → Même liste en NDJSON (affichage progressif)
+- GET /api/slides/search?q={texte} → Recherche classée + facettes
+- GET /api/slides/enrichment → Avancement de l'enrichissement + quarantaine
+- GET /api/slides/stats?folder={path} → Statistiques de l'archive (par dossier)
 - GET /api/browse?path={path} → Navigation hiérarchique dans /Slides
 - GET /api/slides/{id}/info → Métadonnées d'une lame
 - GET /api/slides/{id}/overview → Image overview (JPEG)
+
+Exécution:
+- Routes qui touchent OpenSlide, le disque ou SQLite (info, overview,
+  dzi.json, browse, liste, recherche, stats): `def`, exécutées par FastAPI
+  dans son threadpool; la boucle async reste libre pour les autres voies
+- Tuiles: `async def`, extraction dans le pool dédié de tile_server
 """
 
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response, JSONResponse
-from services.slide_scanner import scan_slides_directory, get_slide_path_by_id
+import base64
+import json
+import time
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from services.admission import client_address
+from services.slide_catalog import SlideFilters, slide_catalog, sort_key
+from services.slide_coherency import slide_coherency
+from services.slide_enricher import slide_enricher
+from services.slide_scanner import (
+    query_slides, stream_slides, search_slides, archive_statistics,
+    get_slide_path_by_id, get_slide_path_by_id_async
+)
 from services.slide_loader import get_slide_metadata, get_slide_overview_bytes
 from services.folder_browser import browse_directory
 from services.tile_server import tile_server
+from utils.request_timing import RequestTiming
+from utils.tile_trace import tile_trace
 
 router = APIRouter(prefix="/api/slides")
 
 
+# Taille de page max pour /api/slides?limit=
+MAX_PAGE_SIZE = 1000
+
+SORT_PATTERN = "^(path|name|format)$"
+ORDER_PATTERN = "^(asc|desc)$"
+
+
 @router.get("/", tags=["navigation"])
-async def list_slides():
+def list_slides(
+    refresh: bool = Query(False, description="Forcer un rescan incrémental avant de répondre"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Taille de page (absent = toutes les lames)"),
+    cursor: Optional[str] = Query(None, description="Curseur opaque retourné par la page précédente (next_cursor)"),
+    format_string: Optional[str] = Query(None, alias="format", description="Filtre format OpenSlide (ex: mirax, aperio)"),
+    is_supported: Optional[bool] = Query(None, description="Filtre lames supportées / non supportées"),
+    path_prefix: Optional[str] = Query(None, description="Dossier relatif depuis /Slides (ex: /3DHistech)"),
+    sort: str = Query("path", pattern=SORT_PATTERN, description="Tri: path, name ou format"),
+    order: str = Query("asc", pattern=ORDER_PATTERN, description="Ordre: asc ou desc")
+):
     """
-    Liste toutes les lames détectées dans /Slides (scan récursif complet).
+    Liste les lames détectées dans /Slides (depuis le catalogue persistant).
 
     Returns:
         {
-            "count": int,
+            "count": int,                  # Lames dans cette réponse
+            "total": int,                  # Lames correspondant aux filtres
             "slides": [
                 {
                     "id": str,
                     "name": str,
                     "path": str,
                     "format": str,
-                    "has_companions": bool
+                    "has_companions": bool,
+                    "metadata": {          # null tant que la lame n'est pas enrichie
+                        "dimensions": [int, int],
+                        "level_count": int,
+                        "vendor": str,
+                        "mpp_x": float, "mpp_y": float,
+                        "objective_power": float
+                    },
+                    "metadata_status": str  # pending, ok, failed, quarantined, unsupported
                 },
                 ...
-            ]
+            ],
+            "next_cursor": str | null      # Page suivante (null = dernière page)
         }
 
+    Raises:
+        400: Curseur invalide
+
     Technical Notes:
-        - Scan récursif de /Slides et sous-dossiers
+        - Réponse depuis l'index SQLite (pas de scan à chaque requête)
+        - Premier appel: scan complet; ensuite rescans incrémentaux
+          (seuls les dossiers modifiés sont re-examinés)
+        - Pagination par clé (keyset): page N aussi rapide que page 1,
+          pas de doublons/trous si des lames arrivent entre deux pages
+        - Sans limit: toutes les lames (compatibilité frontend)
         - has_companions indique si .mrxs a son dossier compagnon
         - Pour navigation hiérarchique, utiliser /api/browse
+        - Pour les très grosses archives, voir /api/slides/stream
+        - metadata: extraites en arrière-plan (services/slide_enricher.py),
+          aucun appel OpenSlide pendant la requête
+    """
+    filters = SlideFilters(format_string=format_string, is_supported=is_supported, path_prefix=path_prefix)
+    after = _decode_cursor(cursor) if cursor else None
+
+    slides, total = query_slides(
+        filters, sort=sort, descending=(order == "desc"), after=after, limit=limit, refresh=refresh
+    )
+
+    next_cursor = None
+    if limit is not None and len(slides) == limit:
+        next_cursor = _encode_cursor(sort_key(slides[-1], sort))
+
+    return {"count": len(slides), "total": total, "slides": slides, "next_cursor": next_cursor}
+
+
+@router.get("/stream", tags=["navigation"])
+async def stream_slide_list(
+    format_string: Optional[str] = Query(None, alias="format", description="Filtre format OpenSlide"),
+    is_supported: Optional[bool] = Query(None, description="Filtre lames supportées / non supportées"),
+    path_prefix: Optional[str] = Query(None, description="Dossier relatif depuis /Slides"),
+    sort: str = Query("path", pattern=SORT_PATTERN, description="Tri: path, name ou format"),
+    order: str = Query("asc", pattern=ORDER_PATTERN, description="Ordre: asc ou desc")
+):
+    """
+    Liste les lames en streaming NDJSON (une lame JSON par ligne).
+
+    Returns:
+        application/x-ndjson, mêmes champs que /api/slides
+
+    Technical Notes:
+        - Le client affiche les premières lames sans attendre la liste complète
+        - Premier démarrage (index vide): les lames sont émises au fil du
+          scan, dans l'ordre de découverte
+        - Mémoire serveur constante (lecture par lots)
+    """
+    filters = SlideFilters(format_string=format_string, is_supported=is_supported, path_prefix=path_prefix)
+    slides = stream_slides(filters, sort=sort, descending=(order == "desc"))
+    lines = (json.dumps(slide) + "\n" for slide in slides)
+    # Générateur synchrone: Starlette l'itère dans le threadpool
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.get("/search", tags=["navigation"])
+def search_slide_index(
+    q: str = Query("", description="Fragments de nom ou de chemin (tous requis)"),
+    format_string: Optional[str] = Query(None, alias="format", description="Filtre format OpenSlide"),
+    vendor: Optional[str] = Query(None, description="Filtre fabricant (ex: Hamamatsu, 3DHISTECH)"),
+    is_supported: Optional[bool] = Query(None, description="Filtre lames supportées / non supportées"),
+    offset: int = Query(0, ge=0, description="Index du premier résultat"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Taille de page")
+):
+    """
+    Recherche de lames (nom, chemin, format, fabricant).
+
+    Returns:
+        {
+            "query": str,
+            "total": int,                  # Résultats (toutes pages)
+            "offset": int,
+            "limit": int,
+            "slides": [{..., "vendor": str, "score": int}],   # Classés
+            "facets": {
+                "format_string": {str: int},
+                "vendor": {str: int},
+                "is_supported": {"true": int, "false": int}
+            },
+            "took_ms": float
+        }
+
+    Technical Notes:
+        - Index en mémoire (trigrammes + préfixes), mis à jour par le catalogue
+        - Facettes calculées sur les résultats texte, avant filtres de facettes
+        - Requête vide: toutes les lames, triées par chemin
+    """
+    start = time.perf_counter()
+    result = search_slides(q, format_string, vendor, is_supported, offset, limit)
+    return {
+        "query": q,
+        "total": result.total,
+        "offset": offset,
+        "limit": limit,
+        "slides": result.slides,
+        "facets": result.facets,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+
+@router.get("/stats", tags=["navigation"])
+def get_archive_statistics(
+    folder: str = Query("", description="Dossier relatif depuis /Slides (vide = racine)")
+):
+    """
+    Statistiques de l'archive (tableau de bord ops).
+
+    Returns:
+        {
+            "folder": str,
+            "totals": {                        # Dossier, sous-dossiers inclus
+                "slides": int,
+                "unsupported": int,
+                "size_bytes": int,             # Octets sur disque (fichiers joints inclus)
+                "gigapixels": float,           # Lames enrichies seulement
+                "enriched": int,
+                "by_format": {str: int},
+                "by_vendor": {str: int},
+                "unsupported_by_format": {str: int}
+            },
+            "folders": [                       # Sous-dossiers directs (taille décroissante)
+                {"path": str, "slides": int, "unsupported": int, "size_bytes": int, "gigapixels": float}
+            ],
+            "took_ms": float
+        }
+
+    Raises:
+        404: Aucune lame dans ce dossier
+
+    Technical Notes:
+        - Agrégats en mémoire mis à jour à chaque changement du catalogue:
+          aucun scan ni appel OpenSlide pendant la requête
+        - Gigapixels: complétés au fil de l'enrichissement (voir "enriched")
     """
-    slides = scan_slides_directory()
-    return {"count": len(slides), "slides": slides}
+    start = time.perf_counter()
+    result = archive_statistics(folder)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No slides in folder: {folder or '/'}")
+    result["took_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+@router.get("/enrichment", tags=["navigation"])
+def get_enrichment_status():
+    """
+    Avancement de l'enrichissement des métadonnées + lames en quarantaine.
+
+    Returns:
+        {
+            "enabled": bool,
+            "running": bool,
+            "workers": int,
+            "timeout_s": float,
+            "slides": {"pending": int, "ok": int, "failed": int, "quarantined": int, "unsupported": int},
+            "session": {"enriched": int, "failed": int, "quarantined": int, "crashes": int, "timeouts": int},
+            "quarantined": [{"id": str, "path": str, "error": str, "attempts": int}]
+        }
+
+    Technical Notes:
+        - Quarantaine: crash ou timeout OpenSlide répétés (lame plus rouverte
+          par l'enrichissement tant que le fichier n'a pas changé)
+    """
+    status = slide_enricher.status()
+    status["quarantined"] = (
+        slide_catalog.quarantined_slides(slide_enricher.root) if slide_enricher.root else []
+    )
+    return status
+
+
+def _encode_cursor(key: Tuple[str, str]) -> str:
+    """Curseur opaque: JSON [valeur de tri, chemin] en base64url."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, path = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(value, str) or not isinstance(path, str):
+            raise ValueError("cursor fields must be strings")
+        return value, path
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, f"Invalid cursor: {e}")
 
 
 @router.get("/browse", tags=["navigation"])
-async def browse_slides_directory(path: str = Query("/", description="Chemin relatif depuis /Slides")):
+def browse_slides_directory(
+    response: Response,
+    path: str = Query("/", description="Chemin relatif depuis /Slides"),
+    offset: int = Query(0, ge=0, description="Index du premier item (dossiers puis fichiers)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Taille de page (absent = dossier complet)"),
+    counts: bool = Query(True, description="Calculer item_count des sous-dossiers")
+):
     """
     Navigation hiérarchique dans le répertoire /Slides.
 
@@ -66,7 +300,7 @@ async def browse_slides_directory(path: str = Query("/", description="Chemin rel
                 {
                     "name": str,
                     "path": str,
-                    "item_count": int      # Nombre d'items dans le dossier
+                    "item_count": int | null  # Nombre d'items (null si counts=false)
                 }
             ],
             "slides": [                    # Lames détectées dans ce dossier
@@ -88,7 +322,11 @@ async def browse_slides_directory(path: str = Query("/", description="Chemin rel
                     "is_supported": false,
                     "notes": str
                 }
-            ]
+            ],
+            "total": int,                  # Items du dossier (toutes pages)
+            "offset": int,
+            "limit": int | null,
+            "has_more": bool
         }
 
     Raises:
@@ -100,24 +338,32 @@ async def browse_slides_directory(path: str = Query("/", description="Chemin rel
         - Accès limité à la racine /Slides uniquement
 
     Technical Notes:
-        - Lecture NON récursive (un seul niveau de profondeur)
+        - Lecture NON récursive (un seul niveau de profondeur, un seul scandir)
+        - Pagination offset/limit: seuls les fichiers de la page sont détectés
+        - item_count mémorisé par (dossier, mtime)
         - Détection des slides avec format_detector
         - Fichiers sans extension marqués non supportés
+        - En-tête Server-Timing: list, counts, detect
         - Voir docs/USER_GUIDE_SLIDE_STRUCTURE.md pour règles complètes
     """
+    timing = RequestTiming("browse", path=path, offset=offset, limit=limit)
+    timings = {}
     try:
-        result = browse_directory(path)
-        return result
+        result = browse_directory(path, offset=offset, limit=limit, include_counts=counts, timings=timings)
     except PermissionError as e:
-        raise HTTPException(400, f"Invalid path: {e}")
+        raise HTTPException(400, f"Invalid path: {e}", headers=timing.close(400))
     except FileNotFoundError as e:
-        raise HTTPException(404, str(e))
+        raise HTTPException(404, str(e), headers=timing.close(404))
     except Exception as e:
-        raise HTTPException(500, f"Error browsing directory: {e}")
+        raise HTTPException(500, f"Error browsing directory: {e}", headers=timing.close(500))
+
+    timing.add(timings)
+    timing.finish(response)
+    return result
 
 
 @router.get("/{slide_id}/info", tags=["visualization"])
-async def get_slide_info(slide_id: str):
+def get_slide_info(slide_id: str):
     """
     Récupère métadonnées d'une lame.
 
@@ -141,20 +387,26 @@ async def get_slide_info(slide_id: str):
     Technical Notes:
         - Ouvre temporairement la lame avec OpenSlide
         - Extrait métadonnées puis ferme immédiatement
+        - En-tête Server-Timing: lookup, open, properties
     """
+    timing = RequestTiming("info", slide_id=slide_id)
     slide_path = get_slide_path_by_id(slide_id)
+    timing.lap("lookup")
     if not slide_path:
-        raise HTTPException(404, f"Slide {slide_id} not found")
+        raise HTTPException(404, f"Slide {slide_id} not found", headers=timing.close(404))
 
+    timings = {}
     try:
-        metadata = get_slide_metadata(slide_path)
-        return metadata
+        metadata = get_slide_metadata(slide_path, timings=timings)
     except RuntimeError as e:
-        raise HTTPException(500, str(e))
+        raise HTTPException(500, str(e), headers=timing.close(500))
+
+    timing.add(timings)
+    return timing.finish(JSONResponse(content=metadata))
 
 
 @router.get("/{slide_id}/overview", tags=["visualization"])
-async def get_overview(slide_id: str):
+def get_overview(request: Request, slide_id: str):
     """
     Extrait image overview d'une lame.
 
@@ -171,21 +423,37 @@ async def get_overview(slide_id: str):
     Technical Notes:
         - Utilise OpenSlide.get_thumbnail() (SIMPLE, efficace)
         - Retourne JPEG optimisé (~100-500KB typiquement)
-        - Pas de cache Phase 1 (sera ajouté Phase 2)
+        - Pas de cache serveur; ETag = version des fichiers de la lame
+          (slide_coherency) + Cache-Control: no-cache → le navigateur
+          revalide, 304 sans extraction tant que la lame n'a pas changé
+        - En-tête Server-Timing: lookup, open, thumbnail, encode
     """
+    timing = RequestTiming("overview", slide_id=slide_id)
     slide_path = get_slide_path_by_id(slide_id)
+    timing.lap("lookup")
     if not slide_path:
-        raise HTTPException(404, f"Slide {slide_id} not found")
+        raise HTTPException(404, f"Slide {slide_id} not found", headers=timing.close(404))
 
+    cache_headers = {
+        "ETag": f'"{slide_id}-{slide_coherency.check(slide_path) & 0xFFFFFFFFFFFFFFFF:x}"',
+        "Cache-Control": "no-cache",
+    }
+    if request.headers.get("if-none-match") == cache_headers["ETag"]:
+        timing.cache = "hit"
+        return timing.finish(Response(status_code=304, headers=cache_headers))
+
+    timings = {}
     try:
-        img_bytes = get_slide_overview_bytes(slide_path)
-        return Response(content=img_bytes, media_type="image/jpeg")
+        img_bytes = get_slide_overview_bytes(slide_path, timings=timings)
     except RuntimeError as e:
-        raise HTTPException(500, str(e))
+        raise HTTPException(500, str(e), headers=timing.close(500))
+
+    timing.add(timings)
+    return timing.finish(Response(content=img_bytes, media_type="image/jpeg", headers=cache_headers))
 
 
 @router.get("/{slide_id}/dzi.json", tags=["visualization"])
-async def get_dzi_metadata(slide_id: str):
+def get_dzi_metadata(slide_id: str):
     """
     Récupère métadonnées DZI pour OpenSeadragon (streaming de tuiles).
 
@@ -212,6 +480,7 @@ async def get_dzi_metadata(slide_id: str):
         - Format compatible OpenSeadragon DziTileSource
         - overlap=0 pour simplifier (pas de chevauchement)
         - tile_size=256 (standard DZI/OpenSeadragon)
+        - Consultation enregistrée (pré-ouverture au prochain démarrage)
         - Voir: docs/CLAUDE.md section "Coordinate Mapping"
     """
     slide_path = get_slide_path_by_id(slide_id)
@@ -220,6 +489,8 @@ async def get_dzi_metadata(slide_id: str):
 
     try:
         metadata = tile_server.get_dzi_metadata(slide_path)
+        # Historique: lames pré-ouvertes au prochain démarrage (warmup)
+        slide_catalog.record_view(slide_path, metadata)
         return JSONResponse(content=metadata)
     except FileNotFoundError as e:
         raise HTTPException(404, str(e))
@@ -228,7 +499,7 @@ async def get_dzi_metadata(slide_id: str):
 
 
 @router.get("/{slide_id}/tiles/{level}/{col}_{row}.jpg", tags=["visualization"])
-async def get_tile(slide_id: str, level: int, col: int, row: int):
+async def get_tile(request: Request, slide_id: str, level: int, col: int, row: int):
     """
     Extrait une tuile JPEG depuis une lame (streaming à la demande).
 
@@ -250,26 +521,61 @@ async def get_tile(slide_id: str, level: int, col: int, row: int):
         - RGBA converti en RGB (OpenSlide retourne RGBA)
         - Tuiles hors limites retournent 404 (pas d'image noire)
         - Cache des slides ouverts (max 5 simultanés)
+        - Extraction dans le pool de threads des tuiles (n'occupe pas la boucle async)
+        - En-tête Server-Timing: lookup, queue, cache, shared_cache, checkout,
+          read_region, convert, pad, encode (étapes de tile_server),
+          cache;desc="hit"|"shared"|"miss"|"degraded" (shared = rendue par un autre worker)
+        - VARUNA_TILE_DEADLINE_MS: au-delà, tuile agrandie depuis un niveau plus
+          grossier en cache (X-Varuna-Tile-Quality: degraded, Cache-Control: no-store),
+          rendu pleine qualité poursuivi en arrière-plan pour la requête suivante
+        - VARUNA_TILE_TRACE: requête ajoutée à la trace (utils/tile_trace.py), client
+          identifié comme pour l'admission (X-Forwarded-For des proxies de confiance)
         - Voir: tile_server.py pour logique d'extraction
 
     Examples:
         GET /api/slides/a1b2c3d4e5f6/tiles/2/5_3.jpg
         → Tuile au niveau 2, colonne 5, ligne 3
     """
-    slide_path = get_slide_path_by_id(slide_id)
+    timing = RequestTiming("tile", slide_id=slide_id, level=level, col=col, row=row)
+    slide_path = await get_slide_path_by_id_async(slide_id)
+    timing.lap("lookup")
     if not slide_path:
-        raise HTTPException(404, f"Slide {slide_id} not found")
+        raise HTTPException(404, f"Slide {slide_id} not found", headers=timing.close(404))
 
+    timings = {}
     try:
-        tile_bytes = tile_server.get_tile(slide_path, level, col, row, tile_size=256)
-
-        if tile_bytes is None:
-            # Tuile hors limites (pas d'erreur, juste pas de contenu)
-            raise HTTPException(404, "Tile out of bounds")
-
-        return Response(content=tile_bytes, media_type="image/jpeg")
-
+        tile_bytes, source_level = await tile_server.get_tile_with_deadline(
+            slide_path, level, col, row, tile_size=256, timings=timings
+        )
     except FileNotFoundError as e:
-        raise HTTPException(404, str(e))
+        timing.add(timings)
+        raise HTTPException(404, str(e), headers=timing.close(404))
     except Exception as e:
-        raise HTTPException(500, f"Error extracting tile: {e}")
+        timing.add(timings)
+        raise HTTPException(500, f"Error extracting tile: {e}", headers=timing.close(500))
+
+    timing.add(timings)
+    if source_level is not None:
+        timing.cache = "degraded"
+    elif "checkout" in timings:
+        timing.cache = "miss"
+    else:
+        timing.cache = "shared" if "shared_cache" in timings else "hit"
+    tile_trace.record(
+        slide_id, level, col, row, 256, client_address(request.scope), len(tile_bytes or b""),
+        hit=timing.cache in ("hit", "shared"), out_of_bounds=tile_bytes is None
+    )
+
+    if tile_bytes is None:
+        # Tuile hors limites (pas d'erreur, juste pas de contenu)
+        raise HTTPException(404, "Tile out of bounds", headers=timing.close(404))
+
+    if source_level is not None:
+        # Tuile agrandie depuis un niveau grossier: jamais réutilisée par le navigateur,
+        # la prochaine requête reçoit le rendu pleine qualité (en cours en arrière-plan)
+        return timing.finish(Response(content=tile_bytes, media_type="image/jpeg", headers={
+            "Cache-Control": "no-store",
+            "X-Varuna-Tile-Quality": "degraded",
+            "X-Varuna-Tile-Source-Level": str(source_level),
+        }))
+    return timing.finish(Response(content=tile_bytes, media_type="image/jpeg"))
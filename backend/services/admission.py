@@ -0,0 +1,366 @@
+"""
+Admission Service
+
+Contrôle d'admission devant les routes coûteuses (tuiles, overview, scan):
+limites de concurrence globale et par client, files équitables bornées,
+rejet 503 + Retry-After au-delà, voie réservée aux métadonnées légères.
+
+Pourquoi:
+À 9:00, une séance d'enseignement ouvre la même lame sur 40 postes: toutes
+les requêtes étaient acceptées et la latence montait pour tout le monde,
+y compris pour dzi.json dont le viewer a besoin pour afficher
+quoi que ce soit. Limiter ce qui entre garde une latence bornée pour ce qui
+est admis; le reste est refusé tôt avec une date de retour plutôt que
+d'attendre indéfiniment.
+
+Voies (classées par chemin):
+- tile:     /api/slides/{id}/tiles/...
+- heavy:    /api/slides/{id}/overview, /info et /dzi.json (ouvrent la lame
+            avec OpenSlide si absente du cache), liste / stream / browse /
+            search / stats
+- metadata: autres routes /api/slides (enrichment), voie réservée: jamais
+            en concurrence avec les tuiles
+- hors contrôle: santé, métriques, admin, docs, requêtes OPTIONS (CORS)
+
+Configuration (variables d'environnement):
+- VARUNA_ADMISSION: contrôle actif (1/0, défaut: 1)
+- VARUNA_ADMISSION_TILE_CONCURRENCY: tuiles en cours (défaut: 2 x VARUNA_TILE_WORKERS)
+- VARUNA_ADMISSION_HEAVY_CONCURRENCY: overviews / scans en cours (défaut: 4)
+- VARUNA_ADMISSION_METADATA_CONCURRENCY: métadonnées en cours (défaut: 32)
+- VARUNA_ADMISSION_CLIENT_CONCURRENCY: requêtes en cours par client et par voie (défaut: 8)
+- VARUNA_ADMISSION_QUEUE_FACTOR: file max = facteur x concurrence (voie et client, défaut: 4)
+- VARUNA_ADMISSION_MAX_WAIT: attente max en file avant 503 (secondes, défaut: 10)
+- VARUNA_ADMISSION_TRUSTED_PROXIES: adresses ou réseaux (CIDR) des proxies dont
+  l'en-tête X-Forwarded-For est cru, séparés par des virgules (défaut: aucun)
+"""
+
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+from services.tile_server import TILE_WORKERS
+from utils import startup_report
+from utils.metrics import Counter, Gauge, Histogram
+
+ADMISSION_ENABLED = os.environ.get("VARUNA_ADMISSION", "1") == "1"
+ADMISSION_LIMITS = {
+    "tile": int(os.environ.get("VARUNA_ADMISSION_TILE_CONCURRENCY", TILE_WORKERS * 2)),
+    "heavy": int(os.environ.get("VARUNA_ADMISSION_HEAVY_CONCURRENCY", "4")),
+    "metadata": int(os.environ.get("VARUNA_ADMISSION_METADATA_CONCURRENCY", "32")),
+}
+ADMISSION_CLIENT_CONCURRENCY = int(os.environ.get("VARUNA_ADMISSION_CLIENT_CONCURRENCY", "8"))
+ADMISSION_QUEUE_FACTOR = int(os.environ.get("VARUNA_ADMISSION_QUEUE_FACTOR", "4"))
+ADMISSION_MAX_WAIT = float(os.environ.get("VARUNA_ADMISSION_MAX_WAIT", "10"))
+ADMISSION_TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.environ.get("VARUNA_ADMISSION_TRUSTED_PROXIES", "").split(",")
+    if entry.strip()
+]
+
+# Bornes du Retry-After annoncé (secondes)
+RETRY_AFTER_MIN = 1
+RETRY_AFTER_MAX = 30
+
+# Lissage de la durée moyenne d'une requête admise (estimation du Retry-After)
+SERVICE_TIME_ALPHA = 0.1
+
+_TILE_PATH = re.compile(r"^/api/slides/[^/]+/tiles/")
+_OPENS_SLIDE_PATH = re.compile(r"^/api/slides/[^/]+/(overview|info|dzi\.json)$")
+_SCAN_PATHS = {"/api/slides", "/api/slides/", "/api/slides/stream", "/api/slides/browse",
+               "/api/slides/search", "/api/slides/stats"}
+
+ADMISSION_REQUESTS = Counter(
+    "varuna_admission_requests_total", "Admission decisions (admitted, queued, rejected, timeout)", ("lane", "result")
+)
+ADMISSION_WAIT_SECONDS = Histogram("varuna_admission_wait_seconds", "Time spent in the admission queue", ("lane",))
+ADMISSION_IN_FLIGHT = Gauge("varuna_admission_in_flight", "Admitted requests running", ("lane",))
+ADMISSION_QUEUED = Gauge("varuna_admission_queued", "Requests waiting for admission", ("lane",))
+
+
+class AdmissionRejected(Exception):
+    """File pleine ou attente trop longue: répondre 503 avec Retry-After."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"{lane}: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """Concurrence et files par client d'une voie (boucle asyncio du worker, sans verrou)."""
+
+    def __init__(self, name: str, limit: int, client_limit: int, queue_factor: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.client_limit = max(1, min(client_limit, self.limit))
+        self.max_queue = self.limit * queue_factor
+        self.max_client_queue = self.client_limit * queue_factor
+        self.in_flight = 0
+        self.queued = 0
+        self.client_in_flight: Dict[str, int] = {}
+        # Tourniquet des clients en attente: premier = prochain servi
+        self.waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.service_time = 0.05
+
+    def retry_after(self) -> int:
+        """Temps estimé pour écouler la file actuelle (borné)."""
+        estimate = (self.queued + 1) / self.limit * self.service_time
+        return int(min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, math.ceil(estimate))))
+
+
+class AdmissionController:
+    """
+    Admission des requêtes par voie (un contrôleur par worker).
+
+    Technical Notes:
+        - Équité: un client au-delà de sa limite attend dans SA file; à chaque
+          place libérée, les clients en attente sont servis à tour de rôle
+          (round robin), un client qui inonde ne retarde pas les autres
+        - Rejet immédiat si la file de la voie ou celle du client est pleine,
+          rejet après ADMISSION_MAX_WAIT en file
+        - Retry-After = file / concurrence x durée moyenne d'une requête
+          (moyenne mobile), borné entre 1 et 30 s
+        - Client = adresse de la connexion; X-Forwarded-For n'est lu que si
+          elle appartient à VARUNA_ADMISSION_TRUSTED_PROXIES (un client ne
+          peut pas changer d'identité en forgeant l'en-tête)
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int] = ADMISSION_LIMITS,
+        client_limit: int = ADMISSION_CLIENT_CONCURRENCY,
+        queue_factor: int = ADMISSION_QUEUE_FACTOR,
+        max_wait: float = ADMISSION_MAX_WAIT
+    ):
+        self.lanes = {name: _Lane(name, limit, client_limit, queue_factor) for name, limit in limits.items()}
+        self.max_wait = max_wait
+
+    @staticmethod
+    def classify(method: str, path: str) -> Optional[str]:
+        """Voie d'une requête, None si hors contrôle d'admission."""
+        if method == "OPTIONS" or not path.startswith("/api/slides"):
+            return None
+        if _TILE_PATH.match(path):
+            return "tile"
+        if path in _SCAN_PATHS or _OPENS_SLIDE_PATH.match(path):
+            return "heavy"
+        return "metadata"
+
+    async def acquire(self, lane_name: str, client: str) -> float:
+        """
+        Attend une place dans la voie.
+
+        Returns:
+            Instant d'admission (time.monotonic, à rendre à release())
+
+        Raises:
+            AdmissionRejected: File pleine ou attente > max_wait
+        """
+        lane = self.lanes[lane_name]
+        queue = lane.waiting.get(client)
+        if lane.in_flight < lane.limit and lane.client_in_flight.get(client, 0) < lane.client_limit and not queue:
+            self._grant(lane, client)
+            ADMISSION_REQUESTS.inc(1, (lane_name, "admitted"))
+            return time.monotonic()
+
+        if lane.queued >= lane.max_queue:
+            ADMISSION_REQUESTS.inc(1, (lane_name, "rejected"))
+            raise AdmissionRejected(lane_name, "queue full", lane.retry_after())
+        if queue is not None and len(queue) >= lane.max_client_queue:
+            ADMISSION_REQUESTS.inc(1, (lane_name, "rejected"))
+            raise AdmissionRejected(lane_name, "client queue full", lane.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        lane.waiting.setdefault(client, deque()).append(future)
+        lane.queued += 1
+        ADMISSION_QUEUED.inc(1, (lane_name,))
+        ADMISSION_REQUESTS.inc(1, (lane_name, "queued"))
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._unqueue(lane, client, future)
+                ADMISSION_REQUESTS.inc(1, (lane_name, "timeout"))
+                raise AdmissionRejected(lane_name, "queue wait timeout", lane.retry_after())
+        except BaseException:
+            # Client parti pendant l'attente: libérer la file ou la place déjà accordée
+            if future.done():
+                self.release(lane_name, client, time.monotonic())
+            else:
+                self._unqueue(lane, client, future)
+            raise
+        admitted_at = time.monotonic()
+        ADMISSION_WAIT_SECONDS.observe(admitted_at - queued_at, (lane_name,))
+        return admitted_at
+
+    def release(self, lane_name: str, client: str, admitted_at: float):
+        """Rend la place d'une requête terminée et admet les suivants."""
+        lane = self.lanes[lane_name]
+        lane.in_flight -= 1
+        ADMISSION_IN_FLIGHT.inc(-1, (lane_name,))
+        remaining = lane.client_in_flight[client] - 1
+        if remaining:
+            lane.client_in_flight[client] = remaining
+        else:
+            del lane.client_in_flight[client]
+        elapsed = time.monotonic() - admitted_at
+        lane.service_time += SERVICE_TIME_ALPHA * (elapsed - lane.service_time)
+        self._dispatch(lane)
+
+    def status(self) -> Dict:
+        return {
+            name: {
+                "limit": lane.limit,
+                "client_limit": lane.client_limit,
+                "in_flight": lane.in_flight,
+                "queued": lane.queued,
+                "waiting_clients": len(lane.waiting),
+                "service_time_s": round(lane.service_time, 4),
+            }
+            for name, lane in self.lanes.items()
+        }
+
+    def _grant(self, lane: _Lane, client: str):
+        lane.in_flight += 1
+        lane.client_in_flight[client] = lane.client_in_flight.get(client, 0) + 1
+        ADMISSION_IN_FLIGHT.inc(1, (lane.name,))
+
+    def _dispatch(self, lane: _Lane):
+        """Places libres → tête de file du prochain client éligible (tour de rôle)."""
+        while lane.in_flight < lane.limit and lane.waiting:
+            for client, queue in lane.waiting.items():
+                if lane.client_in_flight.get(client, 0) < lane.client_limit:
+                    break
+            else:
+                return  # Tous les clients en attente sont à leur limite
+            future = queue.popleft()
+            lane.queued -= 1
+            ADMISSION_QUEUED.inc(-1, (lane.name,))
+            if queue:
+                lane.waiting.move_to_end(client)
+            else:
+                del lane.waiting[client]
+            self._grant(lane, client)
+            future.set_result(None)
+
+    def _unqueue(self, lane: _Lane, client: str, future: asyncio.Future):
+        queue = lane.waiting.get(client)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del lane.waiting[client]
+        lane.queued -= 1
+        ADMISSION_QUEUED.inc(-1, (lane.name,))
+        future.cancel()
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI: classe la requête, attend une place, la rend à la fin
+    de la réponse (streaming compris).
+
+    Technical Notes:
+        - Middleware ASGI pur (pas BaseHTTPMiddleware): aucune tâche ni
+          copie de réponse supplémentaire sur le chemin des tuiles
+        - Placé sous CORSMiddleware: les 503 portent les en-têtes CORS et le
+          viewer peut lire Retry-After
+        - Voit toutes les requêtes HTTP: pose aussi le jalon "first_request"
+          du rapport de démarrage (un booléen testé ensuite)
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None, enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.enabled = enabled
+        self._first_request = True
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self._admit(scope, receive, send)
+        finally:
+            if self._first_request and scope["type"] == "http":
+                self._first_request = False
+                startup_report.first_request_done()
+
+    async def _admit(self, scope, receive, send):
+        lane = None
+        if self.enabled and scope["type"] == "http":
+            lane = self.controller.classify(scope["method"], scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = client_address(scope)
+        try:
+            admitted_at = await self.controller.acquire(lane, client)
+        except AdmissionRejected as e:
+            await _reject(send, e)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(lane, client, admitted_at)
+
+
+def client_address(scope, trusted_proxies: List = ADMISSION_TRUSTED_PROXIES) -> str:
+    """
+    Adresse du client pour les limites par client.
+
+    Technical Notes:
+        - Pair de la connexion non listé dans trusted_proxies: son adresse,
+          X-Forwarded-For ignoré
+        - Pair de confiance: X-Forwarded-For lu de droite à gauche, première
+          adresse qui n'est pas un proxy de confiance (les entrées plus à
+          gauche viennent du client et ne sont pas vérifiables)
+    """
+    client = scope.get("client")
+    peer = client[0] if client else ""
+    if not trusted_proxies or not _is_trusted(peer, trusted_proxies):
+        return peer
+
+    hops: List[str] = []
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            hops += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _is_trusted(address: str, trusted_proxies: List) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+async def _reject(send, error: AdmissionRejected):
+    body = json.dumps({
+        "detail": f"Server busy ({error.lane} {error.reason}), retry in {error.retry_after} s",
+        "retry_after": error.retry_after,
+    }).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Instance globale (middleware de main.py)
+admission_controller = AdmissionController()
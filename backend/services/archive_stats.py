@@ -0,0 +1,252 @@
+"""
+Archive Statistics Service
+
+Agrégats de l'archive /Slides (tableau de bord ops), tenus à jour
+incrémentalement par les changements du catalogue.
+
+Agrégats (par dossier, sous-dossiers inclus):
+- Nombre de lames, par format OpenSlide et par fabricant
+- Lames non supportées (total et par format)
+- Octets sur disque (point d'entrée + fichiers joints, voir slide_catalog)
+- Gigapixels (niveau 0, lames enrichies par services/slide_enricher.py)
+
+Principe:
+- Construit une fois depuis le catalogue (une lecture, aucun accès
+  filesystem ni OpenSlide)
+- Ensuite chaque lame ajoutée/modifiée/supprimée/enrichie ne met à jour que
+  ses dossiers ancêtres: O(profondeur) par lame, réponse en O(sous-dossiers)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from services.slide_catalog import CatalogChange, slide_catalog
+from services.slide_search import vendor_for_format
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _Contribution:
+    """Part d'une lame dans les agrégats (retranchée à sa suppression)."""
+    folder: str             # dossier relatif (séparateurs POSIX, "" = racine)
+    format_string: str
+    vendor: str
+    is_supported: bool
+    size_bytes: int
+    pixels: int             # largeur x hauteur niveau 0 (0 si non enrichie)
+    enriched: bool
+
+
+class _Totals:
+    """Agrégats d'un dossier (sous-dossiers inclus)."""
+
+    __slots__ = (
+        "slides", "unsupported", "enriched", "size_bytes", "pixels",
+        "by_format", "by_vendor", "unsupported_by_format",
+    )
+
+    def __init__(self):
+        self.slides = 0
+        self.unsupported = 0
+        self.enriched = 0
+        self.size_bytes = 0
+        self.pixels = 0
+        self.by_format: Counter = Counter()
+        self.by_vendor: Counter = Counter()
+        self.unsupported_by_format: Counter = Counter()
+
+    def add(self, contribution: _Contribution, sign: int = 1):
+        self.slides += sign
+        self.size_bytes += sign * contribution.size_bytes
+        self.pixels += sign * contribution.pixels
+        self.enriched += sign * contribution.enriched
+        _count(self.by_format, contribution.format_string, sign)
+        _count(self.by_vendor, contribution.vendor, sign)
+        if not contribution.is_supported:
+            self.unsupported += sign
+            _count(self.unsupported_by_format, contribution.format_string, sign)
+
+    def summary(self) -> Dict:
+        return {
+            "slides": self.slides,
+            "unsupported": self.unsupported,
+            "size_bytes": self.size_bytes,
+            "gigapixels": round(self.pixels / 1e9, 3),
+        }
+
+    def to_dict(self) -> Dict:
+        return dict(
+            self.summary(),
+            enriched=self.enriched,
+            by_format=dict(self.by_format.most_common()),
+            by_vendor=dict(self.by_vendor.most_common()),
+            unsupported_by_format=dict(self.unsupported_by_format.most_common()),
+        )
+
+
+class ArchiveStats:
+    """
+    Statistiques d'une racine /Slides, par dossier.
+
+    Usage:
+        archive_stats.ensure_built(root)
+        archive_stats.folder("/3DHistech")
+    """
+
+    def __init__(self):
+        self.root: Optional[Path] = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._root_prefix = str(self.root) + os.sep if self.root else ""
+        self._slides: Dict[str, _Contribution] = {}
+        self._folders: Dict[str, _Totals] = {"": _Totals()}
+        self._children: Dict[str, Set[str]] = {}
+
+    # =========================================================================
+    # CONSTRUCTION / MISE À JOUR
+    # =========================================================================
+
+    def is_built_for(self, root: Path) -> bool:
+        return self.root == root
+
+    def ensure_built(self, root: Path):
+        """Construit les agrégats depuis le catalogue si ce n'est pas déjà fait pour `root`."""
+        with self._lock:
+            if not self.is_built_for(root):
+                self.rebuild(root, slide_catalog.list_slides(root))
+
+    def rebuild(self, root: Path, slides: List[Dict]):
+        """Recalcule tous les agrégats depuis une liste complète de lames."""
+        start = time.perf_counter()
+        with self._lock:
+            self.root = root
+            self._reset()
+            for slide in slides:
+                self._add(slide)
+        logger.info(
+            f"Archive stats built: {len(slides)} slides, {len(self._folders)} folders in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+    def apply_change(self, change: CatalogChange):
+        """
+        Listener du catalogue: retranche l'ancienne contribution des lames
+        touchées et ajoute la nouvelle.
+
+        Technical Notes:
+            - Lames ajoutées/modifiées/enrichies relues depuis le catalogue (une requête)
+            - Ignoré si les agrégats ne sont pas (encore) construits pour cette racine
+        """
+        if change.root is None or not self.is_built_for(change.root):
+            return
+
+        updated = slide_catalog.get_slides(change.root, change.added | change.modified | change.enriched)
+        with self._lock:
+            for path in change.removed | change.modified | change.enriched:
+                self._remove(path)
+            for slide in updated:
+                self._add(slide)
+
+    def _add(self, slide: Dict):
+        path = slide["path"]
+        if path in self._slides:
+            self._remove(path)
+
+        metadata = slide.get("metadata")
+        width, height = metadata["dimensions"] if metadata else (0, 0)
+        contribution = _Contribution(
+            folder=self._folder_of(path),
+            format_string=slide["format_string"] or "unknown",
+            vendor=vendor_for_format(slide["format_string"]),
+            is_supported=bool(slide["is_supported"]),
+            size_bytes=slide.get("size_bytes") or 0,
+            pixels=(width or 0) * (height or 0),
+            enriched=metadata is not None,
+        )
+        self._slides[path] = contribution
+
+        for folder in _ancestors(contribution.folder):
+            totals = self._folders.get(folder)
+            if totals is None:
+                totals = self._folders[folder] = _Totals()
+                self._children.setdefault(folder.rpartition("/")[0], set()).add(folder)
+            totals.add(contribution)
+
+    def _remove(self, path: str):
+        contribution = self._slides.pop(path, None)
+        if contribution is None:
+            return
+
+        for folder in _ancestors(contribution.folder):
+            totals = self._folders[folder]
+            totals.add(contribution, sign=-1)
+            if folder and totals.slides == 0:
+                # Dossier vide: oublié (plus de lames dans son sous-arbre)
+                del self._folders[folder]
+                parent = folder.rpartition("/")[0]
+                self._children[parent].discard(folder)
+                if not self._children[parent]:
+                    del self._children[parent]
+
+    def _folder_of(self, path: str) -> str:
+        relative = path[len(self._root_prefix):] if path.startswith(self._root_prefix) else path
+        return relative.replace(os.sep, "/").rpartition("/")[0]
+
+    # =========================================================================
+    # LECTURE
+    # =========================================================================
+
+    def folder(self, relative_path: str = "") -> Optional[Dict]:
+        """
+        Agrégats d'un dossier + résumé de chaque sous-dossier direct.
+
+        Args:
+            relative_path: Dossier relatif à /Slides ("" ou "/" = racine)
+
+        Returns:
+            {"folder", "totals", "folders": [{"path", "slides", "unsupported",
+            "size_bytes", "gigapixels"}]} (sous-dossiers triés par taille
+            décroissante), ou None si le dossier ne contient aucune lame
+        """
+        folder = relative_path.replace("\\", "/").strip("/")
+        with self._lock:
+            totals = self._folders.get(folder)
+            if totals is None:
+                return None
+            children = [
+                dict(path="/" + child, **self._folders[child].summary())
+                for child in self._children.get(folder, ())
+            ]
+            result = {"folder": "/" + folder, "totals": totals.to_dict()}
+
+        children.sort(key=lambda c: (-c["size_bytes"], c["path"]))
+        result["folders"] = children
+        return result
+
+
+def _ancestors(folder: str) -> List[str]:
+    """Dossier et ses ancêtres jusqu'à la racine: "a/b" → ["", "a", "a/b"]."""
+    if not folder:
+        return [""]
+    parts = folder.split("/")
+    return [""] + ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _count(counter: Counter, key: str, sign: int):
+    counter[key] += sign
+    if counter[key] <= 0:
+        del counter[key]
+
+
+# Instance globale (singleton)
+archive_stats = ArchiveStats()
+slide_catalog.add_listener(archive_stats.apply_change)
@@ -0,0 +1,182 @@
+"""
+File Signature Service
+
+Lecture des premiers octets d'un fichier ("magic bytes") pour classer ou
+rejeter un candidat AVANT tout appel OpenSlide.
+
+Pourquoi:
+OpenSlide.detect_format() (et a fortiori OpenSlide()) est coûteux: ouverture
+du fichier, parsing complet des IFDs TIFF ou des métadonnées DICOM. Dans un
+dossier contenant des milliers d'instances DICOM non-WSI ou de TIFF non
+pyramidaux, un simple en-tête suffit à rejeter le fichier.
+
+Signatures reconnues:
+- TIFF classique: "II*\\0" (little-endian) / "MM\\0*" (big-endian)
+- BigTIFF: "II+\\0" / "MM\\0+" (Leica SCN, gros Ventana BIF, etc.)
+- DICOM: préambule 128 octets + "DICM"
+- Zeiss CZI: "ZISRAWFILE"
+- SQLite (Sakura SVSlide): "SQLite format 3\\0"
+- INI: première section "[...]" (Hamamatsu VMS/VMU)
+
+Docs:
+- TIFF 6.0: https://www.itu.int/itudoc/itu-t/com16/tiff-fx/docs/tiff6.pdf
+- BigTIFF: https://www.awaresystems.be/imaging/tiff/bigtiff.html
+- DICOM Part 10: https://dicom.nema.org/medical/dicom/current/output/chtml/part10/chapter_7.html
+"""
+
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+# Octets lus en une seule fois (couvre le préambule DICOM + méta-header)
+HEADER_SIZE = 4096
+
+# SOP Class UID "VL Whole Slide Microscopy Image Storage"
+DICOM_WSI_SOP_CLASS_UID = b"1.2.840.10008.5.1.4.1.1.77.1.6"
+
+# Tag TIFF TileWidth (présent sur les IFDs tuilés = niveaux pyramidaux)
+TIFF_TAG_TILE_WIDTH = 322
+
+# Garde-fous parsing IFD (fichiers corrompus / boucles)
+MAX_TIFF_IFDS = 64
+MAX_TIFF_IFD_ENTRIES = 4096
+
+
+@dataclass
+class FileSignature:
+    """
+    Classification d'un fichier depuis son en-tête.
+
+    Attributes:
+        kind: "tiff", "bigtiff", "dicom", "czi", "sqlite", "ini" ou "unknown"
+        byte_order: "<" ou ">" pour TIFF/BigTIFF, None sinon
+        tiled: TIFF avec au moins un IFD tuilé (None si non déterminé)
+        dicom_wsi: DICOM avec le SOP Class WSI dans le méta-header
+        ini_section: Première section INI (ex: "Virtual Microscope Specimen")
+    """
+    kind: str
+    byte_order: Optional[str] = None
+    tiled: Optional[bool] = None
+    dicom_wsi: bool = False
+    ini_section: Optional[str] = None
+
+    @property
+    def is_tiff(self) -> bool:
+        return self.kind in ("tiff", "bigtiff")
+
+
+def read_signature(file_path: Path, inspect_tiff_ifds: bool = False) -> Optional[FileSignature]:
+    """
+    Lit l'en-tête d'un fichier et le classe.
+
+    Args:
+        file_path: Fichier candidat
+        inspect_tiff_ifds: Si True, parcourt la chaîne d'IFDs TIFF pour savoir
+                           si le fichier est tuilé (quelques petites lectures)
+
+    Returns:
+        FileSignature, ou None si le fichier est illisible
+
+    Technical Notes:
+        - Une seule ouverture, HEADER_SIZE octets lus
+        - Le parcours d'IFDs lit ~12-20 octets par entrée, sans décoder d'image
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            signature = classify_header(header)
+            if inspect_tiff_ifds and signature.is_tiff:
+                signature.tiled = _tiff_has_tiled_ifd(f, header, signature)
+            return signature
+    except OSError:
+        return None
+
+
+def classify_header(header: bytes) -> FileSignature:
+    """Classe un en-tête brut (sans I/O)."""
+    prefix = header[:4]
+
+    if prefix in (b"II*\x00", b"MM\x00*"):
+        return FileSignature(kind="tiff", byte_order="<" if prefix[:2] == b"II" else ">")
+    if prefix in (b"II+\x00", b"MM\x00+"):
+        return FileSignature(kind="bigtiff", byte_order="<" if prefix[:2] == b"II" else ">")
+    if header[128:132] == b"DICM":
+        return FileSignature(kind="dicom", dicom_wsi=DICOM_WSI_SOP_CLASS_UID in header)
+    if header.startswith(b"ZISRAWFILE"):
+        return FileSignature(kind="czi")
+    if header.startswith(b"SQLite format 3\x00"):
+        return FileSignature(kind="sqlite")
+
+    section = _first_ini_section(header)
+    if section is not None:
+        return FileSignature(kind="ini", ini_section=section)
+
+    return FileSignature(kind="unknown")
+
+
+def _first_ini_section(header: bytes) -> Optional[str]:
+    """Nom de la première section INI ("[Nom]"), en ignorant BOM/commentaires."""
+    text = header[:1024].decode('utf-8', errors='ignore').lstrip('﻿')
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith((';', '#')):
+            continue
+        if line.startswith('[') and ']' in line:
+            return line[1:line.index(']')]
+        return None
+    return None
+
+
+def _tiff_has_tiled_ifd(f: BinaryIO, header: bytes, signature: FileSignature) -> Optional[bool]:
+    """
+    Parcourt la chaîne d'IFDs et cherche le tag TileWidth.
+
+    Returns:
+        True si un IFD tuilé existe, False si aucun, None si parsing impossible
+
+    Technical Notes:
+        - Tous les formats TIFF d'OpenSlide (generic-tiff, aperio, ventana,
+          trestle, philips) exigent des niveaux tuilés
+        - Un TIFF en strips uniquement (scan, photo, export) est rejeté
+    """
+    order = signature.byte_order
+    try:
+        if signature.kind == "tiff":
+            offset = struct.unpack(order + "I", header[4:8])[0]
+            count_fmt, entry_size, next_fmt = "H", 12, "I"
+        else:
+            offset = struct.unpack(order + "Q", header[8:16])[0]
+            count_fmt, entry_size, next_fmt = "Q", 20, "Q"
+
+        count_size = struct.calcsize(count_fmt)
+        next_size = struct.calcsize(next_fmt)
+        visited = set()
+
+        while offset and offset not in visited and len(visited) < MAX_TIFF_IFDS:
+            visited.add(offset)
+            f.seek(offset)
+            raw_count = f.read(count_size)
+            if len(raw_count) < count_size:
+                return None
+            count = struct.unpack(order + count_fmt, raw_count)[0]
+            if count > MAX_TIFF_IFD_ENTRIES:
+                return None
+
+            entries = f.read(count * entry_size)
+            if len(entries) < count * entry_size:
+                return None
+            for i in range(count):
+                tag = struct.unpack_from(order + "H", entries, i * entry_size)[0]
+                if tag == TIFF_TAG_TILE_WIDTH:
+                    return True
+
+            raw_next = f.read(next_size)
+            if len(raw_next) < next_size:
+                return None
+            offset = struct.unpack(order + next_fmt, raw_next)[0]
+
+        # Chaîne tronquée par le garde-fou: on ne conclut pas
+        return False if not offset else None
+    except (OSError, struct.error):
+        return None
@@ -4,8 +4,9 @@ Folder Browser Service
 Service de navigation hiérarchique dans le répertoire /Slides.
 
 Fonctionnalités:
-- Navigation dossier par dossier (non-récursive)
-- Détection des slides avec format_detector
+- Navigation dossier par dossier (non-récursive, un seul os.scandir)
+- Pagination offset/limit (grands dossiers: première page rapide)
+- Détection des slides avec format_detector (page courante uniquement)
 - Sécurité: path traversal bloqué
 - Support fichiers sans extension (marqués non supportés)
 
@@ -13,13 +14,20 @@ Voir: docs/USER_GUIDE_SLIDE_STRUCTURE.md pour règles complètes
 """
 
 import os
-import hashlib
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from services.format_detector import FormatDetector
+from services.slide_catalog import SLIDES_ROOT, slide_catalog, slide_id_for_relative_path
 
-# Répertoire racine des slides (configurable)
-SLIDES_ROOT = Path(__file__).parent.parent.parent / "Slides"
+# Nombre max de dossiers dont le compte d'items est mémorisé
+FOLDER_COUNT_CACHE_SIZE = 10000
+
+# {chemin dossier: (mtime_ns, nombre d'items)} (LRU)
+_count_cache: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+_count_cache_lock = threading.Lock()
 
 
 def is_safe_path(requested_path: str) -> bool:
@@ -84,49 +92,83 @@ def get_breadcrumb(path: str) -> List[str]:
     return segments
 
 
-def count_items_in_folder(folder_path: Path) -> int:
+def count_items_in_folder(folder_path: Path, mtime_ns: Optional[int] = None) -> int:
     """
     Compte le nombre d'items (fichiers + dossiers) dans un dossier.
 
     Args:
         folder_path: Chemin absolu du dossier
+        mtime_ns: mtime du dossier si déjà connu (évite un stat)
 
     Returns:
         Nombre d'items (0 si erreur)
+
+    Technical Notes:
+        - Mémorisé par (dossier, mtime): ajouter/supprimer une entrée change
+          le mtime du dossier, donc le cache ne sert jamais un compte périmé
+        - Comptage via os.scandir sans stat ni tri
     """
+    key = str(folder_path)
     try:
-        return len(list(folder_path.iterdir()))
+        if mtime_ns is None:
+            mtime_ns = os.stat(key).st_mtime_ns
+
+        with _count_cache_lock:
+            cached = _count_cache.get(key)
+            if cached is not None and cached[0] == mtime_ns:
+                _count_cache.move_to_end(key)
+                return cached[1]
+
+        with os.scandir(key) as it:
+            count = sum(1 for _ in it)
     except (PermissionError, OSError):
         return 0
 
+    with _count_cache_lock:
+        _count_cache[key] = (mtime_ns, count)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > FOLDER_COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return count
+
 
 def generate_slide_id(file_path: Path) -> str:
     """
-    Génère un ID unique pour une lame (hash MD5 du chemin).
+    Génère l'ID unique d'une lame (hash MD5 du chemin relatif à /Slides).
 
-    IMPORTANT: Doit utiliser la MÊME méthode que slide_scanner.py
-    pour garantir cohérence des IDs entre browse et scan complet.
+    IMPORTANT: Délègue au schéma canonique du catalogue
+    (slide_catalog.slide_id_for_relative_path) pour garantir les MÊMES IDs
+    entre browse, liste des lames et résolution ID->Path.
 
     Args:
-        file_path: Chemin absolu du fichier
+        file_path: Chemin du fichier sous SLIDES_ROOT
 
     Returns:
         Hash MD5 tronqué (12 premiers caractères hexadécimaux)
 
     Examples:
-        >>> generate_slide_id(Path("/Slides/3DHistech/sample.mrxs"))
+        >>> generate_slide_id(SLIDES_ROOT / "3DHistech" / "sample.mrxs")
         "a1b2c3d4e5f6"
     """
-    path_str = str(file_path)  # Utiliser le même que slide_scanner (pas .resolve())
-    return hashlib.md5(path_str.encode()).hexdigest()[:12]  # Tronquer à 12 caractères
+    return slide_id_for_relative_path(file_path.relative_to(SLIDES_ROOT).as_posix())
 
 
-def browse_directory(relative_path: str = "/") -> Dict:
+def browse_directory(
+    relative_path: str = "/",
+    offset: int = 0,
+    limit: Optional[int] = None,
+    include_counts: bool = True,
+    timings: Optional[Dict[str, float]] = None
+) -> Dict:
     """
     Navigue dans un dossier de /Slides et détecte son contenu.
 
     Args:
         relative_path: Chemin relatif depuis /Slides (ex: "/", "/3DHistech")
+        offset: Index du premier item de la page (dossiers puis fichiers)
+        limit: Nombre max d'items (None = tout le dossier)
+        include_counts: Calculer item_count des sous-dossiers (None sinon)
+        timings: Si fourni, reçoit les durées "list", "counts", "detect" (secondes)
 
     Returns:
         Dictionnaire avec:
@@ -136,14 +178,22 @@ def browse_directory(relative_path: str = "/") -> Dict:
         - folders: Liste des sous-dossiers
         - slides: Liste des lames détectées
         - files: Liste des fichiers non-slides
+        - total: Nombre total d'items listables du dossier
+        - offset / limit: Fenêtre retournée
+        - has_more: True s'il reste des items après cette page
 
     Raises:
         PermissionError: Path traversal ou chemin invalide
         FileNotFoundError: Dossier introuvable
 
     Technical Notes:
-        - Lecture NON récursive (un seul niveau)
-        - Utilise format_detector pour identifier les slides
+        - Lecture NON récursive (un seul niveau), un seul os.scandir:
+          type des entrées via d_type, pas de stat par entrée
+        - Relations companion résolues depuis l'ensemble des noms en mémoire
+          (sample.mrxs + sample/, slide.vms + slide.vmu): aucun exists()
+        - Ordre: dossiers puis fichiers, alphabétique insensible à la casse
+        - Seuls les fichiers de la page demandée passent par format_detector
+          (en parallèle, résultats mémorisés dans detection_cache)
         - Fichiers sans extension marqués non supportés
         - Les dossiers companions (.mrxs/) sont détectés mais pas listés séparément
 
@@ -155,7 +205,11 @@ def browse_directory(relative_path: str = "/") -> Dict:
             "breadcrumb": ["/"],
             "folders": [{"name": "3DHistech", "path": "/3DHistech", "item_count": 5}],
             "slides": [...],
-            "files": [...]
+            "files": [...],
+            "total": 6,
+            "offset": 0,
+            "limit": None,
+            "has_more": False
         }
     """
     # Normaliser le chemin (convertir backslashes en forward slashes)
@@ -168,12 +222,6 @@ def browse_directory(relative_path: str = "/") -> Dict:
     # Construire le chemin absolu
     current_dir = SLIDES_ROOT / normalized_path.lstrip("/")
 
-    if not current_dir.exists():
-        raise FileNotFoundError(f"Directory not found: {normalized_path}")
-
-    if not current_dir.is_dir():
-        raise ValueError(f"Not a directory: {normalized_path}")
-
     # Calculer le chemin parent
     if normalized_path == "/":
         parent_path = None
@@ -184,93 +232,86 @@ def browse_directory(relative_path: str = "/") -> Dict:
     # Fil d'Ariane
     breadcrumb = get_breadcrumb(normalized_path)
 
-    # Initialiser les listes de résultats
-    folders = []
-    slides = []
-    files = []
+    # Lecture unique du dossier
+    lap = time.perf_counter()
+    dir_entries, file_entries = _scan_folder(current_dir, normalized_path)
+    dir_names = {entry.name for entry in dir_entries}
+    file_names = {entry.name for entry in file_entries}
+
+    # Dossiers companions (sample/ à côté de sample.mrxs): pas listés séparément
+    # Fichiers .vmu accompagnant un .vms: dépendance du .vms, pas listés
+    visible_dirs = [e for e in dir_entries if f"{e.name}.mrxs" not in file_names]
+    visible_files = [e for e in file_entries if not _is_vms_companion(e.name, file_names)]
+    visible_dirs.sort(key=lambda e: e.name.lower())
+    visible_files.sort(key=lambda e: e.name.lower())
+
+    # Fenêtre demandée (dossiers puis fichiers)
+    total = len(visible_dirs) + len(visible_files)
+    end = total if limit is None else min(total, offset + limit)
+    page_dirs = visible_dirs[offset:end]
+    page_files = visible_files[max(0, offset - len(visible_dirs)):max(0, end - len(visible_dirs))]
+
+    if timings is not None:
+        now = time.perf_counter()
+        timings["list"], lap = now - lap, now
 
-    # Initialiser le détecteur de format
+    folders = []
+    for entry in page_dirs:
+        item_count = None
+        if include_counts:
+            item_count = count_items_in_folder(Path(entry.path), _entry_mtime_ns(entry))
+        folders.append({
+            "name": entry.name,
+            "path": _join_relative(normalized_path, entry.name),
+            "item_count": item_count
+        })
+
+    if timings is not None:
+        now = time.perf_counter()
+        timings["counts"], lap = now - lap, now
+
+    # Détection des fichiers de la page uniquement
+    # (résultats mémorisés dans detection_cache, partagé avec les scans:
+    # revenir dans un dossier déjà visité ne relance pas OpenSlide)
     detector = FormatDetector()
+    candidates = [Path(e.path) for e in page_files if FormatDetector.is_candidate(e.name)]
+    detected = dict(zip(candidates, detector.detect_many(candidates)))
+    if timings is not None:
+        timings["detect"] = time.perf_counter() - lap
 
-    # Ensemble des fichiers/dossiers déjà traités (pour éviter doublons)
-    processed = set()
-
-    # Scanner le contenu du dossier
-    for item in sorted(current_dir.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-        item_name = item.name
-
-        # Ignorer les fichiers cachés et système
-        if item_name.startswith(".") or item_name.startswith("__"):
-            continue
-
-        # Chemin relatif de l'item (utiliser forward slashes)
-        item_relative_path = str(Path(normalized_path) / item_name).replace('\\', '/')
-
-        if item.is_dir():
-            # Vérifier si c'est un dossier companion (ex: sample.mrxs/)
-            # Si oui, ne pas le lister comme dossier normal
-            parent_file = current_dir / f"{item_name}.mrxs"
-            if parent_file.exists():
-                # C'est un companion directory pour un fichier .mrxs
-                # On ne le liste pas séparément
-                processed.add(item_name)
-                continue
-
-            # Dossier normal
-            folders.append({
-                "name": item_name,
-                "path": item_relative_path,
-                "item_count": count_items_in_folder(item)
+    slides = []
+    files = []
+    for entry in page_files:
+        item = Path(entry.path)
+        slide_format = detected.get(item)
+
+        if slide_format:
+            # C'est une lame valide (ou potentiellement valide)
+            slides.append({
+                "name": entry.name,
+                "path": str(item.relative_to(SLIDES_ROOT)),
+                "id": generate_slide_id(item),
+                "format_string": slide_format.format_string or "Unknown",
+                "structure_type": slide_format.structure_type,
+                "is_supported": slide_format.is_supported,
+                "notes": slide_format.notes,
+                "dependencies": _get_dependency_paths(item, slide_format, dir_names, file_names)
+            })
+        else:
+            # Fichier non reconnu
+            extension = item.suffix if item.suffix else None
+
+            files.append({
+                "name": entry.name,
+                "extension": extension,
+                "is_supported": False,
+                "notes": "Unknown format - no extension or unsupported" if not extension else f"Extension {extension} not recognized"
             })
-            processed.add(item_name)
-
-        elif item.is_file():
-            # Ignorer si déjà traité (ex: fichier .vmu associé à .vms)
-            if item_name in processed:
-                continue
-
-            # Tenter de détecter le format
-            slide_format = detector.detect_format(item)
-
-            if slide_format:
-                # C'est une lame valide (ou potentiellement valide)
-                slides.append({
-                    "name": item_name,
-                    "path": str(item.relative_to(SLIDES_ROOT)),
-                    "id": generate_slide_id(item),
-                    "format_string": slide_format.format_string or "Unknown",
-                    "structure_type": slide_format.structure_type,
-                    "is_supported": slide_format.is_supported,
-                    "notes": slide_format.notes,
-                    "dependencies": _get_dependency_paths(item, slide_format)
-                })
-
-                # Marquer les fichiers associés comme traités
-                if slide_format.structure_type == "multi-file":
-                    # Ex: .vms a un .vmu associé
-                    vmu_file = current_dir / f"{item.stem}.vmu"
-                    if vmu_file.exists():
-                        processed.add(vmu_file.name)
-
-                elif slide_format.structure_type == "with-companion-dir":
-                    # Ex: .mrxs a un dossier companion
-                    companion_dir = current_dir / item.stem
-                    if companion_dir.exists():
-                        processed.add(companion_dir.name)
-
-                processed.add(item_name)
-
-            else:
-                # Fichier non reconnu
-                extension = item.suffix if item.suffix else None
-
-                files.append({
-                    "name": item_name,
-                    "extension": extension,
-                    "is_supported": False,
-                    "notes": "Unknown format - no extension or unsupported" if not extension else f"Extension {extension} not recognized"
-                })
-                processed.add(item_name)
+
+    # IDs résolubles immédiatement (tuiles, info) sans attendre un rescan
+    if slides:
+        root = SLIDES_ROOT.resolve()
+        slide_catalog.register_ids(root, [str(root / slide["path"]) for slide in slides])
 
     return {
         "current_path": normalized_path,
@@ -278,17 +319,79 @@ def browse_directory(relative_path: str = "/") -> Dict:
         "breadcrumb": breadcrumb,
         "folders": folders,
         "slides": slides,
-        "files": files
+        "files": files,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "has_more": end < total
     }
 
 
-def _get_dependency_paths(entry_point: Path, slide_format) -> List[str]:
+def _scan_folder(current_dir: Path, normalized_path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+    """
+    Liste un dossier en une passe os.scandir.
+
+    Returns:
+        (entrées dossiers, entrées fichiers), fichiers cachés/système exclus
+
+    Raises:
+        FileNotFoundError: Dossier introuvable
+        ValueError: Le chemin n'est pas un dossier
+    """
+    dir_entries = []
+    file_entries = []
+    try:
+        with os.scandir(current_dir) as it:
+            for entry in it:
+                # Ignorer les fichiers cachés et système
+                if entry.name.startswith(".") or entry.name.startswith("__"):
+                    continue
+                try:
+                    if entry.is_dir():
+                        dir_entries.append(entry)
+                    elif entry.is_file():
+                        file_entries.append(entry)
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Directory not found: {normalized_path}")
+    except NotADirectoryError:
+        raise ValueError(f"Not a directory: {normalized_path}")
+    return dir_entries, file_entries
+
+
+def _is_vms_companion(file_name: str, file_names: Set[str]) -> bool:
+    """True pour slide.vmu quand slide.vms est présent (fichier joint du .vms)."""
+    stem, ext = os.path.splitext(file_name)
+    return ext.lower() == ".vmu" and any(f"{stem}{vms}" in file_names for vms in (".vms", ".VMS"))
+
+
+def _entry_mtime_ns(entry: os.DirEntry) -> Optional[int]:
+    try:
+        return entry.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _join_relative(normalized_path: str, name: str) -> str:
+    """Chemin relatif d'un item (forward slashes)."""
+    return str(Path(normalized_path) / name).replace('\\', '/')
+
+
+def _get_dependency_paths(
+    entry_point: Path,
+    slide_format,
+    dir_names: Set[str],
+    file_names: Set[str]
+) -> List[str]:
     """
     Liste les chemins relatifs des dépendances d'une lame.
 
     Args:
         entry_point: Fichier principal de la lame
         slide_format: Objet SlideFormat retourné par le détecteur
+        dir_names: Noms des sous-dossiers du dossier courant
+        file_names: Noms des fichiers du dossier courant
 
     Returns:
         Liste des chemins relatifs des fichiers/dossiers associés
@@ -304,14 +407,14 @@ def _get_dependency_paths(entry_point: Path, slide_format) -> List[str]:
 
     if slide_format.structure_type == "multi-file":
         # Ex: .vms nécessite .vmu
-        vmu_file = entry_point.parent / f"{entry_point.stem}.vmu"
-        if vmu_file.exists():
-            dependencies.append(str(vmu_file.relative_to(SLIDES_ROOT)))
+        vmu_name = f"{entry_point.stem}.vmu"
+        if vmu_name in file_names:
+            dependencies.append(str((entry_point.parent / vmu_name).relative_to(SLIDES_ROOT)))
 
     elif slide_format.structure_type == "with-companion-dir":
         # Ex: .mrxs nécessite dossier companion
-        companion_dir = entry_point.parent / entry_point.stem
-        if companion_dir.exists():
+        if entry_point.stem in dir_names:
+            companion_dir = entry_point.parent / entry_point.stem
             dependencies.append(str(companion_dir.relative_to(SLIDES_ROOT)) + "/")
 
     return dependencies
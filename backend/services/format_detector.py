@@ -15,14 +15,54 @@ Author: VarunaPoC Team
 Version: 1.5.0
 """
 
-import openslide
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, Iterable, List, Optional, Set
 from dataclasses import dataclass, field
 import logging
+from services.file_signature import read_signature
+from utils.metrics import Histogram
+from utils.openslide_loader import get_openslide
 
 logger = logging.getLogger(__name__)
 
+# Threads pour le parcours/détection (I/O-bound: NFS → plus de threads que de cœurs)
+SCAN_WORKERS = int(os.environ.get("VARUNA_SCAN_WORKERS", min(32, (os.cpu_count() or 1) * 4)))
+
+# Période des logs de progression pendant un scan (secondes)
+SCAN_PROGRESS_INTERVAL = 5.0
+
+# Durée d'une détection réelle (hors mémo et pré-filtre), par extension (GET /metrics)
+DETECTION_SECONDS = Histogram("varuna_detection_seconds", "Slide format detection duration", ("ext",))
+
+# Pré-filtre: type d'en-tête attendu par extension (voir FormatDetector._prefilter)
+PREFILTER_EXPECTED_KIND = {
+    '.tif': 'tiff', '.tiff': 'tiff', '.svs': 'tiff', '.ndpi': 'tiff',
+    '.scn': 'tiff', '.bif': 'tiff',
+    '.dcm': 'dicom',
+    '.czi': 'czi',
+    '.svslide': 'sqlite',
+    '.vms': 'ini', '.vmu': 'ini',
+}
+
+# Sections INI attendues pour Hamamatsu VMS/VMU
+VMS_INI_SECTIONS = {
+    '.vms': 'Virtual Microscope Specimen',
+    '.vmu': 'Uncompressed Virtual Microscope Specimen',
+}
+
+# Taille max du mémo de détection partagé (nombre de fichiers)
+DETECTION_CACHE_SIZE = int(os.environ.get("VARUNA_DETECTION_CACHE_SIZE", "50000"))
+
+# Appels OpenSlide que coûterait un candidat rejeté (detect_format + test
+# d'ouverture pour BIF/DICOM)
+OPENSLIDE_CALLS_BY_EXT = {'.bif': 2, '.dcm': 2}
+
 
 @dataclass
 class SlideFormat:
@@ -53,6 +93,74 @@ class SlideFormat:
     notes: str = ""
 
 
+class DetectionCache:
+    """
+    Mémo process-wide des résultats de détection (LRU borné, thread-safe).
+
+    Clé: (chemin résolu, taille, mtime_ns, mtime du dossier lié)
+        - MIRAX: mtime du dossier compagnon (Data*.dat ajoutés/supprimés)
+        - VMS/VMU: mtime du dossier parent (tuiles .jpg/.ngr jointes)
+
+    Un fichier modifié change de clé: l'ancienne entrée n'est plus jamais
+    lue et sort du LRU naturellement (pas d'invalidation explicite).
+    Les résultats négatifs (None) sont aussi mémorisés.
+    """
+
+    MISS = object()
+
+    def __init__(self, max_entries: int = DETECTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Optional[SlideFormat]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(resolved: str, file_path: Path, file_stat: os.stat_result, ext: str) -> tuple:
+        if ext == '.mrxs':
+            related_dir = file_path.parent / file_path.stem
+        elif ext in ('.vms', '.vmu'):
+            related_dir = file_path.parent
+        else:
+            related_dir = None
+
+        related_mtime = None
+        if related_dir is not None:
+            try:
+                related_mtime = os.stat(related_dir).st_mtime_ns
+            except OSError:
+                related_mtime = -1
+
+        return (resolved, file_stat.st_size, file_stat.st_mtime_ns, related_mtime)
+
+    def get(self, key: tuple):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return self.MISS
+
+    def put(self, key: tuple, result: Optional[SlideFormat]):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Instance globale (partagée par browse, scans et catalogue)
+detection_cache = DetectionCache()
+
+
 class FormatDetector:
     """
     Détecteur intelligent de formats OpenSlide.
@@ -65,13 +173,34 @@ class FormatDetector:
         - https://openslide.org/api/python/#openslide.OpenSlide.detect_format
     """
 
+    # Extensions pouvant être un POINT D'ENTRÉE (voir dispatch de detect_format)
+    ENTRY_EXTENSIONS = frozenset({
+        '.vms', '.vmu', '.ndpi', '.mrxs', '.svs', '.scn', '.bif',
+        '.svslide', '.czi', '.zvi', '.dcm', '.tif', '.tiff',
+    })
+
+    @classmethod
+    def is_candidate(cls, file_name: str) -> bool:
+        """
+        True si l'extension du fichier peut correspondre à une lame.
+
+        Technical Notes:
+            - Aucun accès disque (filtre sur le nom uniquement)
+            - Les autres fichiers sont ignorés par detect_format() de toute façon
+        """
+        return os.path.splitext(file_name)[1].lower() in cls.ENTRY_EXTENSIONS
+
     def __init__(self):
         self.detected_entries: Set[str] = set()  # Éviter duplicata
+        self._stats_lock = threading.Lock()  # detect_format() appelé depuis plusieurs threads
         self.scan_stats = {
             'scanned': 0,
             'detected': 0,
             'ignored': 0,
-            'errors': 0
+            'errors': 0,
+            'prefiltered': 0,
+            'openslide_calls_avoided': 0,
+            'cache_hits': 0
         }
 
     def detect_format(self, file_path: Path) -> Optional[SlideFormat]:
@@ -79,7 +208,7 @@ class FormatDetector:
         Détecte format d'une lame depuis un fichier.
 
         Process:
-            1. Vérifie extension/structure
+            1. Vérifie extension + en-tête (pré-filtre magic bytes, sans OpenSlide)
             2. Recherche fichiers joints/compagnons requis
             3. Valide avec OpenSlide.detect_format()
             4. Construit SlideFormat complet
@@ -93,14 +222,22 @@ class FormatDetector:
         Notes:
             - Incrémente scan_stats automatiquement
             - Évite détection multiple du même entry_point
+            - Résultat mémorisé dans detection_cache (partagé par tout le
+              processus, clé = chemin résolu + taille + mtime)
+            - Thread-safe (voir detect_many)
         """
-        self.scan_stats['scanned'] += 1
+        self._count('scanned')
 
-        if not file_path.exists() or not file_path.is_file():
+        try:
+            file_stat = file_path.stat()
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
             return None
 
         # Éviter duplicata
-        if str(file_path.resolve()) in self.detected_entries:
+        resolved = str(file_path.resolve())
+        if resolved in self.detected_entries:
             return None
 
         ext = file_path.suffix.lower()
@@ -124,24 +261,85 @@ class FormatDetector:
 
         detector_func = detector_map.get(ext)
         if detector_func:
+            # Mémo partagé (browse + scans): évite de relancer OpenSlide
+            cache_key = detection_cache.make_key(resolved, file_path, file_stat, ext)
+            cached = detection_cache.get(cache_key)
+            if cached is not DetectionCache.MISS:
+                self._count('cache_hits')
+                return self._record_result(cached, resolved, file_path, from_cache=True)
+
+            rejection = self._prefilter(file_path, ext)
+            if rejection is not None:
+                self._count('prefiltered')
+                self._count('openslide_calls_avoided', OPENSLIDE_CALLS_BY_EXT.get(ext, 1))
+                logger.debug(f"[X] Prefilter rejected: {file_path.name} ({rejection})")
+                detection_cache.put(cache_key, None)
+                return self._record_result(None, resolved, file_path, from_cache=True)
+
+            start = time.perf_counter()
             result = detector_func(file_path)
-            if result:
-                self.scan_stats['detected'] += 1
-                self.detected_entries.add(str(file_path.resolve()))
-                if result.is_supported:
-                    logger.info(f"[OK] Detected: {result.name} - {file_path.name}")
-                else:
-                    logger.warning(f"[UNSUPPORTED] Detected but cannot open: {result.name} - {file_path.name}")
-            else:
-                self.scan_stats['ignored'] += 1
-                logger.debug(f"[X] Ignored: {file_path.name} (not a slide format)")
-            return result
+            DETECTION_SECONDS.observe(time.perf_counter() - start, (ext,))
+            detection_cache.put(cache_key, result)
+            return self._record_result(result, resolved, file_path)
 
         # Extension inconnue - essayer détection par contenu
-        self.scan_stats['ignored'] += 1
+        self._count('ignored')
         logger.debug(f"✗ Unknown extension: {file_path.name}")
         return None
 
+    def _record_result(
+        self,
+        result: Optional[SlideFormat],
+        resolved: str,
+        file_path: Path,
+        from_cache: bool = False
+    ) -> Optional[SlideFormat]:
+        """Met à jour stats/duplicata et logge le résultat d'une détection."""
+        if result:
+            self._count('detected')
+            with self._stats_lock:
+                self.detected_entries.add(resolved)
+            if from_cache:
+                logger.debug(f"[OK] Detected (cached): {result.name} - {file_path.name}")
+            elif result.is_supported:
+                logger.info(f"[OK] Detected: {result.name} - {file_path.name}")
+            else:
+                logger.warning(f"[UNSUPPORTED] Detected but cannot open: {result.name} - {file_path.name}")
+        else:
+            self._count('ignored')
+            if not from_cache:
+                logger.debug(f"[X] Ignored: {file_path.name} (not a slide format)")
+        return result
+
+    def detect_many(
+        self,
+        file_paths: List[Path],
+        max_workers: int = SCAN_WORKERS
+    ) -> List[Optional[SlideFormat]]:
+        """
+        Détecte plusieurs fichiers en parallèle (pool de threads).
+
+        Args:
+            file_paths: Fichiers candidats
+            max_workers: Nombre de threads (1 = séquentiel)
+
+        Returns:
+            Résultats dans le MÊME ordre que file_paths (déterministe)
+
+        Technical Notes:
+            - OpenSlide.detect_format() libère le GIL pendant les I/O
+            - Gain surtout sur NFS où la latence de stat/open domine
+        """
+        if max_workers <= 1 or len(file_paths) <= 1:
+            return [self.detect_format(path) for path in file_paths]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-detect") as pool:
+            return list(pool.map(self.detect_format, file_paths))
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.scan_stats[key] += amount
+
     # =========================================================================
     # HAMAMATSU FORMATS
     # Doc: https://openslide.org/formats/hamamatsu/
@@ -163,9 +361,8 @@ class FormatDetector:
         """
         logger.debug(f"Checking Hamamatsu VMS: {vms_file.name}")
 
-        # Vérifier que c'est un fichier INI VMS valide
-        if not self._is_vms_ini_file(vms_file):
-            return None
+        # Section INI [Virtual Microscope Specimen] déjà vérifiée par le
+        # pré-filtre de detect_format() (voir _prefilter)
 
         # Chercher fichiers JOINTS .jpg dans même dossier
         jpg_pattern = f"{vms_file.stem}*.jpg"
@@ -212,8 +409,7 @@ class FormatDetector:
         """
         logger.debug(f"Checking Hamamatsu VMU: {vmu_file.name}")
 
-        if not self._is_vmu_ini_file(vmu_file):
-            return None
+        # Section INI déjà vérifiée par le pré-filtre (voir _prefilter)
 
         # Chercher fichiers .ngr
         ngr_pattern = f"{vmu_file.stem}*.ngr"
@@ -398,6 +594,7 @@ class FormatDetector:
         is_openable = True
         error_note = "Single-file BIF format"
 
+        openslide = get_openslide()
         try:
             # Test d'ouverture réelle (pas juste détection)
             test_slide = openslide.OpenSlide(str(bif_file))
@@ -592,6 +789,7 @@ class FormatDetector:
         is_openable = True
         error_note = "Single DICOM file"
 
+        openslide = get_openslide()
         try:
             test_slide = openslide.OpenSlide(str(dcm_file))
             test_slide.close()
@@ -695,88 +893,234 @@ class FormatDetector:
             None si non supporté
         """
         try:
-            format_str = openslide.OpenSlide.detect_format(str(file_path))
+            format_str = get_openslide().OpenSlide.detect_format(str(file_path))
             if format_str:
                 logger.debug(f"OpenSlide validated: {file_path.name} → {format_str}")
             return format_str
         except Exception as e:
             logger.debug(f"OpenSlide validation failed for {file_path.name}: {e}")
-            self.scan_stats['errors'] += 1
+            self._count('errors')
             return None
 
-    def _is_vms_ini_file(self, file_path: Path) -> bool:
-        """
-        Vérifie si fichier est un INI VMS valide.
-        Section attendue: [Virtual Microscope Specimen]
+    def _prefilter(self, file_path: Path, ext: str) -> Optional[str]:
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(500)
-                return '[Virtual Microscope Specimen]' in content
-        except:
-            return False
+        Pré-filtre par en-tête (magic bytes) AVANT tout appel OpenSlide.
 
-    def _is_vmu_ini_file(self, file_path: Path) -> bool:
-        """
-        Vérifie si fichier est un INI VMU valide.
-        Section attendue: [Uncompressed Virtual Microscope Specimen]
+        Returns:
+            Raison du rejet, ou None si le fichier doit passer à la détection
+
+        Technical Notes:
+            - Un seul open() + lecture de 4 Ko (services/file_signature.py)
+            - .tif/.tiff: IFDs parcourus, TIFF sans aucune tuile rejeté
+              (tous les formats TIFF d'OpenSlide sont tuilés)
+            - .dcm: préambule DICM + SOP Class WSI exigés (CT, IRM, etc. rejetés)
+            - .mrxs/.zvi: pas de pré-filtre (MRXS validé via dossier compagnon,
+              ZVI jamais passé à OpenSlide)
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(500)
-                return '[Uncompressed Virtual Microscope Specimen]' in content
-        except:
-            return False
+        expected = PREFILTER_EXPECTED_KIND.get(ext)
+        if expected is None:
+            return None
+
+        signature = read_signature(file_path, inspect_tiff_ifds=ext in ('.tif', '.tiff'))
+        if signature is None:
+            return "unreadable"
+
+        if expected == "tiff":
+            if not signature.is_tiff:
+                return f"not a TIFF ({signature.kind})"
+            if signature.tiled is False:
+                return "TIFF without tiled IFD (not pyramidal)"
+        elif expected == "dicom":
+            if signature.kind != "dicom":
+                return f"no DICM preamble ({signature.kind})"
+            if not signature.dicom_wsi:
+                return "DICOM without WSI SOP Class"
+        elif expected == "ini":
+            section = VMS_INI_SECTIONS[ext]
+            if signature.ini_section != section:
+                return f"INI section [{section}] not found"
+        elif signature.kind != expected:
+            return f"expected {expected}, got {signature.kind}"
+
+        return None
 
     # =========================================================================
     # DIRECTORY SCANNING
     # =========================================================================
 
-    def scan_directory(self, root_dir: Path, recursive: bool = True) -> List[SlideFormat]:
+    def scan_directory(
+        self,
+        root_dir: Path,
+        recursive: bool = True,
+        max_workers: int = SCAN_WORKERS
+    ) -> List[SlideFormat]:
         """
         Scan complet d'un dossier.
 
         Process:
-            1. Parcourt tous fichiers (récursif ou non)
-            2. Tente detect_format() sur chaque
-            3. Filtre seulement supportés (is_supported=True)
+            1. Parcourt les dossiers en parallèle avec os.scandir()
+            2. Filtre les candidats sur l'extension (d_type en cache: pas de stat)
+            3. Tente detect_format() sur chaque candidat (pool de threads)
             4. Évite duplicata via detected_entries
 
         Args:
             root_dir: Dossier racine à scanner
             recursive: Si True, scan récursif (défaut)
+            max_workers: Threads pour parcours et détection (VARUNA_SCAN_WORKERS)
 
         Returns:
-            Liste de SlideFormat supportés et validés
+            Liste de SlideFormat (supportés ET non supportés), triée par chemin
         """
-        detected_slides = []
-
         logger.info(f"{'='*60}")
         logger.info(f"Starting scan: {root_dir}")
-        logger.info(f"Recursive: {recursive}")
+        logger.info(f"Recursive: {recursive}, workers: {max_workers}")
         logger.info(f"{'='*60}")
 
         # Reset stats
-        self.scan_stats = {'scanned': 0, 'detected': 0, 'ignored': 0, 'errors': 0}
+        self.scan_stats = {
+            'scanned': 0, 'detected': 0, 'ignored': 0, 'errors': 0,
+            'prefiltered': 0, 'openslide_calls_avoided': 0, 'cache_hits': 0
+        }
+
+        progress = ScanProgress("scan")
+        candidates: List[str] = []
+        candidates_lock = threading.Lock()
 
-        # Parcourir fichiers
-        pattern = '**/*' if recursive else '*'
-        for file_path in root_dir.glob(pattern):
-            if file_path.is_file():
-                slide_format = self.detect_format(file_path)
+        def visit(dir_path: str) -> List[str]:
+            subdirs, files = list_directory(dir_path)
+            found = [path for path in files if FormatDetector.is_candidate(os.path.basename(path))]
+            # Fichiers non candidats: comptés sans appel à detect_format (aucun I/O)
+            self._count('scanned', len(files) - len(found))
+            self._count('ignored', len(files) - len(found))
+            progress.add(dirs=1, files=len(files))
+            with candidates_lock:
+                candidates.extend(found)
+            return subdirs if recursive else []
 
-                # Retourner TOUTES les lames détectées (supportées ET non supportées)
-                # Phase 1.5.1: Inclure CZI détectées par signature même si pas supportées
-                if slide_format:
-                    detected_slides.append(slide_format)
+        walk_directories([str(root_dir)], visit, max_workers=max_workers, progress=progress)
+
+        # Ordre déterministe (indépendant de l'ordonnancement des threads)
+        candidate_paths = [Path(p) for p in sorted(candidates)]
+        results = self.detect_many(candidate_paths, max_workers=max_workers)
+
+        # Retourner TOUTES les lames détectées (supportées ET non supportées)
+        # Phase 1.5.1: Inclure CZI détectées par signature même si pas supportées
+        detected_slides = [slide_format for slide_format in results if slide_format]
 
         # Logs finaux
         logger.info(f"{'='*60}")
-        logger.info(f"Scan complete!")
+        logger.info(f"Scan complete! {progress.summary()}")
         logger.info(f"  Files scanned: {self.scan_stats['scanned']}")
         logger.info(f"  Slides detected: {self.scan_stats['detected']}")
         logger.info(f"  Files ignored: {self.scan_stats['ignored']}")
         logger.info(f"  Errors: {self.scan_stats['errors']}")
+        logger.info(
+            f"  Prefilter: {self.scan_stats['prefiltered']} rejected, "
+            f"{self.scan_stats['openslide_calls_avoided']} OpenSlide calls avoided"
+        )
+        logger.info(f"  Detection cache hits: {self.scan_stats['cache_hits']}")
         logger.info(f"{'='*60}")
 
         return detected_slides
+
+
+# =============================================================================
+# PARCOURS PARALLÈLE
+# =============================================================================
+
+class ScanProgress:
+    """
+    Compteurs de progression d'un parcours (thread-safe).
+
+    Log périodique (SCAN_PROGRESS_INTERVAL) avec débits dirs/s et files/s.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.dirs = 0
+        self.files = 0
+        self._start = time.perf_counter()
+        self._last_log = self._start
+        self._lock = threading.Lock()
+
+    def add(self, dirs: int = 0, files: int = 0):
+        with self._lock:
+            self.dirs += dirs
+            self.files += files
+            now = time.perf_counter()
+            if now - self._last_log < SCAN_PROGRESS_INTERVAL:
+                return
+            self._last_log = now
+        logger.info(f"{self.label} progress: {self.summary()}")
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self._start, 1e-6)
+        return (
+            f"{self.dirs} dirs ({self.dirs / elapsed:.0f} dirs/s), "
+            f"{self.files} files ({self.files / elapsed:.0f} files/s) in {elapsed:.2f}s"
+        )
+
+
+def list_directory(dir_path: str) -> tuple:
+    """
+    Liste un dossier avec os.scandir().
+
+    Returns:
+        (sous-dossiers, fichiers) en chemins absolus; ([], []) si illisible
+
+    Technical Notes:
+        - is_dir()/is_file() utilisent le d_type renvoyé par readdir:
+          pas de stat() par entrée (sauf symlinks et FS sans d_type)
+    """
+    subdirs, files = [], []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning(f"Cannot list directory {dir_path}: {e}")
+    return subdirs, files
+
+
+def walk_directories(
+    start_dirs: Iterable[str],
+    visit: Callable[[str], Iterable[str]],
+    max_workers: int = SCAN_WORKERS,
+    progress: Optional[ScanProgress] = None
+):
+    """
+    Parcours concurrent d'une arborescence.
+
+    Args:
+        start_dirs: Dossiers de départ
+        visit: Fonction appelée pour chaque dossier (dans un thread du pool),
+               retourne les sous-dossiers à visiter ensuite
+        max_workers: Taille du pool (1 = parcours séquentiel)
+        progress: Compteurs de progression (log final)
+
+    Technical Notes:
+        - Les sous-dossiers sont soumis dès qu'un dossier est listé: plusieurs
+          readdir/stat sont en vol simultanément (latence NFS masquée)
+        - L'ordre de visite n'est pas déterministe: trier les résultats
+    """
+    if max_workers <= 1:
+        stack = list(start_dirs)
+        while stack:
+            stack.extend(visit(stack.pop()))
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-walk") as pool:
+            pending = {pool.submit(visit, d) for d in start_dirs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for subdir in future.result():
+                        pending.add(pool.submit(visit, subdir))
+
+    if progress is not None:
+        logger.debug(f"{progress.label} walk done: {progress.summary()}")
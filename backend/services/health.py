@@ -0,0 +1,135 @@
+"""
+Health Service
+
+Capacité du worker pour les sondes de vie et de disponibilité
+(GET /api/health, GET /api/ready).
+
+Pourquoi:
+Un worker bloqué derrière 200 lectures MIRAX en file répondait "healthy"
+et continuait de recevoir du trafic. La readiness tient maintenant compte
+de la saturation: au-delà des seuils le worker se déclare non prêt (503)
+et le load balancer envoie les nouvelles requêtes ailleurs, le temps que
+la file se vide.
+
+Signaux:
+- queue_depth: tuiles en attente d'un worker de tuiles
+- reads_in_flight / oldest_read_s: tuiles en cours de lecture et âge de la
+  plus ancienne (lecture bloquée sur NFS, MIRAX lent)
+- open_handles / max_handles: handles OpenSlide ouverts vs budget
+- tile_cache_bytes / tile_cache_max_bytes: mémoire du cache de tuiles
+- catalog_age_s, catalog_refreshing: fraîcheur du catalogue
+
+Configuration (variables d'environnement, 0 = contrôle désactivé):
+- VARUNA_READY_MAX_QUEUE: file d'attente max (défaut: 4 x VARUNA_TILE_WORKERS)
+- VARUNA_READY_MAX_READ_SECONDS: âge max de la plus ancienne lecture (défaut: 30)
+- VARUNA_READY_MAX_CATALOG_AGE: âge max du catalogue en secondes (défaut: 0)
+- VARUNA_LIVE_MAX_READ_SECONDS: lecture bloquée au-delà → sonde de vie en
+  échec, redémarrage du worker (défaut: 0)
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from services.slide_catalog import slide_catalog
+from services.slide_scanner import SLIDES_DIR
+from services.tile_server import TILE_QUEUE_DEPTH, TILE_WORKERS, tile_server
+
+READY_MAX_QUEUE = int(os.environ.get("VARUNA_READY_MAX_QUEUE", TILE_WORKERS * 4))
+READY_MAX_READ_SECONDS = float(os.environ.get("VARUNA_READY_MAX_READ_SECONDS", "30"))
+READY_MAX_CATALOG_AGE = float(os.environ.get("VARUNA_READY_MAX_CATALOG_AGE", "0"))
+LIVE_MAX_READ_SECONDS = float(os.environ.get("VARUNA_LIVE_MAX_READ_SECONDS", "0"))
+
+# Retour à "prêt" sous cette fraction des seuils (pas d'oscillation autour du seuil)
+RECOVERY_RATIO = 0.5
+
+
+class CapacityMonitor:
+    """
+    État de charge du worker, évalué à chaque sonde.
+
+    Technical Notes:
+        - Lecture seule de compteurs en mémoire + une requête SQLite courte
+          (date du dernier rescan): aucune lecture de lame
+        - Hystérésis: saturé au-delà d'un seuil, de nouveau prêt seulement
+          quand chaque valeur repasse sous RECOVERY_RATIO x seuil
+    """
+
+    def __init__(
+        self,
+        slides_dir: str = SLIDES_DIR,
+        max_queue: int = READY_MAX_QUEUE,
+        max_read_seconds: float = READY_MAX_READ_SECONDS,
+        max_catalog_age: float = READY_MAX_CATALOG_AGE,
+        live_max_read_seconds: float = LIVE_MAX_READ_SECONDS
+    ):
+        self.slides_dir = slides_dir
+        self.thresholds = {
+            "queue_depth": max_queue,
+            "oldest_read_s": max_read_seconds,
+            "catalog_age_s": max_catalog_age,
+        }
+        self.live_max_read_seconds = live_max_read_seconds
+        self._saturated = False
+        self._saturated_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict:
+        """Valeurs courantes des signaux de capacité."""
+        reads, oldest_read = tile_server.reads_in_flight()
+        tiles, tile_bytes = tile_server.tile_cache_usage()
+        last_refresh = slide_catalog.last_refresh(Path(self.slides_dir).resolve())
+        return {
+            "queue_depth": int(TILE_QUEUE_DEPTH.value()),
+            "tile_workers": tile_server.tile_workers,
+            "reads_in_flight": reads,
+            "oldest_read_s": round(oldest_read, 3),
+            "open_handles": tile_server.open_slides,
+            "max_handles": tile_server.max_open_slides,
+            "tile_cache_entries": tiles,
+            "tile_cache_bytes": tile_bytes,
+            "tile_cache_max_bytes": tile_server.max_tile_cache_bytes,
+            "catalog_age_s": round(time.time() - last_refresh, 1) if last_refresh is not None else None,
+            "catalog_refreshing": slide_catalog.is_refreshing,
+        }
+
+    def readiness(self) -> Tuple[bool, List[str], Dict]:
+        """
+        Returns:
+            (saturé, raisons, snapshot); raisons vides si non saturé
+        """
+        capacity = self.snapshot()
+        with self._lock:
+            ratio = RECOVERY_RATIO if self._saturated else 1.0
+            reasons = [
+                f"{name} {capacity[name]} > {limit * ratio:g}"
+                for name, limit in self.thresholds.items()
+                if limit and capacity[name] is not None and capacity[name] > limit * ratio
+            ]
+            saturated = bool(reasons)
+            if saturated != self._saturated:
+                self._saturated = saturated
+                self._saturated_since = time.time() if saturated else None
+            capacity["saturated_since"] = self._saturated_since
+        return saturated, reasons, capacity
+
+    def liveness(self) -> Tuple[bool, List[str], Dict]:
+        """
+        Returns:
+            (vivant, raisons, snapshot)
+
+        Technical Notes:
+            - Une boucle asyncio qui répond suffit, sauf lecture bloquée au-delà
+              de VARUNA_LIVE_MAX_READ_SECONDS (worker à redémarrer)
+        """
+        capacity = self.snapshot()
+        reasons = []
+        if self.live_max_read_seconds and capacity["oldest_read_s"] > self.live_max_read_seconds:
+            reasons.append(f"oldest_read_s {capacity['oldest_read_s']} > {self.live_max_read_seconds:g}")
+        return not reasons, reasons, capacity
+
+
+# Instance globale (routes de santé)
+capacity_monitor = CapacityMonitor()
@@ -0,0 +1,271 @@
+"""
+Shared Tile Cache
+
+Second niveau du cache de tuiles, partagé par tous les processus d'un hôte
+(uvicorn --workers N): une tuile rendue par un worker est servie par les
+autres sans nouveau rendu ni copie mémoire par processus.
+
+Pourquoi:
+Chaque worker a son TileServer et son LRU en mémoire. Sans tier partagé,
+la même tuile est rendue jusqu'à N fois et la mémoire est multipliée par N.
+
+Structure (fichier mmap, /dev/shm par défaut):
+    En-tête (64 o):  magic, version, nombre de slots, taille de l'arène,
+                     tête d'écriture (u64) protégée par un seqlock
+    Index:           slots de 40 o (seq u32, longueur u32, position u64,
+                     crc32 u32, réservé u32, clé 16 o), adressage ouvert
+    Arène:           journal circulaire des tuiles JPEG
+
+Écriture (processus sérialisés par flock, threads par un verrou):
+    1. Réserve [tête, tête + taille) dans l'arène (tête avancée AVANT la copie)
+    2. Copie la tuile
+    3. Slot: seq impair → clé, position, taille, crc → seq pair
+Lecture (sans verrou):
+    seq pair et stable, clé identique, position encore dans la fenêtre
+    [tête - arène, tête) avant ET après la copie, crc32 correct → hit.
+    Sinon miss (jamais de données partielles).
+
+Configuration (variables d'environnement):
+- VARUNA_SHARED_TILE_CACHE_MB: taille de l'arène (0 = désactivé, défaut)
+- VARUNA_SHARED_TILE_CACHE_PATH: fichier partagé (défaut: /dev/shm/varuna-tile-cache)
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from hashlib import blake2b
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de flock, tier partagé désactivé
+    fcntl = None
+
+from services.slide_coherency import slide_coherency
+
+logger = logging.getLogger(__name__)
+
+SHARED_TILE_CACHE_MAX_BYTES = int(float(os.environ.get("VARUNA_SHARED_TILE_CACHE_MB", "0")) * 1024 * 1024)
+SHARED_TILE_CACHE_PATH = os.environ.get("VARUNA_SHARED_TILE_CACHE_PATH") or str(
+    Path("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()) / "varuna-tile-cache"
+)
+
+# Taille moyenne d'une tuile JPEG 256 px (dimensionne l'index: 2 slots par tuile attendue)
+AVERAGE_TILE_BYTES = 8 * 1024
+
+# Slots examinés par recherche / insertion (adressage ouvert linéaire)
+PROBES = 8
+
+# Relectures de la tête d'écriture avant d'abandonner (miss)
+HEAD_READ_ATTEMPTS = 100
+
+MAGIC = b"VTCACHE1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIQ")     # magic, version, slots, taille arène
+_HEAD = struct.Struct("<IIQ")         # seq, réservé, tête d'écriture (absolue, croissante)
+_HEAD_OFFSET = 32
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<IIQII16s")    # seq, longueur, position, crc32, réservé, clé
+_SLOT_SEQ = struct.Struct("<I")
+
+
+class SharedTileCache:
+    """
+    Cache de tuiles inter-processus sur un fichier mmap (thread-safe, multi-process).
+
+    Technical Notes:
+        - Ouverture paresseuse au premier accès (après le fork/spawn des workers)
+        - Le premier processus crée et dimensionne le fichier; les suivants
+          adoptent la géométrie de l'en-tête (jamais de truncate d'un fichier mappé)
+        - Éviction implicite: le journal circulaire écrase les tuiles les plus
+          anciennes, leurs slots deviennent invalides (position hors fenêtre)
+        - Clé = empreinte BLAKE2 (chemin, version des fichiers de la lame
+          selon slide_coherency, niveau, col, ligne, taille de tuile): une lame
+          modifiée n'a plus de hits, même après redémarrage (le fichier
+          survit aux workers)
+        - crc32 vérifié à chaque lecture: sûr même si l'ordre des écritures
+          n'est pas garanti entre processus (CPU faiblement ordonnés)
+    """
+
+    def __init__(self, max_bytes: int = SHARED_TILE_CACHE_MAX_BYTES, path: str = SHARED_TILE_CACHE_PATH):
+        self.max_bytes = max_bytes
+        self.path = Path(path)
+        self.enabled = max_bytes > 0 and fcntl is not None
+        self._map: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._slots = 0
+        self._arena = 0
+        self._arena_offset = 0
+        self._write_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        if max_bytes > 0 and fcntl is None:
+            logger.warning("Shared tile cache needs fcntl (POSIX); disabled")
+
+    # =========================================================================
+    # API
+    # =========================================================================
+
+    def get(self, slide_path: str, level: int, col: int, row: int, tile_size: int) -> Optional[bytes]:
+        """Tuile si présente et intacte, None sinon (désactivé, absente, écrasée, en cours d'écriture)."""
+        if not self.enabled or not self._ensure_open():
+            return None
+        key = self._key(slide_path, level, col, row, tile_size)
+        buffer = self._map
+        start = int.from_bytes(key[:8], "little") % self._slots
+        for probe in range(PROBES):
+            slot_offset = _HEADER_SIZE + ((start + probe) % self._slots) * _SLOT.size
+            seq, length, position, crc, _, slot_key = _SLOT.unpack_from(buffer, slot_offset)
+            if seq & 1 or slot_key != key:
+                continue
+            if not self._in_window(position, length):
+                return None
+            data_offset = self._arena_offset + position % self._arena
+            data = buffer[data_offset:data_offset + length]
+            if (
+                _SLOT_SEQ.unpack_from(buffer, slot_offset)[0] != seq
+                or not self._in_window(position, length)
+                or zlib.crc32(data) != crc
+            ):
+                return None
+            return data
+        return None
+
+    def put(self, slide_path: str, level: int, col: int, row: int, tile_size: int, data: bytes):
+        """Ajoute une tuile (ignorée si désactivé ou plus grande qu'1/8 de l'arène)."""
+        if not self.enabled or not self._ensure_open() or len(data) > self._arena // 8:
+            return
+        key = self._key(slide_path, level, col, row, tile_size)
+        length = len(data)
+        crc = zlib.crc32(data)
+        with self._write_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Verrou tenu: lecture directe (seq impair laissé par un écrivain mort corrigé ici)
+                position = _HEAD.unpack_from(self._map, _HEAD_OFFSET)[2]
+                if position % self._arena + length > self._arena:
+                    # Pas de tuile à cheval sur la fin de l'arène: on repart au début
+                    position += self._arena - position % self._arena
+                self._write_head(position + length)
+                data_offset = self._arena_offset + position % self._arena
+                self._map[data_offset:data_offset + length] = data
+                self._write_slot(key, position, length, crc, position + length)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def usage(self) -> Tuple[int, int]:
+        """(octets écrits depuis la création, taille de l'arène); (0, 0) si inactif."""
+        if self._map is None:
+            return 0, 0
+        return self._read_head() or 0, self._arena
+
+    def close(self):
+        with self._open_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    # =========================================================================
+    # FICHIER
+    # =========================================================================
+
+    def _ensure_open(self) -> bool:
+        if self._map is not None:
+            return True
+        with self._open_lock:
+            if self._map is not None:
+                return True
+            try:
+                self._open()
+            except OSError as e:
+                logger.warning(f"Shared tile cache disabled ({self.path}): {e}")
+                self.enabled = False
+                return False
+        return True
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(fd).st_size
+                header = os.pread(fd, _HEADER.size, 0)
+                if size >= _HEADER.size and header.startswith(MAGIC):
+                    _, version, slots, arena = _HEADER.unpack(header)
+                    if version != VERSION or size != _HEADER_SIZE + slots * _SLOT.size + arena:
+                        raise OSError(f"incompatible cache file (version {version}, {size} bytes)")
+                else:
+                    arena = self.max_bytes
+                    slots = max(1024, 2 * arena // AVERAGE_TILE_BYTES)
+                    os.ftruncate(fd, _HEADER_SIZE + slots * _SLOT.size + arena)
+                    os.pwrite(fd, _HEADER.pack(MAGIC, VERSION, slots, arena), 0)
+                    logger.info(f"Created shared tile cache {self.path} ({arena // (1024 * 1024)} MB, {slots} slots)")
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, _HEADER_SIZE + slots * _SLOT.size + arena)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._slots = slots
+        self._arena = arena
+        self._arena_offset = _HEADER_SIZE + slots * _SLOT.size
+
+    # =========================================================================
+    # EN-TÊTE / SLOTS
+    # =========================================================================
+
+    def _read_head(self) -> Optional[int]:
+        """Tête d'écriture cohérente, None si en cours de modification (ou écrivain mort)."""
+        for _ in range(HEAD_READ_ATTEMPTS):
+            seq, _, head = _HEAD.unpack_from(self._map, _HEAD_OFFSET)
+            if not seq & 1 and _SLOT_SEQ.unpack_from(self._map, _HEAD_OFFSET)[0] == seq:
+                return head
+        return None
+
+    def _write_head(self, head: int):
+        seq = _SLOT_SEQ.unpack_from(self._map, _HEAD_OFFSET)[0] | 1
+        _SLOT_SEQ.pack_into(self._map, _HEAD_OFFSET, seq)
+        _HEAD.pack_into(self._map, _HEAD_OFFSET, seq, 0, head)
+        _SLOT_SEQ.pack_into(self._map, _HEAD_OFFSET, (seq + 1) & 0xFFFFFFFF)
+
+    def _in_window(self, position: int, length: int) -> bool:
+        head = self._read_head()
+        return head is not None and head - self._arena <= position and position + length <= head
+
+    def _write_slot(self, key: bytes, position: int, length: int, crc: int, head: int):
+        """Slot de la même clé, sinon vide ou périmé, sinon le plus ancien des PROBES examinés."""
+        start = int.from_bytes(key[:8], "little") % self._slots
+        target = None
+        oldest = None
+        for probe in range(PROBES):
+            slot_offset = _HEADER_SIZE + ((start + probe) % self._slots) * _SLOT.size
+            _, slot_length, slot_position, _, _, slot_key = _SLOT.unpack_from(self._map, slot_offset)
+            if slot_key == key or slot_length == 0 or slot_position < head - self._arena:
+                target = slot_offset
+                break
+            if oldest is None or slot_position < oldest[1]:
+                oldest = (slot_offset, slot_position)
+        if target is None:
+            target = oldest[0]
+        seq = _SLOT_SEQ.unpack_from(self._map, target)[0] | 1
+        _SLOT_SEQ.pack_into(self._map, target, seq)
+        _SLOT.pack_into(self._map, target, seq, length, position, crc, 0, key)
+        _SLOT_SEQ.pack_into(self._map, target, (seq + 1) & 0xFFFFFFFF)
+
+    @staticmethod
+    def _key(slide_path: str, level: int, col: int, row: int, tile_size: int) -> bytes:
+        version = slide_coherency.check(slide_path)
+        text = f"{slide_path}\0{version}\0{level}\0{col}\0{row}\0{tile_size}"
+        return blake2b(text.encode(), digest_size=16).digest()
+
+
+# Instance globale (tile_server)
+shared_tile_cache = SharedTileCache()
@@ -0,0 +1,1287 @@
+"""
+Slide Catalog Service
+
+Index persistant (SQLite) des lames détectées dans /Slides.
+
+Principe:
+- Chaque fichier candidat (extension connue de FormatDetector) est mémorisé
+  avec sa taille et son mtime, ainsi que le résultat de détection (positif
+  OU négatif) → un fichier inchangé n'est jamais re-détecté.
+- Chaque dossier est mémorisé avec son mtime → un dossier dont le mtime n'a
+  pas changé n'est pas relu (ajout/suppression/renommage modifient le mtime
+  du dossier parent).
+- /api/slides/ est servi directement depuis l'index (quelques ms), le
+  rescan incrémental ne revisite que les dossiers modifiés.
+
+Limitations connues:
+- Un fichier modifié en place (même nom) ne change pas le mtime de son
+  dossier: il n'est revu qu'au prochain rescan complet (full=True).
+- L'index est un cache reconstructible: en cas de changement de schéma,
+  les tables sont recréées et un scan complet est relancé.
+
+Author: VarunaPoC Team
+Version: 1.0.0
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.format_detector import (
+    SCAN_WORKERS,
+    FormatDetector,
+    ScanProgress,
+    SlideFormat,
+    walk_directories,
+)
+from utils.metrics import SCAN_BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Emplacement de la base (configurable, hors /Slides qui peut être en lecture seule)
+CATALOG_DB_PATH = Path(os.environ.get(
+    "VARUNA_CATALOG_DB",
+    Path(__file__).parent.parent / "data" / "catalog.sqlite3"
+))
+
+# Racine des lames: SLIDES_DIR relatif au dossier backend/ (pas au répertoire
+# courant), partagée par le scanner, le browse et le watcher
+SLIDES_ROOT = (Path(__file__).parent.parent / (os.environ.get("SLIDES_DIR") or "../Slides")).resolve()
+
+# Âge max de l'index avant rescan incrémental en arrière-plan (secondes)
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("VARUNA_CATALOG_REFRESH_INTERVAL", "300"))
+
+# Délai max avant écriture des consultations (record_view) en base (secondes)
+VIEW_FLUSH_INTERVAL = 5.0
+
+# Fichiers de données d'un dossier compagnon couverts par le mtime du dossier
+# (get_slide_signature_files): trop nombreux pour être stat un par un
+BULK_DATA_PATTERN = "Data*.dat"
+
+# Taille minimale d'un lot de détection (parallélisme + publication progressive)
+DETECT_BATCH_SIZE = max(64, SCAN_WORKERS * 4)
+
+# Durée des rescans (GET /metrics): full, incremental ou targeted (dirs=...)
+REFRESH_SECONDS = Histogram(
+    "varuna_catalog_refresh_seconds", "Catalog rescan duration", ("mode",), buckets=SCAN_BUCKETS
+)
+
+# Incrémenter à chaque changement de schéma (tables recréées automatiquement)
+SCHEMA_VERSION = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories(parent);
+
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    is_slide INTEGER NOT NULL,
+    id TEXT,
+    name TEXT,
+    format TEXT,
+    format_string TEXT,
+    structure_type TEXT,
+    joint_files TEXT,
+    companion_dirs TEXT,
+    metadata_files TEXT,
+    detection_method TEXT,
+    is_supported INTEGER,
+    notes TEXT,
+    -- Octets sur disque: point d'entrée + fichiers joints/métadonnées
+    disk_size INTEGER,
+    -- Métadonnées OpenSlide (enrichissement, voir services/slide_enricher.py).
+    -- Remises à NULL quand la ligne est réécrite (fichier modifié)
+    width INTEGER,
+    height INTEGER,
+    level_count INTEGER,
+    vendor TEXT,
+    mpp_x REAL,
+    mpp_y REAL,
+    objective_power REAL,
+    enrich_status TEXT,
+    enrich_error TEXT,
+    enrich_attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_entries_dir ON entries(dir);
+CREATE INDEX IF NOT EXISTS idx_entries_id ON entries(id);
+CREATE INDEX IF NOT EXISTS idx_entries_root_slide ON entries(root, is_slide);
+CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(root, is_slide, name, path);
+CREATE INDEX IF NOT EXISTS idx_entries_format ON entries(root, is_slide, format_string, path);
+CREATE INDEX IF NOT EXISTS idx_entries_enrich ON entries(root, enrich_status);
+
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    last_refresh REAL NOT NULL
+);
+
+-- IDs vus par /api/slides/browse avant (ou sans) rescan du dossier
+CREATE TABLE IF NOT EXISTS slide_ids (
+    id TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    registered_at REAL NOT NULL
+);
+
+-- Lames ouvertes dans le viewer (warmup au démarrage, voir services/warmup.py)
+CREATE TABLE IF NOT EXISTS slide_views (
+    path TEXT PRIMARY KEY,
+    last_viewed REAL NOT NULL,
+    view_count INTEGER NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    dzi_metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_slide_views_last ON slide_views(last_viewed);
+"""
+
+
+def slide_id_for_path(entry_point: str, root: Path) -> str:
+    """
+    ID stable d'une lame depuis son chemin absolu et la racine /Slides.
+
+    Voir slide_id_for_relative_path (schéma canonique).
+    """
+    return slide_id_for_relative_path(os.path.relpath(entry_point, str(root)))
+
+
+def slide_id_for_relative_path(relative_path: str) -> str:
+    """
+    ID canonique d'une lame: hash MD5 tronqué (12 hex) du chemin relatif à la racine.
+
+    Args:
+        relative_path: Chemin du point d'entrée relatif à /Slides
+                       (ex: "3DHistech/sample.mrxs")
+
+    Technical Notes:
+        - Chemin normalisé: séparateurs POSIX, sans "/" initial, Unicode NFC
+          (macOS stocke les noms en NFD)
+        - Indépendant de l'emplacement de /Slides (cwd, symlink, montage):
+          scanner, catalogue et browser produisent le même ID
+    """
+    normalized = unicodedata.normalize("NFC", relative_path.replace("\\", "/").strip("/"))
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+class SlideCatalog:
+    """
+    Catalogue persistant des lames (SQLite).
+
+    Thread-safe: une seule connexion partagée protégée par un verrou
+    (les écritures sont courtes, WAL permet des lectures concurrentes).
+    """
+
+    def __init__(self, db_path: Path = CATALOG_DB_PATH, max_workers: int = SCAN_WORKERS):
+        self.db_path = Path(db_path)
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._listeners: List[Callable[[CatalogChange], None]] = []
+        self._slide_subscribers: List[Tuple[Path, Callable[[List[Dict]], None]]] = []
+        # Consultations pas encore écrites: {path: [vues, dernière vue, métadonnées DZI]}
+        self._pending_views: Dict[str, list] = {}
+        self._views_lock = threading.Lock()
+        self._views_flusher: Optional[threading.Thread] = None
+
+    # =========================================================================
+    # CONNEXION / SCHÉMA
+    # =========================================================================
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ouvre la base (lazy) et crée/migre le schéma si nécessaire."""
+        if self._conn is not None:
+            return self._conn
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            if version:
+                logger.info(f"Catalog schema v{version} → v{SCHEMA_VERSION}: rebuilding index")
+            conn.executescript("""
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS entries;
+                DROP TABLE IF EXISTS roots;
+                DROP TABLE IF EXISTS slide_ids;
+                DROP TABLE IF EXISTS slide_views;
+            """)
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.commit()
+
+        self._conn = conn
+        return conn
+
+    def close(self):
+        """Écrit les consultations en attente et ferme la connexion SQLite."""
+        self.flush_views()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # =========================================================================
+    # LECTURE
+    # =========================================================================
+
+    @property
+    def is_refreshing(self) -> bool:
+        """True pendant un rescan (synchrone ou en arrière-plan)."""
+        return self._refresh_lock.locked()
+
+    def has_root(self, root: Path) -> bool:
+        """True si la racine a déjà été scannée au moins une fois."""
+        return self.last_refresh(root) is not None
+
+    def last_refresh(self, root: Path) -> Optional[float]:
+        """Timestamp du dernier rescan de la racine (None si jamais scannée)."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT last_refresh FROM roots WHERE root = ?", (str(root),)
+            ).fetchone()
+        return row["last_refresh"] if row else None
+
+    def list_slides(self, root: Path) -> List[Dict]:
+        """
+        Liste les lames indexées sous une racine (format API de slide_scanner).
+
+        Technical Notes:
+            - Aucun accès filesystem ni OpenSlide
+            - Ordre déterministe (tri par chemin)
+        """
+        return self.query_slides(root)
+
+    def query_slides(
+        self,
+        root: Path,
+        filters: Optional["SlideFilters"] = None,
+        sort: str = "path",
+        descending: bool = False,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Requête paginée (keyset) sur les lames indexées.
+
+        Args:
+            root: Racine /Slides
+            filters: Filtres format / is_supported / préfixe de chemin
+            sort: Clé de tri ("path", "name" ou "format")
+            descending: Tri décroissant
+            after: Clé (valeur de tri, chemin) de la dernière lame de la page
+                   précédente (voir sort_key)
+            limit: Nombre max de lames (None = toutes)
+
+        Technical Notes:
+            - Pagination par clé (pas OFFSET): coût constant quelle que soit
+              la page, résultats stables si des lames sont ajoutées entre deux pages
+            - Le chemin départage les égalités (tri total)
+        """
+        column = SORT_COLUMNS[sort]
+        where, params = (filters or SlideFilters()).to_sql(root)
+
+        if after is not None:
+            where.append(f"({column}, path) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT * FROM entries WHERE {' AND '.join(where)} "
+            f"ORDER BY {column} {direction}, path {direction}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [_row_to_slide(row) for row in rows]
+
+    def get_slides(self, root: Path, paths: Iterable[str]) -> List[Dict]:
+        """Lames indexées parmi `paths` (chemins absolus des points d'entrée)."""
+        paths = list(paths)
+        slides = []
+        with self._lock:
+            conn = self._connect()
+            # Par lots: limite de paramètres SQLite
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT * FROM entries WHERE root = ? AND is_slide = 1 AND path IN ({placeholders})",
+                    [str(root), *chunk]
+                ).fetchall()
+                slides.extend(_row_to_slide(row) for row in rows)
+        return slides
+
+    def count_slides(self, root: Path, filters: Optional["SlideFilters"] = None) -> int:
+        """Nombre de lames correspondant aux filtres."""
+        where, params = (filters or SlideFilters()).to_sql(root)
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT COUNT(*) FROM entries WHERE {' AND '.join(where)}", params
+            ).fetchone()
+        return row[0]
+
+    def iter_slides(
+        self,
+        root: Path,
+        filters: Optional["SlideFilters"] = None,
+        sort: str = "path",
+        descending: bool = False,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """
+        Itère sur toutes les lames par lots (streaming NDJSON).
+
+        Technical Notes:
+            - Verrou relâché entre les lots (pas de transaction longue)
+        """
+        after = None
+        while True:
+            batch = self.query_slides(root, filters, sort, descending, after, batch_size)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = sort_key(batch[-1], sort)
+
+    def get_path_by_id(self, slide_id: str) -> Optional[str]:
+        """
+        Chemin point d'entrée depuis un ID (None si inconnu).
+
+        Technical Notes:
+            - Index entries (lames scannées), puis IDs enregistrés par le browse
+            - Un ID enregistré dont le fichier a disparu est oublié
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT path FROM entries WHERE id = ? AND is_slide = 1 LIMIT 1",
+                (slide_id,)
+            ).fetchone()
+            if row:
+                return row["path"]
+
+            row = conn.execute("SELECT path FROM slide_ids WHERE id = ?", (slide_id,)).fetchone()
+            if row is None:
+                return None
+            if os.path.isfile(row["path"]):
+                return row["path"]
+
+            conn.execute("DELETE FROM slide_ids WHERE id = ?", (slide_id,))
+            conn.commit()
+        return None
+
+    def get_slide_files(self, slide_path: str) -> Optional[List[str]]:
+        """
+        Fichiers et dossiers dont dépendent les pixels d'une lame (rescan ciblé).
+
+        Returns:
+            Point d'entrée, fichiers joints, fichiers de métadonnées et dossiers
+            compagnons (MIRAX: Slidedat.ini, Index.dat, Data*.dat), ou None si
+            la lame n'est pas indexée
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT joint_files, metadata_files, companion_dirs FROM entries WHERE path = ? AND is_slide = 1",
+                (slide_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        files = [slide_path]
+        for column in ("joint_files", "metadata_files", "companion_dirs"):
+            files.extend(json.loads(row[column] or "[]"))
+        return list(dict.fromkeys(files))
+
+    def get_slide_signature_files(self, slide_path: str) -> Optional[List[str]]:
+        """
+        Sous-ensemble de get_slide_files() suffisant pour détecter un remplacement.
+
+        Returns:
+            get_slide_files() sans les fichiers de données des dossiers
+            compagnons (MIRAX: .mrxs, Slidedat.ini, Index.dat et le dossier,
+            pas les Data*.dat), ou None si la lame n'est pas indexée
+
+        Technical Notes:
+            - Un Data*.dat ajouté, supprimé ou remplacé par renommage change
+              le mtime du dossier compagnon: inutile de stat chaque fichier
+              (des milliers par lame MIRAX, parfois sur NFS)
+            - Fichiers joints hors dossier compagnon (VMS, DICOM) conservés
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT joint_files, metadata_files, companion_dirs FROM entries WHERE path = ? AND is_slide = 1",
+                (slide_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        companion_dirs = json.loads(row["companion_dirs"] or "[]")
+        files = [slide_path] + json.loads(row["metadata_files"] or "[]") + companion_dirs
+        for path in json.loads(row["joint_files"] or "[]"):
+            parent, name = os.path.split(path)
+            if parent in companion_dirs and fnmatch.fnmatch(name, BULK_DATA_PATTERN):
+                continue
+            files.append(path)
+        return list(dict.fromkeys(files))
+
+    def register_ids(self, root: Path, entry_points: Iterable[str]):
+        """
+        Enregistre des lames vues hors rescan (ex: browse) dans l'index ID->Path.
+
+        Technical Notes:
+            - Rend les IDs de /api/slides/browse résolubles immédiatement,
+              même si le dossier n'a pas encore été indexé
+            - Persistant (survit aux redémarrages)
+        """
+        now = time.time()
+        rows = [(slide_id_for_path(path, root), str(root), path, now) for path in entry_points]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO slide_ids VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+    # =========================================================================
+    # HISTORIQUE DE CONSULTATION
+    # =========================================================================
+
+    def record_view(self, slide_path: str, dzi_metadata: Optional[Dict] = None):
+        """
+        Mémorise l'ouverture d'une lame dans le viewer (+ métadonnées DZI).
+
+        Technical Notes:
+            - Appelé à chaque dzi.json: cumul en mémoire seulement, écrit par
+              lots au plus tard VIEW_FLUSH_INTERVAL secondes après (thread
+              d'écriture démarré à la demande, arrêté quand il n'y a plus rien)
+            - Taille/mtime enregistrés à l'écriture: les métadonnées ne sont
+              restaurées que si le fichier n'a pas changé depuis (voir recent_views)
+        """
+        with self._views_lock:
+            pending = self._pending_views.setdefault(slide_path, [0, 0.0, None])
+            pending[0] += 1
+            pending[1] = time.time()
+            if dzi_metadata is not None:
+                pending[2] = dzi_metadata
+            if self._views_flusher is None:
+                self._views_flusher = threading.Thread(
+                    target=self._flush_views_loop, name="catalog-views", daemon=True
+                )
+                self._views_flusher.start()
+
+    def flush_views(self):
+        """Écrit les consultations en attente (une transaction)."""
+        with self._views_lock:
+            pending, self._pending_views = self._pending_views, {}
+        if not pending:
+            return
+
+        rows = []
+        for path, (count, last_viewed, dzi_metadata) in pending.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            metadata = json.dumps(dzi_metadata) if dzi_metadata is not None else None
+            rows.append((path, last_viewed, count, st.st_size, st.st_mtime_ns, metadata))
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                """
+                INSERT INTO slide_views (path, last_viewed, view_count, size, mtime_ns, dzi_metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    last_viewed = excluded.last_viewed,
+                    view_count = view_count + excluded.view_count,
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    dzi_metadata = COALESCE(excluded.dzi_metadata, dzi_metadata)
+                """,
+                rows
+            )
+            conn.commit()
+
+    def _flush_views_loop(self):
+        while True:
+            time.sleep(VIEW_FLUSH_INTERVAL)
+            try:
+                self.flush_views()
+            except Exception as e:
+                logger.error(f"Writing slide views failed: {e}")
+            with self._views_lock:
+                if not self._pending_views:
+                    self._views_flusher = None
+                    return
+
+    def recent_views(self, limit: int) -> List[Tuple[str, Optional[Dict]]]:
+        """
+        Lames les plus récemment consultées encore présentes.
+
+        Returns:
+            [(chemin, métadonnées DZI ou None si le fichier a changé)]
+        """
+        self.flush_views()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM slide_views ORDER BY last_viewed DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+        recent = []
+        for row in rows:
+            try:
+                st = os.stat(row["path"])
+            except OSError:
+                continue
+            unchanged = (st.st_size, st.st_mtime_ns) == (row["size"], row["mtime_ns"])
+            metadata = json.loads(row["dzi_metadata"]) if unchanged and row["dzi_metadata"] else None
+            recent.append((row["path"], metadata))
+        return recent
+
+    # =========================================================================
+    # ENRICHISSEMENT (métadonnées OpenSlide)
+    # =========================================================================
+
+    def pending_enrichment(self, root: Path, limit: int) -> List[Tuple[str, int, int, int]]:
+        """
+        Lames supportées sans métadonnées OpenSlide (file d'enrichissement).
+
+        Returns:
+            [(chemin, taille, mtime_ns, tentatives)], moins de tentatives d'abord
+
+        Technical Notes:
+            - Lames non supportées exclues (OpenSlide ne peut pas les ouvrir)
+            - Lames en échec ou en quarantaine exclues jusqu'à modification
+              du fichier (ligne réécrite → statut remis à NULL)
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, size, mtime_ns, enrich_attempts FROM entries "
+                "WHERE root = ? AND enrich_status IS NULL AND is_slide = 1 AND is_supported = 1 "
+                "ORDER BY enrich_attempts, path LIMIT ?",
+                (str(root), limit)
+            ).fetchall()
+        return [(row["path"], row["size"], row["mtime_ns"], row["enrich_attempts"]) for row in rows]
+
+    def store_enrichment(self, root: Path, results: List[Dict]):
+        """
+        Écrit des résultats d'enrichissement puis notifie les listeners.
+
+        Args:
+            results: [{"path", "size", "mtime_ns", "status", "metadata", "error", "attempts"}]
+                     status: "ok", "failed", "quarantined" ou None (à réessayer)
+
+        Technical Notes:
+            - Mise à jour conditionnée à (taille, mtime): un fichier modifié
+              pendant l'extraction garde son statut NULL (ré-enrichi ensuite)
+            - Listeners notifiés avec CatalogChange.enriched (pas modified:
+              les caches de tuiles restent valides)
+        """
+        change = CatalogChange(root=root)
+        with self._lock:
+            conn = self._connect()
+            for result in results:
+                metadata = result.get("metadata") or {}
+                cursor = conn.execute(
+                    """
+                    UPDATE entries SET
+                        width = ?, height = ?, level_count = ?, vendor = ?,
+                        mpp_x = ?, mpp_y = ?, objective_power = ?,
+                        enrich_status = ?, enrich_error = ?, enrich_attempts = ?
+                    WHERE path = ? AND size = ? AND mtime_ns = ? AND is_slide = 1
+                    """,
+                    (
+                        metadata.get("width"), metadata.get("height"), metadata.get("level_count"),
+                        metadata.get("vendor"), metadata.get("mpp_x"), metadata.get("mpp_y"),
+                        metadata.get("objective_power"),
+                        result["status"], result.get("error"), result["attempts"],
+                        result["path"], result["size"], result["mtime_ns"],
+                    )
+                )
+                if cursor.rowcount and result["status"] is not None:
+                    change.enriched.add(result["path"])
+            conn.commit()
+        self._notify(change)
+
+    def enrichment_summary(self, root: Path) -> Dict[str, int]:
+        """Nombre de lames par statut d'enrichissement (pending, ok, failed, quarantined, unsupported)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT enrich_status, is_supported, COUNT(*) AS n FROM entries "
+                "WHERE root = ? AND is_slide = 1 GROUP BY enrich_status, is_supported",
+                (str(root),)
+            ).fetchall()
+        summary = {"pending": 0, "ok": 0, "failed": 0, "quarantined": 0, "unsupported": 0}
+        for row in rows:
+            summary[_metadata_status(row["enrich_status"], row["is_supported"])] += row["n"]
+        return summary
+
+    def quarantined_slides(self, root: Path) -> List[Dict]:
+        """Lames en quarantaine (crash ou timeout OpenSlide répétés)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, path, enrich_error, enrich_attempts FROM entries "
+                "WHERE root = ? AND enrich_status = 'quarantined' ORDER BY path",
+                (str(root),)
+            ).fetchall()
+        return [
+            {"id": row["id"], "path": row["path"], "error": row["enrich_error"], "attempts": row["enrich_attempts"]}
+            for row in rows
+        ]
+
+    # =========================================================================
+    # NOTIFICATIONS
+    # =========================================================================
+
+    def add_listener(self, callback: Callable[["CatalogChange"], None]):
+        """
+        Enregistre un callback appelé après chaque rescan qui modifie des lames.
+
+        Technical Notes:
+            - Appelé dans le thread du rescan (garder le callback rapide)
+            - Une exception dans un callback est loggée, pas propagée
+        """
+        self._listeners.append(callback)
+
+    def subscribe_slides(self, root: Path, callback: Callable[[List[Dict]], None]):
+        """
+        Abonne un callback aux lots de lames détectées par tout rescan de la racine.
+
+        Technical Notes:
+            - Contrairement à refresh(on_slides=...), reçoit aussi les lots d'un
+              rescan lancé par un autre appelant (warmup, autre client du stream)
+            - Appelé dans le thread du rescan; se désabonner avec unsubscribe_slides()
+        """
+        with self._lock:
+            self._slide_subscribers.append((Path(root), callback))
+
+    def unsubscribe_slides(self, root: Path, callback: Callable[[List[Dict]], None]):
+        with self._lock:
+            try:
+                self._slide_subscribers.remove((Path(root), callback))
+            except ValueError:
+                pass
+
+    def _notify(self, change: "CatalogChange"):
+        if change.is_empty():
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(change)
+            except Exception as e:
+                logger.error(f"Catalog listener {callback.__name__} failed: {e}")
+
+    # =========================================================================
+    # RESCAN INCRÉMENTAL
+    # =========================================================================
+
+    def refresh(
+        self,
+        root: Path,
+        full: bool = False,
+        dirs: Optional[Iterable[Path]] = None,
+        on_slides: Optional[Callable[[List[Dict]], None]] = None
+    ) -> Dict[str, int]:
+        """
+        Rescan incrémental d'une racine.
+
+        Args:
+            root: Racine /Slides (résolue)
+            full: Si True, ignore les mtimes de dossiers (relit tout, mais
+                  ne re-détecte toujours que les fichiers modifiés)
+            dirs: Si fourni, rescan ciblé: seuls ces dossiers (toujours relus)
+                  et leurs sous-dossiers modifiés sont visités
+            on_slides: Callback appelé avec chaque lot de lames (re)détectées,
+                       dès leur écriture (streaming pendant un scan)
+
+        Returns:
+            Statistiques: dirs_visited, dirs_changed, files_detected,
+            files_reused, entries_removed, openslide_calls_avoided
+
+        Technical Notes:
+            - Dossier inchangé (mtime identique) → pas de listing, ses
+              sous-dossiers connus sont visités depuis l'index
+            - Fichier inchangé (taille + mtime) → résultat de détection réutilisé
+            - Dossier compagnon MIRAX modifié → le .mrxs parent est re-détecté
+            - Un seul rescan à la fois (les appels concurrents attendent)
+            - Parcours et détection en parallèle (pool de max_workers threads)
+            - Les listeners reçoivent les lames ajoutées/modifiées/supprimées
+        """
+        root = Path(root)
+        with self._refresh_lock:
+            start = time.perf_counter()
+
+            with self._lock:
+                conn = self._connect()
+                known_dirs = {}
+                children = {}
+                for row in conn.execute(
+                    "SELECT path, parent, mtime_ns FROM directories WHERE root = ?", (str(root),)
+                ):
+                    known_dirs[row["path"]] = row["mtime_ns"]
+                    children.setdefault(row["parent"], []).append(row["path"])
+
+            refresh_pass = _RefreshPass(root, on_slides)
+
+            if dirs is None:
+                start_dirs = [str(root)]
+            else:
+                start_dirs = sorted({
+                    str(d) for d in dirs if Path(d) == root or Path(d).is_relative_to(root)
+                })
+            forced = set(start_dirs) if dirs is not None else set()
+
+            seen_dirs = set()
+            listings: Dict[str, tuple] = {}  # {dir: (mtime_ns, candidates)}
+            walk_lock = threading.Lock()
+            progress = ScanProgress(f"Catalog refresh {root.name}")
+
+            def visit(dir_path: str) -> List[str]:
+                try:
+                    mtime_ns = os.stat(dir_path).st_mtime_ns
+                except OSError:
+                    return []
+                with walk_lock:
+                    if dir_path in seen_dirs:
+                        return []
+                    seen_dirs.add(dir_path)
+
+                if not full and dir_path not in forced and known_dirs.get(dir_path) == mtime_ns:
+                    # Dossier inchangé: sous-dossiers connus depuis l'index
+                    progress.add(dirs=1)
+                    return children.get(dir_path, [])
+
+                listing = _list_candidates(dir_path)
+                if listing is None:
+                    return []
+                subdirs, candidates = listing
+                progress.add(dirs=1, files=len(candidates))
+                with walk_lock:
+                    listings[dir_path] = (mtime_ns, candidates)
+                return subdirs
+
+            walk_directories(start_dirs, visit, max_workers=self.max_workers, progress=progress)
+
+            refresh_pass.stats['dirs_visited'] = len(seen_dirs)
+            refresh_pass.stats['dirs_changed'] = len(listings)
+            changed_dirs = sorted(listings)
+            self._apply_listings(listings, refresh_pass)
+
+            # Dossiers disparus (dans le périmètre visité): purger, entrées incluses
+            removed_dirs = [
+                d for d in known_dirs
+                if d not in seen_dirs and any(_is_under(d, s) for s in start_dirs)
+            ]
+            if removed_dirs:
+                self._purge_directories(removed_dirs, refresh_pass)
+
+            # Dossier compagnon MIRAX modifié/créé/supprimé → re-détecter le .mrxs
+            # (le mtime du .mrxs lui-même ne change pas dans ce cas)
+            for dir_path in changed_dirs + removed_dirs:
+                if dir_path != str(root):
+                    self._redetect_mirax_parent(Path(dir_path), refresh_pass)
+
+            if dirs is None:
+                with self._lock:
+                    conn = self._connect()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO roots (root, last_refresh) VALUES (?, ?)",
+                        (str(root), time.time())
+                    )
+                    conn.commit()
+
+            stats = refresh_pass.stats
+            stats['openslide_calls_avoided'] = refresh_pass.detector.scan_stats['openslide_calls_avoided']
+            elapsed = time.perf_counter() - start
+            mode = "targeted" if dirs is not None else ("full" if full else "incremental")
+            REFRESH_SECONDS.observe(elapsed, (mode,))
+            logger.info(
+                f"Catalog refresh {root}: {stats['dirs_visited']} dirs "
+                f"({stats['dirs_changed']} changed), {stats['files_detected']} detected, "
+                f"{stats['files_reused']} reused, {stats['entries_removed']} removed, "
+                f"{stats['openslide_calls_avoided']} OpenSlide calls avoided by prefilter "
+                f"in {elapsed:.2f}s"
+            )
+
+        self._notify(refresh_pass.change)
+        return stats
+
+    def refresh_in_background(self, root: Path) -> bool:
+        """
+        Lance un rescan incrémental dans un thread (single-flight).
+
+        Returns:
+            True si un rescan a été lancé, False si un rescan tourne déjà
+        """
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return False
+            self._refresh_thread = threading.Thread(
+                target=self._safe_refresh, args=(root,), name="catalog-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+            return True
+
+    def _safe_refresh(self, root: Path):
+        try:
+            self.refresh(root)
+        except Exception as e:
+            logger.error(f"Background catalog refresh failed: {e}")
+
+    def _apply_listings(self, listings: Dict[str, tuple], refresh_pass: "_RefreshPass"):
+        """
+        Compare les dossiers relus à l'index, détecte les fichiers modifiés
+        (en parallèle) et écrit le résultat.
+
+        Technical Notes:
+            - Fichier inchangé (taille + mtime) → résultat réutilisé
+            - Détection par lots d'au moins DETECT_BATCH_SIZE fichiers
+              (FormatDetector.detect_many, ordre déterministe): parallélisme
+              conservé, et les lames sont publiées (on_slides) lot par lot
+            - Écritures SQLite séquentielles, une transaction par dossier
+        """
+        stats = refresh_pass.stats
+
+        with self._lock:
+            conn = self._connect()
+            known_by_dir = {}
+            for dir_path in listings:
+                known_by_dir[dir_path] = {
+                    row["path"]: ((row["size"], row["mtime_ns"]), bool(row["is_slide"]))
+                    for row in conn.execute(
+                        "SELECT path, size, mtime_ns, is_slide FROM entries WHERE dir = ?",
+                        (dir_path,)
+                    )
+                }
+
+        batch_dirs: List[str] = []
+        batch_files: List[str] = []
+        for dir_path in sorted(listings):
+            _, candidates = listings[dir_path]
+            known = known_by_dir[dir_path]
+            for path, signature in sorted(candidates.items()):
+                previous = known.get(path)
+                if previous is not None and previous[0] == signature:
+                    stats['files_reused'] += 1
+                else:
+                    batch_files.append(path)
+            batch_dirs.append(dir_path)
+
+            if len(batch_files) >= DETECT_BATCH_SIZE:
+                self._apply_batch(batch_dirs, batch_files, listings, known_by_dir, refresh_pass)
+                batch_dirs, batch_files = [], []
+
+        if batch_dirs:
+            self._apply_batch(batch_dirs, batch_files, listings, known_by_dir, refresh_pass)
+
+    def _apply_batch(
+        self,
+        batch_dirs: List[str],
+        batch_files: List[str],
+        listings: Dict[str, tuple],
+        known_by_dir: Dict[str, dict],
+        refresh_pass: "_RefreshPass"
+    ):
+        """Détecte un lot de fichiers puis écrit les dossiers du lot."""
+        root = refresh_pass.root
+        stats = refresh_pass.stats
+
+        stats['files_detected'] += len(batch_files)
+        refresh_pass.detected_now.update(batch_files)
+        results = refresh_pass.detector.detect_many(
+            [Path(p) for p in batch_files], max_workers=self.max_workers
+        )
+        detections = dict(zip(batch_files, results))
+        new_slides = []
+
+        for dir_path in batch_dirs:
+            mtime_ns, candidates = listings[dir_path]
+            known = known_by_dir[dir_path]
+
+            rows = []
+            for path, signature in sorted(candidates.items()):
+                if path not in detections:
+                    continue
+                slide_format = detections[path]
+                previous = known.get(path)
+                row = _entry_row(root, Path(dir_path), path, signature, slide_format)
+                rows.append(row)
+                if slide_format is not None:
+                    new_slides.append(_row_to_slide(dict(zip(_ENTRY_COLUMNS, row))))
+                refresh_pass.change.record(
+                    path,
+                    was_slide=previous is not None and previous[1],
+                    is_slide=slide_format is not None
+                )
+
+            removed = [path for path in known if path not in candidates]
+            for path in removed:
+                refresh_pass.change.record(path, was_slide=known[path][1], is_slide=False)
+
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(_INSERT_ENTRY, rows)
+                conn.executemany("DELETE FROM entries WHERE path = ?", [(p,) for p in removed])
+                conn.execute(
+                    "INSERT OR REPLACE INTO directories (path, root, parent, mtime_ns, scanned_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        dir_path,
+                        str(root),
+                        None if Path(dir_path) == root else str(Path(dir_path).parent),
+                        mtime_ns,
+                        time.time(),
+                    )
+                )
+                conn.commit()
+
+            stats['entries_removed'] += len(removed)
+
+        if new_slides:
+            if refresh_pass.on_slides is not None:
+                refresh_pass.on_slides(new_slides)
+            with self._lock:
+                subscribers = [
+                    callback for subscribed_root, callback in self._slide_subscribers
+                    if subscribed_root == refresh_pass.root
+                ]
+            for callback in subscribers:
+                callback(new_slides)
+
+    def _purge_directories(self, dir_paths: List[str], refresh_pass: "_RefreshPass"):
+        """Supprime de l'index des dossiers disparus et leurs entrées."""
+        with self._lock:
+            conn = self._connect()
+            for dir_path in dir_paths:
+                for row in conn.execute(
+                    "SELECT path FROM entries WHERE dir = ? AND is_slide = 1", (dir_path,)
+                ):
+                    refresh_pass.change.record(row["path"], was_slide=True, is_slide=False)
+                cursor = conn.execute("DELETE FROM entries WHERE dir = ?", (dir_path,))
+                refresh_pass.stats['entries_removed'] += cursor.rowcount
+                conn.execute("DELETE FROM directories WHERE path = ?", (dir_path,))
+            conn.commit()
+
+    def _redetect_mirax_parent(self, companion_dir: Path, refresh_pass: "_RefreshPass"):
+        """Re-détecte le .mrxs dont ce dossier est (ou était) le compagnon."""
+        mrxs_path = companion_dir.parent / f"{companion_dir.name}.mrxs"
+        if str(mrxs_path) in refresh_pass.detected_now:
+            return
+        try:
+            st = mrxs_path.stat()
+        except OSError:
+            return
+
+        with self._lock:
+            previous = self._connect().execute(
+                "SELECT is_slide FROM entries WHERE path = ?", (str(mrxs_path),)
+            ).fetchone()
+
+        refresh_pass.stats['files_detected'] += 1
+        refresh_pass.detected_now.add(str(mrxs_path))
+        slide_format = refresh_pass.detector.detect_format(mrxs_path)
+        row = _entry_row(
+            refresh_pass.root, mrxs_path.parent, str(mrxs_path),
+            (st.st_size, st.st_mtime_ns), slide_format
+        )
+        refresh_pass.change.record(
+            str(mrxs_path),
+            was_slide=previous is not None and bool(previous["is_slide"]),
+            is_slide=slide_format is not None
+        )
+        with self._lock:
+            conn = self._connect()
+            conn.execute(_INSERT_ENTRY, row)
+            conn.commit()
+
+
+# Clés de tri exposées par l'API → colonnes SQL
+SORT_COLUMNS = {
+    "path": "path",
+    "name": "name",
+    "format": "format_string",
+}
+
+
+def sort_key(slide: Dict, sort: str) -> Tuple[str, str]:
+    """Clé keyset (valeur de tri, chemin) d'une lame (voir query_slides)."""
+    value = slide["format_string"] if sort == "format" else slide[sort]
+    return (value, slide["path"])
+
+
+@dataclass
+class SlideFilters:
+    """
+    Filtres de listing.
+
+    Attributes:
+        format_string: Format OpenSlide exact ("mirax", "aperio", ...)
+        is_supported: Filtre lames ouvrables / non ouvrables
+        path_prefix: Préfixe de chemin relatif à la racine (ex: "/3DHistech")
+    """
+    format_string: Optional[str] = None
+    is_supported: Optional[bool] = None
+    path_prefix: Optional[str] = None
+
+    def to_sql(self, root: Path) -> Tuple[List[str], list]:
+        where = ["root = ?", "is_slide = 1"]
+        params: list = [str(root)]
+
+        if self.format_string:
+            where.append("format_string = ?")
+            params.append(self.format_string)
+
+        if self.is_supported is not None:
+            where.append("is_supported = ?")
+            params.append(1 if self.is_supported else 0)
+
+        if self.path_prefix:
+            # Plage [prefix, prefix + U+FFFF[ → utilise l'index de la clé primaire
+            relative = self.path_prefix.replace('\\', '/').strip('/')
+            # Séparateur final: "/3DH" ne doit pas correspondre à "/3DHistech"
+            prefix = str(root / relative) + os.sep if relative else str(root)
+            where.append("path >= ? AND path < ?")
+            params.extend([prefix, prefix + "\uffff"])
+
+        return where, params
+
+    def matches(self, slide: Dict, root: Path) -> bool:
+        """Équivalent Python de to_sql (lames pas encore indexées)."""
+        if self.format_string and slide["format_string"] != self.format_string:
+            return False
+        if self.is_supported is not None and slide["is_supported"] != self.is_supported:
+            return False
+        if self.path_prefix:
+            relative = self.path_prefix.replace('\\', '/').strip('/')
+            if relative and not slide["path"].startswith(str(root / relative) + os.sep):
+                return False
+        return True
+
+
+@dataclass
+class CatalogChange:
+    """
+    Lames modifiées par un rescan (chemins absolus des points d'entrée).
+
+    Attributes:
+        added: Nouvelles lames
+        modified: Lames re-détectées (fichier ou dossier compagnon modifié)
+        removed: Lames disparues (ou qui ne sont plus détectées)
+        enriched: Lames dont seules les métadonnées OpenSlide ont changé
+                  (fichier inchangé, voir store_enrichment)
+        root: Racine rescannée (calcul des IDs, voir slide_id)
+    """
+    root: Optional[Path] = None
+    added: Set[str] = field(default_factory=set)
+    modified: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+    enriched: Set[str] = field(default_factory=set)
+
+    def record(self, path: str, was_slide: bool, is_slide: bool):
+        if was_slide and is_slide:
+            self.modified.add(path)
+        elif is_slide:
+            self.added.add(path)
+        elif was_slide:
+            self.removed.add(path)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.modified or self.removed or self.enriched)
+
+    def slide_id(self, path: str) -> str:
+        return slide_id_for_path(path, self.root)
+
+
+class _RefreshPass:
+    """État d'un rescan (détecteur partagé, statistiques, changements)."""
+
+    def __init__(self, root: Path, on_slides: Optional[Callable[[List[Dict]], None]] = None):
+        self.root = root
+        self.on_slides = on_slides
+        self.detector = FormatDetector()
+        self.detected_now: Set[str] = set()
+        self.change = CatalogChange(root=root)
+        self.stats = {
+            'dirs_visited': 0,
+            'dirs_changed': 0,
+            'files_detected': 0,
+            'files_reused': 0,
+            'entries_removed': 0,
+            'openslide_calls_avoided': 0,
+        }
+
+
+def _list_candidates(dir_path: str) -> Optional[tuple]:
+    """
+    Liste un dossier: sous-dossiers + signature (taille, mtime) des candidats.
+
+    Returns:
+        (subdirs, {path: (size, mtime_ns)}), ou None si dossier illisible
+
+    Technical Notes:
+        - d_type de os.scandir(): stat() seulement pour les fichiers candidats
+    """
+    subdirs = []
+    candidates: Dict[str, Tuple[int, int]] = {}
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file() and FormatDetector.is_candidate(entry.name):
+                        st = entry.stat()
+                        candidates[entry.path] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning(f"Cannot list directory {dir_path}: {e}")
+        return None
+    return subdirs, candidates
+
+
+def _is_under(path: str, parent: str) -> bool:
+    """True si path == parent ou se trouve sous parent."""
+    return path == parent or path.startswith(parent.rstrip(os.sep) + os.sep)
+
+
+_ENTRY_COLUMNS = (
+    "path", "root", "dir", "size", "mtime_ns", "is_slide", "id", "name", "format",
+    "format_string", "structure_type", "joint_files", "companion_dirs", "metadata_files",
+    "detection_method", "is_supported", "notes", "disk_size",
+)
+
+_INSERT_ENTRY = (
+    f"INSERT OR REPLACE INTO entries ({', '.join(_ENTRY_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_ENTRY_COLUMNS))})"
+)
+
+
+def _entry_row(
+    root: Path,
+    dir_path: Path,
+    path: str,
+    signature: Tuple[int, int],
+    slide_format: Optional[SlideFormat]
+) -> tuple:
+    """Construit la ligne SQL d'un fichier candidat (détecté ou non)."""
+    size, mtime_ns = signature
+    if slide_format is None:
+        return (path, str(root), str(dir_path), size, mtime_ns, 0,
+                None, None, None, None, None, None, None, None, None, None, None, None)
+
+    return (
+        path,
+        str(root),
+        str(dir_path),
+        size,
+        mtime_ns,
+        1,
+        slide_id_for_path(path, root),
+        slide_format.entry_point.name,
+        slide_format.name,
+        slide_format.format_string if slide_format.format_string else "unknown",
+        slide_format.structure_type,
+        json.dumps([str(p) for p in slide_format.joint_files]),
+        json.dumps([str(p) for p in slide_format.companion_dirs]),
+        json.dumps([str(p) for p in slide_format.metadata_files]),
+        slide_format.detection_method,
+        1 if slide_format.is_supported else 0,
+        slide_format.notes,
+        _disk_size(path, size, slide_format),
+    )
+
+
+def _disk_size(path: str, size: int, slide_format: SlideFormat) -> int:
+    """
+    Octets d'une lame sur disque (statistiques d'archive).
+
+    Technical Notes:
+        - Point d'entrée + fichiers joints + fichiers de métadonnées
+          (MIRAX: Data*.dat et Slidedat.ini du dossier compagnon)
+        - Calculé à la détection seulement (fichiers déjà listés par FormatDetector)
+    """
+    total = size
+    for file_path in {str(p) for p in slide_format.joint_files + slide_format.metadata_files} - {path}:
+        try:
+            total += os.stat(file_path).st_size
+        except OSError:
+            continue
+    return total
+
+
+def _row_to_slide(row) -> Dict:
+    """Convertit une ligne `entries` au format API (voir scan_slides_directory)."""
+    joint_files_count = len(json.loads(row["joint_files"] or "[]"))
+    companion_dirs_count = len(json.loads(row["companion_dirs"] or "[]"))
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "path": row["path"],
+        "format": row["format"],
+        "format_string": row["format_string"],
+        "structure_type": row["structure_type"],
+        "has_joint_files": joint_files_count > 0,
+        "joint_files_count": joint_files_count,
+        "has_companion_dirs": companion_dirs_count > 0,
+        "companion_dirs_count": companion_dirs_count,
+        "detection_method": row["detection_method"],
+        "is_supported": bool(row["is_supported"]),
+        "notes": row["notes"],
+        "size_bytes": row["disk_size"],
+        "metadata": _row_metadata(row),
+        "metadata_status": _metadata_status(_column(row, "enrich_status"), row["is_supported"]),
+    }
+
+
+def _column(row, name: str):
+    """Valeur d'une colonne, None si absente (lignes construites depuis _ENTRY_COLUMNS)."""
+    return row[name] if name in row.keys() else None
+
+
+def _row_metadata(row) -> Optional[Dict]:
+    """Métadonnées OpenSlide enrichies (None tant que la lame n'est pas enrichie)."""
+    if _column(row, "enrich_status") != "ok":
+        return None
+    return {
+        "dimensions": [row["width"], row["height"]],
+        "level_count": row["level_count"],
+        "vendor": row["vendor"],
+        "mpp_x": row["mpp_x"],
+        "mpp_y": row["mpp_y"],
+        "objective_power": row["objective_power"],
+    }
+
+
+def _metadata_status(enrich_status: Optional[str], is_supported) -> str:
+    """Statut exposé: pending, ok, failed, quarantined ou unsupported."""
+    if enrich_status is not None:
+        return enrich_status
+    return "pending" if is_supported else "unsupported"
+
+
+# Instance globale (singleton)
+slide_catalog = SlideCatalog()
@@ -0,0 +1,154 @@
+"""
+Slide Coherency Service
+
+Détecte qu'une lame a été remplacée ou modifiée sur place et invalide ce
+qui en dépend (handles OpenSlide, métadonnées DZI, tuiles en mémoire et
+dans le cache partagé, entrée du catalogue), sans attendre le watcher.
+
+Pourquoi:
+Les caches sont indexés par chemin. Un scanner qui re-numérise une lame
+réécrit les mêmes fichiers (même .mrxs, nouveaux Data*.dat): sans
+événement du watcher (montage NFS, polling toutes les 30 s, mode off),
+les handles et tuiles en cache servaient les anciens pixels jusqu'au
+redémarrage.
+
+Principe:
+- Empreinte d'une lame = (taille, mtime, inode) du point d'entrée, des
+  fichiers joints et de métadonnées (Slidedat.ini, Index.dat) et des
+  dossiers compagnons (slide_catalog.get_slide_signature_files, point
+  d'entrée seul sinon). Les Data*.dat ne sont pas stat un par un: le mtime
+  du dossier compagnon change quand l'un d'eux est ajouté, supprimé ou
+  renommé
+- check(chemin) sur le chemin critique (tuiles, DZI, ouverture de handle):
+  une recherche dans un dict tant que l'empreinte a moins de
+  VARUNA_COHERENCY_INTERVAL secondes, sinon relecture de la liste dans le
+  catalogue et re-stat (quelques fichiers par lame)
+- Empreinte différente → listeners appelés (tile_server, slide_scanner)
+  avant que l'appelant ne lise ses caches
+
+Configuration (variables d'environnement):
+- VARUNA_COHERENCY_INTERVAL: âge max d'une empreinte avant re-stat
+  (secondes, défaut: 2; 0 = à chaque requête)
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from services.slide_catalog import CatalogChange, slide_catalog
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+COHERENCY_INTERVAL = float(os.environ.get("VARUNA_COHERENCY_INTERVAL", "2"))
+
+COHERENCY_CHECKS = Counter(
+    "varuna_slide_coherency_checks_total",
+    "Slide fingerprint revalidations (unchanged, changed)", ("result",)
+)
+
+# (taille, mtime_ns, inode) par fichier, MISSING si absent
+Fingerprint = Tuple[Tuple[int, int, int], ...]
+MISSING = (-1, -1, -1)
+
+
+@dataclass
+class _SlideState:
+    files: List[str]
+    fingerprint: Fingerprint
+    token: int
+    checked_at: float
+
+
+class SlideCoherency:
+    """
+    Empreintes des lames servies (thread-safe).
+
+    Technical Notes:
+        - Un seul thread re-stat une lame à l'échéance: les autres gardent
+          l'empreinte précédente pendant ce temps (pas de rafale de stat)
+        - token: hash de l'empreinte (entiers seulement: identique dans tous
+          les workers), stable tant que les fichiers ne changent pas (clé du
+          cache partagé, ETag de l'overview)
+        - Liste des fichiers relue dans le catalogue à chaque revalidation;
+          si elle a changé (rescan), nouvelle empreinte de référence sans
+          invalidation (le catalogue a déjà invalidé via ses listeners)
+    """
+
+    def __init__(self, interval: float = COHERENCY_INTERVAL):
+        self.interval = interval
+        self._states: Dict[str, _SlideState] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """Enregistre un callback appelé avec le chemin d'une lame qui a changé."""
+        self._listeners.append(callback)
+
+    def check(self, slide_path: str) -> int:
+        """
+        Revalide l'empreinte d'une lame si elle a plus de `interval` secondes.
+
+        Returns:
+            Token de la version courante des fichiers de la lame
+
+        Technical Notes:
+            - Premier appel pour une lame: empreinte de référence, pas d'invalidation
+            - Changement détecté: listeners appelés dans ce thread avant le retour
+        """
+        now = time.monotonic()
+        state = self._states.get(slide_path)
+        if state is not None:
+            if now - state.checked_at < self.interval:
+                return state.token
+            with self._lock:
+                if now - state.checked_at < self.interval:
+                    return state.token
+                # Réservé par ce thread: les autres utilisent l'empreinte actuelle
+                state.checked_at = now
+
+        files = slide_catalog.get_slide_signature_files(slide_path) or [slide_path]
+        fingerprint = _fingerprint(files)
+        changed = state is not None and files == state.files and fingerprint != state.fingerprint
+        new_state = _SlideState(files, fingerprint, hash(fingerprint), time.monotonic())
+        with self._lock:
+            self._states[slide_path] = new_state
+
+        if state is not None:
+            COHERENCY_CHECKS.inc(1, ("changed" if changed else "unchanged",))
+        if changed:
+            logger.info(f"Slide changed on disk, invalidating caches: {slide_path}")
+            for callback in self._listeners:
+                try:
+                    callback(slide_path)
+                except Exception as e:
+                    logger.error(f"Coherency listener failed for {slide_path}: {e}")
+        return new_state.token
+
+    def forget(self, slide_path: str):
+        with self._lock:
+            self._states.pop(slide_path, None)
+
+    def _on_catalog_change(self, change: CatalogChange):
+        for path in change.modified | change.removed:
+            self.forget(path)
+
+
+def _fingerprint(files: List[str]) -> Fingerprint:
+    signature = []
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            signature.append(MISSING)
+            continue
+        signature.append((st.st_size, st.st_mtime_ns, st.st_ino))
+    return tuple(signature)
+
+
+# Instance globale (tile_server, slide_scanner, routes)
+slide_coherency = SlideCoherency()
+slide_catalog.add_listener(slide_coherency._on_catalog_change)
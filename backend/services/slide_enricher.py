@@ -0,0 +1,403 @@
+"""
+Slide Enricher Service
+
+Enrichissement du catalogue avec les métadonnées OpenSlide (dimensions,
+niveaux, vendor, MPP, grossissement), en arrière-plan.
+
+Pourquoi:
+Ces champs exigent d'ouvrir chaque lame. Extraits une fois et stockés dans
+le catalogue, /api/slides/ et /api/slides/search les renvoient sans aucun
+appel OpenSlide au moment de la requête.
+
+Principe:
+- File = lames supportées sans métadonnées (slide_catalog.pending_enrichment)
+- Pool de processus (pas de threads): un fichier qui fait planter la
+  bibliothèque C (segfault, boucle infinie) ne tue qu'un worker
+- Timeout par lame: le worker bloqué est tué puis remplacé
+- Crash ou timeout répétés (ENRICH_MAX_ATTEMPTS) → lame en quarantaine,
+  plus jamais rouverte tant que le fichier n'a pas changé
+- Relancé par les changements du catalogue (lames ajoutées/modifiées)
+- Plusieurs processus API (uvicorn --workers N) sur un même catalogue: un
+  seul enrichit à la fois (flock sur <catalogue>.enrich.lock), les autres
+  réessaient toutes les ENRICH_LOCK_RETRY secondes tant qu'ils ont été
+  réveillés (pas d'ouvertures OpenSlide ni de tentatives comptées en double)
+
+Configuration (variables d'environnement):
+- VARUNA_ENRICH: "1" (défaut) ou "0" pour désactiver
+- VARUNA_ENRICH_WORKERS: processus du pool (défaut: min(4, CPU))
+- VARUNA_ENRICH_TIMEOUT: secondes max par lame (défaut: 30)
+- VARUNA_ENRICH_MAX_ATTEMPTS: crashs/timeouts avant quarantaine (défaut: 2)
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de flock, un seul processus API supposé
+    fcntl = None
+
+from services.slide_catalog import CatalogChange, slide_catalog
+
+logger = logging.getLogger(__name__)
+
+ENRICH_ENABLED = os.environ.get("VARUNA_ENRICH", "1") != "0"
+ENRICH_WORKERS = int(os.environ.get("VARUNA_ENRICH_WORKERS", min(4, os.cpu_count() or 1)))
+ENRICH_TIMEOUT = float(os.environ.get("VARUNA_ENRICH_TIMEOUT", "30"))
+ENRICH_MAX_ATTEMPTS = int(os.environ.get("VARUNA_ENRICH_MAX_ATTEMPTS", "2"))
+
+# Lames lues dans la file par passage / résultats écrits par transaction
+ENRICH_BATCH_SIZE = 256
+ENRICH_FLUSH_SIZE = 64
+
+# Délai avant nouvel essai quand un autre processus enrichit le catalogue (secondes)
+ENRICH_LOCK_RETRY = 10.0
+
+# (chemin, taille, mtime_ns, tentatives)
+EnrichTask = Tuple[str, int, int, int]
+
+
+class SlideEnricher:
+    """
+    Enrichissement asynchrone du catalogue (un thread + pool de processus).
+
+    Usage:
+        slide_enricher.start(root)    # lifespan: démarrage
+        slide_enricher.schedule()     # nouvelles lames à enrichir
+        slide_enricher.stop()         # lifespan: arrêt
+    """
+
+    def __init__(
+        self,
+        workers: int = ENRICH_WORKERS,
+        timeout: float = ENRICH_TIMEOUT,
+        max_attempts: int = ENRICH_MAX_ATTEMPTS,
+        enabled: bool = ENRICH_ENABLED
+    ):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.enabled = enabled
+
+        self.root: Optional[Path] = None
+        self.running = False
+        self.stats = {"enriched": 0, "failed": 0, "quarantined": 0, "crashes": 0, "timeouts": 0}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, root: Path):
+        """Lance le thread d'enrichissement pour une racine (puis traite la file)."""
+        self.root = Path(root)
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="slide-enricher", daemon=True)
+        self._thread.start()
+        self.schedule()
+
+    def stop(self):
+        """Arrête le thread et tue les workers en cours."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 5)
+            self._thread = None
+
+    def schedule(self):
+        """Signale de nouvelles lames à enrichir (non bloquant)."""
+        self._wakeup.set()
+
+    def status(self) -> Dict:
+        """État de l'enricher + comptes par statut dans le catalogue."""
+        summary = slide_catalog.enrichment_summary(self.root) if self.root else {}
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "workers": self.workers,
+            "timeout_s": self.timeout,
+            "slides": summary,
+            "session": dict(self.stats),
+        }
+
+    def _on_catalog_change(self, change: CatalogChange):
+        """Listener du catalogue: nouvelles lames → passage d'enrichissement."""
+        if (change.added or change.modified) and change.root == self.root:
+            self.schedule()
+
+    # =========================================================================
+    # BOUCLE D'ENRICHISSEMENT
+    # =========================================================================
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            owner = False
+            try:
+                with self._exclusive() as owner:
+                    if owner:
+                        self._drain()
+                if not owner:
+                    # Un autre processus enrichit: il verra aussi nos lames, sauf
+                    # s'il finit juste avant qu'elles arrivent → nouvel essai
+                    if not self._stop.wait(ENRICH_LOCK_RETRY):
+                        self._wakeup.set()
+            except Exception as e:
+                logger.error(f"Slide enrichment failed: {e}")
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Verrou d'enrichissement du catalogue entre processus (non bloquant).
+
+        Yields:
+            True si ce processus est le seul enrichisseur, False si un autre l'est
+        """
+        if fcntl is None:
+            yield True
+            return
+        lock_path = slide_catalog.db_path.with_name(slide_catalog.db_path.name + ".enrich.lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                owner = False
+            else:
+                owner = True
+            try:
+                yield owner
+            finally:
+                if owner:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def _drain(self):
+        """
+        Traite la file jusqu'à ce qu'elle soit vide.
+
+        Technical Notes:
+            - Workers gardés entre les lots, arrêtés quand la file est vide
+              (pas de processus inactifs en mémoire)
+            - Résultats écrits par paquets de ENRICH_FLUSH_SIZE: les lames
+              apparaissent enrichies au fil de l'eau
+        """
+        root = self.root
+        if root is None:
+            return
+
+        pool = _WorkerPool(self.workers, self.timeout, self._stop)
+        pending: List[Dict] = []
+        done = 0
+        start = time.perf_counter()
+        self.running = True
+
+        def on_result(task: EnrichTask, outcome: str, payload):
+            nonlocal done
+            pending.append(self._result(task, outcome, payload))
+            done += 1
+            if len(pending) >= ENRICH_FLUSH_SIZE:
+                slide_catalog.store_enrichment(root, pending)
+                pending.clear()
+
+        try:
+            while not self._stop.is_set():
+                tasks = slide_catalog.pending_enrichment(root, ENRICH_BATCH_SIZE)
+                if not tasks:
+                    break
+                pool.run(tasks, on_result)
+                if pending:
+                    slide_catalog.store_enrichment(root, pending)
+                    pending.clear()
+        finally:
+            pool.close()
+            self.running = False
+
+        if done:
+            logger.info(
+                f"Slide enrichment: {done} slides in {time.perf_counter() - start:.1f}s "
+                f"({self.stats['crashes']} crashes, {self.stats['timeouts']} timeouts, "
+                f"{self.stats['quarantined']} quarantined so far)"
+            )
+
+    def _result(self, task: EnrichTask, outcome: str, payload) -> Dict:
+        """Résultat d'un worker → ligne pour slide_catalog.store_enrichment."""
+        path, size, mtime_ns, attempts = task
+        result = {"path": path, "size": size, "mtime_ns": mtime_ns, "attempts": attempts}
+
+        if outcome == "ok":
+            self.stats["enriched"] += 1
+            return dict(result, status="ok", metadata=payload)
+
+        if outcome == "error":
+            # Erreur propre (OpenSlideError, fichier illisible): pas de nouvel essai
+            self.stats["failed"] += 1
+            return dict(result, status="failed", error=payload)
+
+        # Crash ou timeout: nouvel essai, puis quarantaine
+        self.stats["crashes" if outcome == "crash" else "timeouts"] += 1
+        attempts += 1
+        if attempts >= self.max_attempts:
+            self.stats["quarantined"] += 1
+            logger.warning(f"Slide quarantined after {attempts} {outcome}s: {path} ({payload})")
+            return dict(result, status="quarantined", error=payload, attempts=attempts)
+        return dict(result, status=None, error=payload, attempts=attempts)
+
+
+# =============================================================================
+# POOL DE PROCESSUS
+# =============================================================================
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    conn: "multiprocessing.connection.Connection"
+    task: Optional[EnrichTask] = None
+    deadline: float = 0.0
+
+
+class _WorkerPool:
+    """
+    Pool de processus à une lame par worker, avec timeout et détection de crash.
+
+    Technical Notes:
+        - Pas de concurrent.futures.ProcessPoolExecutor: un worker mort y
+          casse tout le pool (BrokenProcessPool) sans dire quelle lame l'a
+          tué, et une tâche bloquée ne peut pas être interrompue
+        - Un Pipe par worker: la lame en cours de chaque worker est connue,
+          un crash (EOF / sentinel) ou un dépassement de délai lui est imputé
+        - Délai compté depuis l'envoi de la lame (inclut le démarrage du
+          worker pour sa première lame: garder VARUNA_ENRICH_TIMEOUT large)
+        - Contexte "spawn": pas de fork d'un process qui a des threads et
+          une connexion SQLite ouverte
+    """
+
+    def __init__(self, size: int, timeout: float, stop: threading.Event):
+        self.size = size
+        self.timeout = timeout
+        self._stop = stop
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+
+    def run(self, tasks: List[EnrichTask], on_result: Callable[[EnrichTask, str, object], None]):
+        """
+        Traite des lames; on_result(tâche, "ok"|"error"|"crash"|"timeout", données).
+        """
+        queue: Deque[EnrichTask] = deque(tasks)
+        while not self._stop.is_set():
+            self._dispatch(queue)
+            busy = [w for w in self._workers if w.task is not None]
+            if not busy:
+                return
+
+            timeout = max(0.0, min(w.deadline for w in busy) - time.monotonic())
+            ready = set(wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout))
+
+            for worker in busy:
+                task = worker.task
+                if worker.conn in ready:
+                    try:
+                        ok, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        self._discard(worker)
+                        on_result(task, "crash", f"worker exited with code {worker.process.exitcode}")
+                        continue
+                    worker.task = None
+                    on_result(task, "ok" if ok else "error", payload)
+                elif worker.process.sentinel in ready:
+                    self._discard(worker)
+                    on_result(task, "crash", f"worker exited with code {worker.process.exitcode}")
+                elif time.monotonic() >= worker.deadline:
+                    self._discard(worker)
+                    on_result(task, "timeout", f"no result after {self.timeout:g}s")
+
+    def _dispatch(self, queue: Deque[EnrichTask]):
+        """Assigne une lame à chaque worker libre (workers démarrés à la demande)."""
+        while queue:
+            worker = next((w for w in self._workers if w.task is None), None)
+            if worker is None:
+                if len(self._workers) >= self.size:
+                    return
+                worker = self._spawn()
+            task = queue.popleft()
+            try:
+                worker.conn.send(task[0])
+            except (BrokenPipeError, OSError):
+                self._discard(worker)
+                queue.appendleft(task)
+                continue
+            worker.task = task
+            worker.deadline = time.monotonic() + self.timeout
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn,), name="slide-enricher-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: _Worker):
+        """Tue un worker (crash, timeout) et le retire du pool."""
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        worker.task = None
+        self._workers.remove(worker)
+
+    def close(self):
+        """Arrête tous les workers (fin de file ou arrêt du serveur)."""
+        for worker in list(self._workers):
+            if worker.task is None:
+                try:
+                    worker.conn.send(None)
+                    worker.process.join(timeout=1)
+                except (BrokenPipeError, OSError):
+                    pass
+            self._discard(worker)
+
+
+def _worker_main(conn):
+    """
+    Boucle d'un worker: reçoit un chemin, renvoie (ok, métadonnées ou erreur).
+
+    Technical Notes:
+        - OpenSlide importé dans le worker seulement (utils/openslide_loader)
+        - None ou pipe fermé → fin du worker
+    """
+    from services.slide_loader import read_slide_properties
+
+    while True:
+        try:
+            path = conn.recv()
+        except (EOFError, OSError):
+            return
+        if path is None:
+            return
+        try:
+            conn.send((True, read_slide_properties(path)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+# Instance globale (singleton)
+slide_enricher = SlideEnricher()
+slide_catalog.add_listener(slide_enricher._on_catalog_change)
@@ -12,14 +12,17 @@ Documentation officielle:
 - Properties: https://openslide.org/api/python/#openslide.OpenSlide.properties
 """
 
-import openslide
-from openslide import OpenSlideError
-from PIL import Image
+import time
 from io import BytesIO
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Optional
 
+from utils.openslide_loader import get_openslide
 
-def get_slide_metadata(slide_path: str) -> Dict:
+if TYPE_CHECKING:
+    import openslide
+
+
+def get_slide_metadata(slide_path: str, timings: Optional[Dict[str, float]] = None) -> Dict:
     """
     Extrait métadonnées d'une lame.
 
@@ -39,9 +42,13 @@ def get_slide_metadata(slide_path: str) -> Dict:
         - dimensions = niveau 0 (pleine résolution)
         - level_downsamples indique facteur réduction (ex: 2.0 = 50% taille)
         - vendor détecté via propriétés OpenSlide (ex: "3DHISTECH")
+        - timings (optionnel): durées des étapes "open" et "properties" (Server-Timing)
     """
+    openslide = get_openslide()
+    stages = _Stages(timings)
     try:
         slide = openslide.OpenSlide(slide_path)
+        stages.lap("open")
 
         metadata = {
             "dimensions": list(slide.dimensions),
@@ -53,13 +60,69 @@ def get_slide_metadata(slide_path: str) -> Dict:
         }
 
         slide.close()
+        stages.lap("properties")
         return metadata
 
-    except OpenSlideError as e:
+    except openslide.OpenSlideError as e:
         raise RuntimeError(f"Cannot open slide: {e}")
 
 
-def get_slide_overview_bytes(slide_path: str, max_size: int = 2000, quality: int = 85) -> bytes:
+def read_slide_properties(slide_path: str) -> Dict:
+    """
+    Extrait les métadonnées stockées dans le catalogue (enrichissement).
+
+    Returns:
+        {
+            "width": int, "height": int (level 0),
+            "level_count": int,
+            "vendor": str | None (openslide.vendor, ex: "mirax"),
+            "mpp_x": float | None, "mpp_y": float | None (microns par pixel),
+            "objective_power": float | None (ex: 20.0)
+        }
+
+    Raises:
+        RuntimeError: Lame illisible par OpenSlide
+
+    Technical Notes:
+        - Exécuté dans un process de services/slide_enricher.py (un crash
+          de la bibliothèque C ne touche pas le serveur)
+        - Propriétés absentes ou non numériques → None
+    """
+    openslide = get_openslide()
+    try:
+        slide = openslide.OpenSlide(slide_path)
+    except openslide.OpenSlideError as e:
+        raise RuntimeError(f"Cannot open slide: {e}")
+
+    try:
+        properties = slide.properties
+        width, height = slide.dimensions
+        return {
+            "width": width,
+            "height": height,
+            "level_count": slide.level_count,
+            "vendor": properties.get(openslide.PROPERTY_NAME_VENDOR),
+            "mpp_x": _float_property(properties, openslide.PROPERTY_NAME_MPP_X),
+            "mpp_y": _float_property(properties, openslide.PROPERTY_NAME_MPP_Y),
+            "objective_power": _float_property(properties, openslide.PROPERTY_NAME_OBJECTIVE_POWER),
+        }
+    finally:
+        slide.close()
+
+
+def _float_property(properties, name: str) -> Optional[float]:
+    try:
+        return float(properties[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def get_slide_overview_bytes(
+    slide_path: str,
+    max_size: int = 2000,
+    quality: int = 85,
+    timings: Optional[Dict[str, float]] = None
+) -> bytes:
     """
     Extrait overview et retourne bytes JPEG.
 
@@ -76,6 +139,7 @@ def get_slide_overview_bytes(slide_path: str, max_size: int = 2000, quality: int
         slide_path: Chemin vers lame
         max_size: Dimension max (width ou height) en pixels
         quality: Qualité JPEG (1-100)
+        timings: Si fourni, reçoit les durées "open", "thumbnail", "encode" (secondes)
 
     Returns:
         bytes: Image JPEG encodée
@@ -86,9 +150,12 @@ def get_slide_overview_bytes(slide_path: str, max_size: int = 2000, quality: int
         - Optimisé automatiquement par OpenSlide (pas besoin cache Phase 1)
         - Pour .mrxs: OpenSlide gère fichiers compagnons automatiquement
     """
+    openslide = get_openslide()
+    stages = _Stages(timings)
     try:
         # Ouvrir lame (OpenSlide détecte format et fichiers compagnons)
         slide = openslide.OpenSlide(slide_path)
+        stages.lap("open")
 
         # SIMPLE: get_thumbnail() fait tout le boulot
         # Passe tuple (max_width, max_height), préserve aspect ratio
@@ -96,17 +163,19 @@ def get_slide_overview_bytes(slide_path: str, max_size: int = 2000, quality: int
 
         # Fermer slide
         slide.close()
+        stages.lap("thumbnail")
 
         # Convertir PIL.Image en JPEG bytes
         buffer = BytesIO()
         overview.save(buffer, format='JPEG', quality=quality, optimize=True)
+        stages.lap("encode")
         return buffer.getvalue()
 
-    except OpenSlideError as e:
+    except openslide.OpenSlideError as e:
         raise RuntimeError(f"Cannot extract overview: {e}")
 
 
-def _detect_format(slide_path: str, slide: openslide.OpenSlide) -> str:
+def _detect_format(slide_path: str, slide: "openslide.OpenSlide") -> str:
     """
     Détecte format depuis vendor ou extension.
 
@@ -114,7 +183,7 @@ def _detect_format(slide_path: str, slide: openslide.OpenSlide) -> str:
         - Vendor provient des métadonnées embarquées dans la lame
         - Fallback sur extension si vendor inconnu
     """
-    vendor = slide.properties.get(openslide.PROPERTY_NAME_VENDOR, "")
+    vendor = slide.properties.get(get_openslide().PROPERTY_NAME_VENDOR, "")
 
     if "3DHISTECH" in vendor.upper():
         return "3DHistech MRXS"
@@ -124,3 +193,17 @@ def _detect_format(slide_path: str, slide: openslide.OpenSlide) -> str:
         return "Generic TIFF"
     else:
         return f"Unknown ({vendor})"
+
+
+class _Stages:
+    """Durées des étapes dans un dict optionnel (aucun coût si timings est None)."""
+
+    def __init__(self, timings: Optional[Dict[str, float]]):
+        self.timings = timings
+        self._last = time.perf_counter() if timings is not None else 0.0
+
+    def lap(self, stage: str):
+        if self.timings is not None:
+            now = time.perf_counter()
+            self.timings[stage] = now - self._last
+            self._last = now
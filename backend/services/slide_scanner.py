@@ -1,7 +1,12 @@
 """
-Slide Scanner Service - Version 1.5
+Slide Scanner Service - Version 1.6
 Utilise FormatDetector pour détection robuste multi-format.
 
+NOUVEAUTÉ Phase 1.6:
+- Liste servie depuis un catalogue SQLite persistant (slide_catalog.py)
+- Rescans incrémentaux: seuls les dossiers modifiés sont re-examinés
+- Listing paginé (curseur) et streaming NDJSON pour les très grosses archives
+
 NOUVEAUTÉ Phase 1.5:
 - Détection intelligente basée sur documentation OpenSlide officielle
 - Support complet des structures multi-fichiers (VMS, VMU, MIRAX, etc.)
@@ -9,34 +14,52 @@ NOUVEAUTÉ Phase 1.5:
 - Métadonnées enrichies (structure_type, fichiers joints, etc.)
 
 Author: VarunaPoC Team
-Version: 1.5.0
+Version: 1.6.0
 """
 
 from pathlib import Path
-from typing import List, Dict, Optional
-import hashlib
+from typing import Iterator, List, Dict, Optional, Tuple
+import asyncio
 import logging
-from services.format_detector import FormatDetector
+import os
+import queue
+import threading
+import time
+from services.slide_catalog import (
+    slide_catalog, CatalogChange, SlideFilters, CATALOG_REFRESH_INTERVAL, SLIDES_ROOT
+)
+from services.archive_stats import archive_stats
+from services.slide_coherency import slide_coherency
+from services.slide_search import SearchResult, slide_search_index
+from services.tile_server import tile_server
 
 logger = logging.getLogger(__name__)
 
+# Racine par défaut (même racine que le browse: slide_catalog.SLIDES_ROOT)
+SLIDES_DIR = str(SLIDES_ROOT)
+
+# Intervalle minimal entre deux rescans déclenchés par des IDs inconnus,
+# tous IDs confondus (secondes)
+ID_MISS_REFRESH_INTERVAL = 30.0
 
-def scan_slides_directory(slides_dir: str = "../Slides") -> List[Dict]:
+
+def scan_slides_directory(slides_dir: str = SLIDES_DIR, refresh: bool = False) -> List[Dict]:
     """
-    Scan ROBUSTE avec détection de structure multi-format.
+    Liste ROBUSTE des lames avec détection de structure multi-format.
 
-    RETOURNE SEULEMENT:
-    - Lames supportées par OpenSlide
+    RETOURNE:
+    - Lames supportées ET non supportées (is_supported)
     - Lames validées par detect_format()
     - Avec structures complètes (fichiers joints, companions)
 
     Args:
         slides_dir: Chemin vers dossier Slides
+        refresh: Si True, rescan incrémental synchrone avant de répondre
 
     Returns:
         Liste de dicts avec métadonnées enrichies:
         {
-            "id": str (hash MD5 unique),
+            "id": str (hash MD5 du chemin relatif à /Slides),
             "name": str (nom fichier point d'entrée),
             "path": str (chemin absolu point d'entrée),
             "format": str (nom lisible - "Hamamatsu VMS", "MIRAX", etc.),
@@ -47,78 +70,351 @@ def scan_slides_directory(slides_dir: str = "../Slides") -> List[Dict]:
             "has_companion_dirs": bool,
             "companion_dirs_count": int,
             "detection_method": str (méthode utilisée pour debug),
-            "is_validated": bool (toujours True - filtre fait avant),
+            "is_supported": bool,
             "notes": str (infos additionnelles)
         }
 
     Technical Notes:
-        - Utilise FormatDetector basé sur https://openslide.org/formats/
-        - Seules les lames passant detect_format() sont retournées
-        - Fichiers .jpg/.dat isolés (non liés à VMS/MIRAX) sont ignorés
-        - Performance: O(n) avec n = nombre total de fichiers
+        - Servi depuis le catalogue persistant (services/slide_catalog.py)
+        - Premier appel (index vide): scan complet synchrone
+        - Index plus vieux que CATALOG_REFRESH_INTERVAL: rescan incrémental
+          en arrière-plan, la réponse courante vient de l'index
+        - Le rescan ne re-détecte que les fichiers des dossiers modifiés
+    """
+    slides_path = _ensure_catalog(slides_dir, refresh)
+    if slides_path is None:
+        return []
+
+    slides = slide_catalog.list_slides(slides_path)
+    logger.debug(f"Catalog: {len(slides)} slides served from index")
+    return slides
+
+
+def query_slides(
+    filters: Optional[SlideFilters] = None,
+    sort: str = "path",
+    descending: bool = False,
+    after: Optional[Tuple[str, str]] = None,
+    limit: Optional[int] = None,
+    refresh: bool = False,
+    slides_dir: str = SLIDES_DIR
+) -> Tuple[List[Dict], int]:
+    """
+    Page de lames (pagination par clé) + nombre total correspondant aux filtres.
+
+    Args:
+        filters: Filtres format / is_supported / préfixe de chemin
+        sort: "path", "name" ou "format"
+        descending: Tri décroissant
+        after: Clé (valeur de tri, chemin) de la dernière lame de la page précédente
+        limit: Taille de page (None = toutes les lames)
+        refresh: Rescan incrémental synchrone avant de répondre
+
+    Returns:
+        (lames de la page, total)
+
+    Technical Notes:
+        - Mêmes règles de fraîcheur que scan_slides_directory
+        - Requête SQL indexée: coût indépendant de la position de la page
+    """
+    slides_path = _ensure_catalog(slides_dir, refresh)
+    if slides_path is None:
+        return [], 0
+
+    slides = slide_catalog.query_slides(slides_path, filters, sort, descending, after, limit)
+    total = slide_catalog.count_slides(slides_path, filters)
+    return slides, total
+
+
+def stream_slides(
+    filters: Optional[SlideFilters] = None,
+    sort: str = "path",
+    descending: bool = False,
+    slides_dir: str = SLIDES_DIR
+) -> Iterator[Dict]:
+    """
+    Itère sur les lames au fil de l'eau (endpoint NDJSON).
+
+    Technical Notes:
+        - Index existant: lecture par lots depuis SQLite (ordre demandé)
+        - Index vide (premier démarrage sur une grosse archive): le scan
+          complet tourne dans un thread et chaque lot détecté est émis dès
+          qu'il est écrit en base, sans attendre la fin du scan. L'ordre est
+          alors celui de la découverte (tri non appliqué)
+        - Un scan déjà en cours (warmup, autre client du stream) est suivi
+          via slide_catalog.subscribe_slides(): son propre refresh() attend
+          ce scan puis ne re-détecte rien, les lots viennent de l'autre scan
+        - Fin du scan: lames indexées avant l'abonnement lues depuis l'index
+          (celles déjà émises sont sautées)
+    """
+    slides_path = Path(slides_dir).resolve()
+    if not slides_path.exists():
+        logger.warning(f"Slides directory not found: {slides_path}")
+        return
+
+    if slide_catalog.has_root(slides_path):
+        yield from slide_catalog.iter_slides(slides_path, filters, sort, descending)
+        return
+
+    filters = filters or SlideFilters()
+    batches: "queue.Queue[Optional[List[Dict]]]" = queue.Queue()
+
+    def run_scan():
+        try:
+            slide_catalog.refresh(slides_path)
+        except Exception as e:
+            logger.error(f"Streaming scan failed: {e}")
+        finally:
+            batches.put(None)
+
+    slide_catalog.subscribe_slides(slides_path, batches.put)
+    emitted = set()
+    try:
+        threading.Thread(target=run_scan, name="slide-stream-scan", daemon=True).start()
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            for slide in batch:
+                if slide["path"] in emitted:
+                    continue
+                emitted.add(slide["path"])
+                if filters.matches(slide, slides_path):
+                    yield slide
+    finally:
+        slide_catalog.unsubscribe_slides(slides_path, batches.put)
+
+    for slide in slide_catalog.iter_slides(slides_path, filters):
+        if slide["path"] not in emitted:
+            yield slide
+
+
+def search_slides(
+    query: str = "",
+    format_string: Optional[str] = None,
+    vendor: Optional[str] = None,
+    is_supported: Optional[bool] = None,
+    offset: int = 0,
+    limit: int = 50,
+    slides_dir: str = SLIDES_DIR
+) -> SearchResult:
+    """
+    Recherche de lames par fragment de nom/chemin, avec facettes.
+
+    Technical Notes:
+        - Index en mémoire (services/slide_search.py) construit depuis le
+          catalogue au premier appel, puis mis à jour par ses changements
+        - Mêmes règles de fraîcheur que scan_slides_directory
+    """
+    slides_path = _ensure_catalog(slides_dir, refresh=False)
+    if slides_path is None:
+        return SearchResult(total=0, slides=[])
+
+    slide_search_index.ensure_built(slides_path)
+    return slide_search_index.search(query, format_string, vendor, is_supported, offset, limit)
+
+
+def archive_statistics(folder: str = "", slides_dir: str = SLIDES_DIR) -> Optional[Dict]:
+    """
+    Statistiques de l'archive pour un dossier (sous-dossiers inclus).
+
+    Technical Notes:
+        - Agrégats en mémoire (services/archive_stats.py) construits depuis le
+          catalogue au premier appel, puis mis à jour par ses changements
+        - Mêmes règles de fraîcheur que scan_slides_directory
+    """
+    slides_path = _ensure_catalog(slides_dir, refresh=False)
+    if slides_path is None:
+        return None
+
+    archive_stats.ensure_built(slides_path)
+    return archive_stats.folder(folder)
+
+
+def _ensure_catalog(slides_dir: str, refresh: bool) -> Optional[Path]:
+    """
+    Garantit un index utilisable pour la racine et retourne son chemin résolu.
+
+    Technical Notes:
+        - Index vide ou refresh demandé: rescan synchrone
+        - Index plus vieux que CATALOG_REFRESH_INTERVAL: rescan en arrière-plan
     """
     slides_path = Path(slides_dir).resolve()
 
     if not slides_path.exists():
         logger.warning(f"Slides directory not found: {slides_path}")
-        return []
+        return None
 
-    # Créer détecteur
-    detector = FormatDetector()
-
-    # Scan complet
-    detected_formats = detector.scan_directory(slides_path, recursive=True)
-
-    # Convertir en format API
-    slides = []
-    for slide_format in detected_formats:
-        # Générer ID stable (hash du path point d'entrée)
-        slide_id = hashlib.md5(str(slide_format.entry_point).encode()).hexdigest()[:12]
-
-        slides.append({
-            "id": slide_id,
-            "name": slide_format.entry_point.name,
-            "path": str(slide_format.entry_point),
-            "format": slide_format.name,
-            "format_string": slide_format.format_string if slide_format.format_string else "unknown",
-            "structure_type": slide_format.structure_type,
-            "has_joint_files": len(slide_format.joint_files) > 0,
-            "joint_files_count": len(slide_format.joint_files),
-            "has_companion_dirs": len(slide_format.companion_dirs) > 0,
-            "companion_dirs_count": len(slide_format.companion_dirs),
-            "detection_method": slide_format.detection_method,
-            "is_supported": slide_format.is_supported,  # Phase 1.5.1: inclure supporté/non supporté
-            "notes": slide_format.notes
-        })
-
-    logger.info(f"Scan complete: {len(slides)} validated slides ready for API")
-    return slides
+    last_refresh = slide_catalog.last_refresh(slides_path)
+
+    if refresh or last_refresh is None:
+        slide_catalog.refresh(slides_path)
+    elif time.time() - last_refresh > CATALOG_REFRESH_INTERVAL:
+        slide_catalog.refresh_in_background(slides_path)
 
+    return slides_path
 
-# Cache ID->Path (évite rescans répétés)
+
+# Cache ID->Path (évite requêtes SQLite répétées)
 _slide_cache = {}
 
+# Dernier rescan déclenché par un ID inconnu (monotonic), tous IDs confondus
+_last_miss_refresh = float("-inf")
+_miss_refresh_lock = threading.Lock()
+
 
-def get_slide_path_by_id(slide_id: str) -> Optional[str]:
+def get_slide_path_by_id(slide_id: str, slides_dir: str = SLIDES_DIR) -> Optional[str]:
     """
     Trouve path depuis ID.
 
     Args:
-        slide_id: ID unique (hash MD5)
+        slide_id: ID unique (voir slide_catalog.slide_id_for_relative_path)
 
     Returns:
         Chemin absolu vers point d'entrée, ou None
 
     Technical Notes:
-        - Cache rempli au premier appel
-        - Redémarrer serveur pour forcer rescan
+        - Mémoire → catalogue (lames scannées + IDs enregistrés par le browse):
+          O(1), aucun scan
+        - Tenu à jour par les changements du catalogue (watcher, rescans)
+        - ID inconnu: rescan incrémental puis nouvel essai, au plus un rescan
+          toutes les ID_MISS_REFRESH_INTERVAL secondes pour tous les IDs (des
+          IDs invalides variés ne multiplient pas les parcours de l'arbre)
+        - Peut donc bloquer le temps d'un rescan: depuis une route async,
+          utiliser get_slide_path_by_id_async()
         - Retourne toujours le POINT D'ENTRÉE (pas fichiers joints)
     """
-    global _slide_cache
+    slide_path = _slide_cache.get(slide_id)
+    if slide_path is not None:
+        return slide_path
+
+    slide_path = slide_catalog.get_path_by_id(slide_id)
+    if slide_path is None:
+        slide_path = _lookup_after_refresh(slide_id, slides_dir)
+
+    if slide_path is not None:
+        _slide_cache[slide_id] = slide_path
+    return slide_path
+
+
+async def get_slide_path_by_id_async(slide_id: str, slides_dir: str = SLIDES_DIR) -> Optional[str]:
+    """
+    get_slide_path_by_id() pour les routes async.
+
+    Technical Notes:
+        - ID en mémoire (cas courant): réponse directe, sans changement de thread
+        - Sinon lookup SQLite (et rescan éventuel) dans le pool de threads par
+          défaut: la boucle d'événements n'est jamais bloquée par un parcours
+    """
+    slide_path = _slide_cache.get(slide_id)
+    if slide_path is not None:
+        return slide_path
+    return await asyncio.get_running_loop().run_in_executor(
+        None, get_slide_path_by_id, slide_id, slides_dir
+    )
+
+
+def load_id_map(slides_dir: str = SLIDES_DIR) -> int:
+    """
+    Pré-remplit le cache ID->Path depuis le catalogue (warmup au démarrage).
+
+    Returns:
+        Nombre d'IDs chargés
+
+    Technical Notes:
+        - Index existant: lecture SQLite seule (pas de scan)
+        - Index vide: scan complet (une seule fois, résultat persistant)
+    """
+    slides = scan_slides_directory(slides_dir)
+    _slide_cache.update((s['id'], s['path']) for s in slides)
+    return len(slides)
+
+
+def _lookup_after_refresh(slide_id: str, slides_dir: str) -> Optional[str]:
+    """
+    Rescan incrémental pour un ID inconnu, limité globalement.
+
+    Technical Notes:
+        - Pas de rescan si l'index a été rafraîchi il y a moins de
+          ID_MISS_REFRESH_INTERVAL secondes (warmup, rescan périodique, autre ID)
+        - Un seul rescan à la fois: les autres IDs inconnus répondent None
+          immédiatement au lieu d'attendre
+        - Un ID ne désigne pas de dossier (hash du chemin): rescan de la racine,
+          seuls les dossiers modifiés depuis le dernier passage sont relus
+    """
+    global _last_miss_refresh
+    slides_path = Path(slides_dir).resolve()
+    if not slides_path.exists():
+        return None
+
+    last_refresh = slide_catalog.last_refresh(slides_path)
+    if last_refresh is not None and time.time() - last_refresh < ID_MISS_REFRESH_INTERVAL:
+        return None
+    if not _miss_refresh_lock.acquire(blocking=False):
+        return None
+    try:
+        now = time.monotonic()
+        if now - _last_miss_refresh < ID_MISS_REFRESH_INTERVAL:
+            return None
+        _last_miss_refresh = now
+        logger.info(f"Unknown slide ID {slide_id}: incremental catalog refresh")
+        slide_catalog.refresh(slides_path)
+    finally:
+        _miss_refresh_lock.release()
+    return slide_catalog.get_path_by_id(slide_id)
+
+
+def _on_catalog_change(change: CatalogChange):
+    """
+    Applique un changement du catalogue au cache ID->Path et au tile server.
+
+    Technical Notes:
+        - Lames ajoutées: visibles immédiatement (pas de redémarrage)
+        - Lames modifiées/supprimées: handles, métadonnées DZI et tuiles
+          en cache invalidés (évite de servir d'anciens pixels)
+    """
+    for path in change.added:
+        _slide_cache[change.slide_id(path)] = path
+
+    for path in change.removed:
+        _slide_cache.pop(change.slide_id(path), None)
+        tile_server.invalidate(path)
+
+    for path in change.modified:
+        _slide_cache[change.slide_id(path)] = path
+        tile_server.invalidate(path)
+
+
+slide_catalog.add_listener(_on_catalog_change)
+
+
+def _on_slide_changed(slide_path: str):
+    """
+    Lame modifiée ou remplacée sur disque (slide_coherency): rescan ciblé du catalogue.
+
+    Technical Notes:
+        - Handles, DZI et tuiles déjà invalidés par tile_server (listener direct)
+        - Dossier de la lame + dossiers compagnons relus (MIRAX: .mrxs re-détecté
+          même si seuls les Data*.dat ont changé)
+        - Les listeners du catalogue mettent à jour le reste (ID->Path,
+          enrichissement sur disque, recherche, statistiques)
+        - Thread dédié: la requête qui a détecté le changement n'attend pas le rescan
+    """
+    root = Path(SLIDES_DIR).resolve()
+    if not slide_path.startswith(str(root) + os.sep):
+        return
+    dirs = [Path(slide_path).parent]
+    dirs += [Path(p) for p in slide_catalog.get_slide_files(slide_path) or [] if os.path.isdir(p)]
+    threading.Thread(
+        target=_refresh_changed_dirs, args=(root, dirs), name="coherency-refresh", daemon=True
+    ).start()
+
+
+def _refresh_changed_dirs(root: Path, dirs: List[Path]):
+    try:
+        slide_catalog.refresh(root, dirs=dirs)
+    except Exception as e:
+        logger.error(f"Coherency rescan failed for {dirs[0]}: {e}")
 
-    if not _slide_cache:
-        # Premier appel: remplir cache
-        slides = scan_slides_directory()
-        _slide_cache = {s['id']: s['path'] for s in slides}
 
-    return _slide_cache.get(slide_id)
+slide_coherency.add_listener(_on_slide_changed)
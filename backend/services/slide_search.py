@@ -0,0 +1,490 @@
+"""
+Slide Search Service
+
+Index de recherche en mémoire sur les lames du catalogue.
+
+Pourquoi:
+Retrouver une lame par un fragment de numéro d'accession ("B23-0451")
+imposait de naviguer dossier par dossier ou de télécharger toute la liste
+/api/slides pour filtrer côté client. Sur 100k+ lames, l'index répond en
+quelques millisecondes.
+
+Structure:
+- Trigrammes du nom (minuscules) → IDs internes: recherche de sous-chaîne
+  ("0451" trouve "B23-0451-HE.svs")
+- Trigrammes des dossiers (indexés une fois par dossier, pas par lame)
+- Noms et tokens du nom triés (bisect) → nom exact, préfixes, termes
+  courts (< 3 caractères)
+- Facettes: format_string, vendor (fabricant déduit du format), is_supported,
+  chacune en ensembles d'IDs (comptes = tailles d'intersections)
+
+Classement (somme sur les termes de la requête):
+- Nom exact > nom commençant par le terme > token du nom commençant par le
+  terme > sous-chaîne du nom > sous-chaîne du dossier
+- Égalité: nom le plus court, puis chemin
+
+Mise à jour:
+Construit depuis slide_catalog au premier appel, puis tenu à jour par les
+changements du catalogue (listener: rescans, watcher), sans reconstruction.
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.slide_catalog import CatalogChange, slide_catalog
+
+logger = logging.getLogger(__name__)
+
+# Fabricant par format OpenSlide (facette "vendor")
+VENDOR_BY_FORMAT = {
+    "aperio": "Leica (Aperio)",
+    "leica": "Leica",
+    "hamamatsu": "Hamamatsu",
+    "mirax": "3DHISTECH",
+    "philips": "Philips",
+    "sakura": "Sakura",
+    "trestle": "Trestle",
+    "ventana": "Roche (Ventana)",
+    "zeiss": "Zeiss",
+    "dicom": "DICOM",
+    "generic-tiff": "Generic TIFF",
+}
+
+# Poids du classement (par terme)
+SCORE_EXACT_NAME = 100
+SCORE_NAME_PREFIX = 50
+SCORE_TOKEN_PREFIX = 30
+SCORE_NAME_SUBSTRING = 20
+SCORE_PATH_SUBSTRING = 5
+
+# Facettes exposées
+FACETS = ("format_string", "vendor", "is_supported")
+
+# Ensemble "dense" (>= 1/N de l'index): parcours de l'ordre global plutôt que tri
+DENSE_SCAN_FACTOR = 20
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def vendor_for_format(format_string: Optional[str]) -> str:
+    """Fabricant lisible depuis le format OpenSlide ("Unknown" si inconnu)."""
+    return VENDOR_BY_FORMAT.get(format_string or "", "Unknown")
+
+
+@dataclass
+class SearchResult:
+    """
+    Résultat d'une recherche.
+
+    Attributes:
+        total: Nombre de lames correspondant à la requête et aux filtres
+        slides: Page de lames (format API + "vendor" et "score")
+        facets: Comptes par format_string / vendor / is_supported sur les
+                lames correspondant au texte (avant filtres de facettes)
+    """
+    total: int
+    slides: List[Dict]
+    facets: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+@dataclass
+class _Document:
+    slide: Dict
+    name: str                   # nom en minuscules
+    folder: str                 # dossier relatif en minuscules (séparateurs POSIX)
+    rank: Tuple[int, str]       # départage: nom le plus court, puis chemin
+    tokens: Set[str]
+    trigrams: Set[str]          # trigrammes du nom
+
+
+@dataclass
+class _TermMatch:
+    """Lames correspondant à un terme, par niveau de pertinence."""
+    exact: Set[int]
+    name_prefix: Set[int]
+    token_prefix: Set[int]
+    name_substring: Set[int]
+    folder: Set[int]
+
+    def all(self) -> Set[int]:
+        return self.name_prefix | self.token_prefix | self.name_substring | self.folder
+
+    def tiers(self) -> List[Tuple[int, Set[int]]]:
+        """(score, lames) du plus au moins pertinent, sans doublons."""
+        exact = self.exact
+        prefix = self.name_prefix - exact
+        token = self.token_prefix - self.name_prefix
+        substring = self.name_substring - self.token_prefix - self.name_prefix
+        folder = self.folder - self.name_substring - self.token_prefix - self.name_prefix
+        return [
+            (SCORE_EXACT_NAME, exact),
+            (SCORE_NAME_PREFIX, prefix),
+            (SCORE_TOKEN_PREFIX, token),
+            (SCORE_NAME_SUBSTRING, substring),
+            (SCORE_PATH_SUBSTRING, folder),
+        ]
+
+
+class SlideSearchIndex:
+    """
+    Index de recherche des lames d'une racine /Slides.
+
+    Usage:
+        slide_search_index.ensure_built(root)
+        result = slide_search_index.search("B23-0451", limit=20)
+    """
+
+    def __init__(self):
+        self.root: Optional[Path] = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._root_prefix = str(self.root) + os.sep if self.root else ""
+        self._docs: Dict[int, _Document] = {}
+        self._doc_by_path: Dict[str, int] = {}
+        self._name_trigrams: Dict[str, Set[int]] = {}
+        self._token_docs: Dict[str, Set[int]] = {}
+        self._sorted_tokens: List[str] = []
+        self._sorted_names: List[Tuple[str, int]] = []
+        # Dossiers indexés une seule fois (partagés par toutes leurs lames)
+        self._folder_docs: Dict[str, Set[int]] = {}
+        self._folder_trigrams: Dict[str, Set[str]] = {}
+        # Ordres globaux (requête vide / départage), tenus triés
+        self._by_path: List[Tuple[str, int]] = []
+        self._by_rank: List[Tuple[Tuple[int, str], int]] = []
+        self._facet_docs: Dict[str, Dict[str, Set[int]]] = {facet: {} for facet in FACETS}
+        self._next_doc = 0
+
+    # =========================================================================
+    # CONSTRUCTION / MISE À JOUR
+    # =========================================================================
+
+    def is_built_for(self, root: Path) -> bool:
+        return self.root == root
+
+    def ensure_built(self, root: Path):
+        """Construit l'index depuis le catalogue si ce n'est pas déjà fait pour `root`."""
+        with self._lock:
+            if not self.is_built_for(root):
+                self.rebuild(root, slide_catalog.list_slides(root))
+
+    def rebuild(self, root: Path, slides: List[Dict]):
+        """Reconstruit l'index depuis une liste complète de lames."""
+        start = time.perf_counter()
+        with self._lock:
+            self.root = root
+            self._reset()
+            # Chemins uniques (clé primaire du catalogue): pas de _remove ici,
+            # les listes ne sont triées qu'à la fin
+            for slide in {slide["path"]: slide for slide in slides}.values():
+                self._add(slide, keep_sorted=False)
+            # Un tri final plutôt qu'une insertion triée par lame
+            self._sorted_tokens.sort()
+            self._sorted_names.sort()
+            self._by_path.sort()
+            self._by_rank.sort()
+        logger.info(
+            f"Search index built: {len(slides)} slides in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+    def apply_change(self, change: CatalogChange):
+        """
+        Listener du catalogue: applique un rescan sans reconstruire l'index.
+
+        Technical Notes:
+            - Lames ajoutées/modifiées/enrichies relues depuis le catalogue (une requête)
+            - Ignoré si l'index n'est pas (encore) construit pour cette racine
+        """
+        if change.root is None or not self.is_built_for(change.root):
+            return
+
+        updated = slide_catalog.get_slides(change.root, change.added | change.modified | change.enriched)
+        with self._lock:
+            for path in change.removed | change.modified | change.enriched:
+                self._remove(path)
+            for slide in updated:
+                self._add(slide)
+
+    def _add(self, slide: Dict, keep_sorted: bool = True):
+        path = slide["path"]
+        if path in self._doc_by_path:
+            self._remove(path)
+
+        name = slide["name"].lower()
+        relative = _relative_to(path, self._root_prefix).lower()
+        folder = relative.rpartition("/")[0]
+        tokens = set(t for t in _TOKEN_SPLIT.split(name) if t)
+        trigrams = _trigrams(name)
+
+        doc_id = self._next_doc
+        self._next_doc += 1
+        indexed = dict(slide, vendor=vendor_for_format(slide["format_string"]))
+        doc = _Document(indexed, name, folder, (len(name), path), tokens, trigrams)
+        self._docs[doc_id] = doc
+        self._doc_by_path[path] = doc_id
+
+        insert = bisect.insort if keep_sorted else list.append
+        for gram in trigrams:
+            self._name_trigrams.setdefault(gram, set()).add(doc_id)
+        for token in tokens:
+            docs = self._token_docs.get(token)
+            if docs is None:
+                docs = self._token_docs[token] = set()
+                insert(self._sorted_tokens, token)
+            docs.add(doc_id)
+        insert(self._sorted_names, (name, doc_id))
+        insert(self._by_path, (path, doc_id))
+        insert(self._by_rank, (doc.rank, doc_id))
+
+        folder_docs = self._folder_docs.get(folder)
+        if folder_docs is None:
+            folder_docs = self._folder_docs[folder] = set()
+            for gram in _trigrams(folder):
+                self._folder_trigrams.setdefault(gram, set()).add(folder)
+        folder_docs.add(doc_id)
+
+        for facet, value in _facet_values(indexed).items():
+            self._facet_docs[facet].setdefault(value, set()).add(doc_id)
+
+    def _remove(self, path: str):
+        doc_id = self._doc_by_path.pop(path, None)
+        if doc_id is None:
+            return
+        doc = self._docs.pop(doc_id)
+
+        for gram in doc.trigrams:
+            _discard(self._name_trigrams, gram, doc_id)
+        for token in doc.tokens:
+            if _discard(self._token_docs, token, doc_id):
+                _remove_sorted(self._sorted_tokens, token)
+        _remove_sorted(self._sorted_names, (doc.name, doc_id))
+        _remove_sorted(self._by_path, (path, doc_id))
+        _remove_sorted(self._by_rank, (doc.rank, doc_id))
+
+        if _discard(self._folder_docs, doc.folder, doc_id):
+            for gram in _trigrams(doc.folder):
+                _discard(self._folder_trigrams, gram, doc.folder)
+
+        for facet, value in _facet_values(doc.slide).items():
+            _discard(self._facet_docs[facet], value, doc_id)
+
+    # =========================================================================
+    # RECHERCHE
+    # =========================================================================
+
+    def search(
+        self,
+        query: str = "",
+        format_string: Optional[str] = None,
+        vendor: Optional[str] = None,
+        is_supported: Optional[bool] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> SearchResult:
+        """
+        Recherche classée et paginée.
+
+        Args:
+            query: Termes (ET logique), fragments de nom ou de dossier
+            format_string: Filtre format OpenSlide exact
+            vendor: Filtre fabricant (voir VENDOR_BY_FORMAT)
+            is_supported: Filtre lames ouvrables / non ouvrables
+            offset: Index du premier résultat
+            limit: Taille de page
+
+        Returns:
+            SearchResult (requête vide: toutes les lames, triées par chemin)
+
+        Technical Notes:
+            - Tout en opérations d'ensembles (C): intersections de trigrammes,
+              plages bisect sur noms/tokens triés, facettes par ensembles
+            - Un terme correspond au nom OU au dossier (pas à cheval sur "/")
+            - Terme unique: les niveaux de pertinence sont parcourus dans
+              l'ordre, seule la page demandée est triée
+        """
+        terms = list(dict.fromkeys(t for t in query.lower().split() if t))
+        wanted = offset + limit
+
+        with self._lock:
+            everything = not terms
+            if everything:
+                matched = set(self._docs)
+                term_matches = []
+            else:
+                term_matches = [self._match_term(term) for term in terms]
+                matched = term_matches[0].all()
+                for term_match in term_matches[1:]:
+                    matched &= term_match.all()
+
+            facets = {
+                facet: {
+                    value: count
+                    for value, count in sorted(
+                        ((value, len(docs) if everything else len(matched & docs))
+                         for value, docs in postings.items()),
+                        key=lambda item: -item[1]
+                    )
+                    if count
+                }
+                for facet, postings in self._facet_docs.items()
+            }
+
+            filtered = matched
+            for facet, value in (("format_string", format_string), ("vendor", vendor),
+                                 ("is_supported", _bool_facet(is_supported))):
+                if value is not None and value != "":
+                    filtered = filtered & self._facet_postings(facet, value)
+
+            if not terms:
+                ranked = [(0, doc_id) for doc_id in self._take_ordered(filtered, wanted, self._by_path)]
+            elif len(term_matches) == 1:
+                ranked = []
+                for score, tier in term_matches[0].tiers():
+                    if len(ranked) >= wanted:
+                        break
+                    tier = tier & filtered
+                    ranked.extend((score, doc_id) for doc_id in self._take_ordered(tier, wanted - len(ranked), self._by_rank))
+            else:
+                scores = {doc_id: 0 for doc_id in filtered}
+                for term_match in term_matches:
+                    for score, tier in term_match.tiers():
+                        for doc_id in tier & filtered:
+                            scores[doc_id] += score
+                top = heapq.nsmallest(wanted, scores, key=lambda d: (-scores[d], self._docs[d].rank))
+                ranked = [(scores[doc_id], doc_id) for doc_id in top]
+
+            slides = [dict(self._docs[doc_id].slide, score=score) for score, doc_id in ranked[offset:wanted]]
+
+        return SearchResult(total=len(filtered), slides=slides, facets=facets)
+
+    def _match_term(self, term: str) -> _TermMatch:
+        """Ensembles de lames correspondant à un terme (voir _TermMatch)."""
+        # Plages bisect sur les noms triés: exact / préfixe
+        low = bisect.bisect_left(self._sorted_names, (term,))
+        exact_end = bisect.bisect_left(self._sorted_names, (term + "\x00",))
+        prefix_end = bisect.bisect_left(self._sorted_names, (term + "\uffff",))
+        exact = {doc_id for _, doc_id in self._sorted_names[low:exact_end]}
+        name_prefix = {doc_id for _, doc_id in self._sorted_names[low:prefix_end]}
+
+        # Tokens du nom ("he" → "B23-0451-HE.svs")
+        token_prefix: Set[int] = set()
+        start = bisect.bisect_left(self._sorted_tokens, term)
+        end = bisect.bisect_left(self._sorted_tokens, term + "\uffff")
+        for token in self._sorted_tokens[start:end]:
+            token_prefix |= self._token_docs[token]
+
+        name_substring: Set[int] = set()
+        folder: Set[int] = set()
+        if len(term) >= 3:
+            grams = _trigrams(term)
+            name_substring = _intersect(self._name_trigrams, grams)
+            if len(term) > 3:
+                # Trigrammes présents ≠ sous-chaîne: vérification
+                name_substring = {d for d in name_substring if term in self._docs[d].name}
+            for folder_name in _intersect(self._folder_trigrams, grams):
+                if term in folder_name:
+                    folder |= self._folder_docs[folder_name]
+
+        return _TermMatch(exact, name_prefix, token_prefix, name_substring, folder)
+
+    def _facet_postings(self, facet: str, value: str) -> Set[int]:
+        postings = self._facet_docs[facet]
+        if value in postings:
+            return postings[value]
+        # Valeurs insensibles à la casse ("3dhistech" → "3DHISTECH")
+        for key, docs in postings.items():
+            if key.lower() == value.lower():
+                return docs
+        return set()
+
+    def _take_ordered(self, doc_ids: Set[int], count: int, order: list) -> List[int]:
+        """
+        Les `count` premières lames de `doc_ids` selon un ordre global trié.
+
+        Technical Notes:
+            - Ensemble dense: parcours de l'ordre global, arrêt dès `count` trouvées
+            - Ensemble clairsemé: tri partiel (heapq) de l'ensemble seul
+        """
+        if count <= 0 or not doc_ids:
+            return []
+        if len(doc_ids) * DENSE_SCAN_FACTOR >= len(order):
+            taken = []
+            for _, doc_id in order:
+                if doc_id in doc_ids:
+                    taken.append(doc_id)
+                    if len(taken) == count:
+                        break
+            return taken
+        if order is self._by_path:
+            key = lambda d: self._docs[d].slide["path"]
+        else:
+            key = lambda d: self._docs[d].rank
+        return heapq.nsmallest(count, doc_ids, key=key)
+
+
+def _relative_to(path: str, root_prefix: str) -> str:
+    """Chemin relatif POSIX (préfixe de chaîne: pas d'os.path.relpath par lame)."""
+    if root_prefix and path.startswith(root_prefix):
+        path = path[len(root_prefix):]
+    return path.replace("\\", "/")
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _intersect(postings: Dict[str, set], keys: Set[str]) -> set:
+    """Intersection des postings de toutes les clés (vide si une clé manque)."""
+    sets = []
+    for key in keys:
+        values = postings.get(key)
+        if not values:
+            return set()
+        sets.append(values)
+    sets.sort(key=len)
+    return set.intersection(*sets) if sets else set()
+
+
+def _discard(postings: Dict, key, value) -> bool:
+    """Retire `value` du posting de `key`; True si le posting devient vide (supprimé)."""
+    values = postings.get(key)
+    if values is None:
+        return False
+    values.discard(value)
+    if not values:
+        del postings[key]
+        return True
+    return False
+
+
+def _remove_sorted(items: list, item):
+    index = bisect.bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
+
+
+def _bool_facet(value: Optional[bool]) -> Optional[str]:
+    return None if value is None else ("true" if value else "false")
+
+
+def _facet_values(slide: Dict) -> Dict[str, str]:
+    return {
+        "format_string": slide["format_string"] or "unknown",
+        "vendor": slide["vendor"],
+        "is_supported": _bool_facet(bool(slide["is_supported"])),
+    }
+
+
+# Instance globale (singleton)
+slide_search_index = SlideSearchIndex()
+slide_catalog.add_listener(slide_search_index.apply_change)
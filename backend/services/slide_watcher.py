@@ -0,0 +1,217 @@
+"""
+Slide Watcher Service
+
+Surveillance du répertoire /Slides pour garder le catalogue à jour en direct.
+
+Modes:
+- inotify (Linux) / ReadDirectoryChangesW (Windows) / FSEvents (Mac) via
+  watchdog: événements filesystem → rescan ciblé des dossiers concernés
+- polling: rescan incrémental périodique (mtimes de dossiers). Obligatoire
+  pour les montages réseau (NFS/SMB) où inotify ne voit pas les écritures
+  faites par d'autres machines (ex: scanners qui déposent les lames)
+
+Debounce:
+Un scanner écrit une lame MIRAX en centaines de fichiers Data*.dat. Les
+événements sont regroupés par dossier et appliqués une fois que le dossier
+est resté calme pendant VARUNA_WATCH_DEBOUNCE secondes (avec un délai max
+pour ne pas retarder indéfiniment une écriture continue).
+
+Configuration (variables d'environnement):
+- VARUNA_WATCH_MODE: "auto" (défaut), "inotify", "poll" ou "off"
+- VARUNA_WATCH_DEBOUNCE: secondes de calme avant rescan (défaut: 2)
+- VARUNA_WATCH_POLL_INTERVAL: période du polling en secondes (défaut: 30)
+
+Les invalidations (cache ID->Path, handles, tuiles) sont faites par les
+listeners du catalogue (voir slide_scanner._on_catalog_change).
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.slide_catalog import SlideCatalog, slide_catalog
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+    WATCHDOG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+WATCH_MODE = os.environ.get("VARUNA_WATCH_MODE", "auto").lower()
+WATCH_DEBOUNCE = float(os.environ.get("VARUNA_WATCH_DEBOUNCE", "2"))
+WATCH_POLL_INTERVAL = float(os.environ.get("VARUNA_WATCH_POLL_INTERVAL", "30"))
+
+# Délai max entre le premier événement d'un dossier et son rescan
+WATCH_MAX_DELAY_FACTOR = 10
+
+
+class _DirectoryEventHandler(FileSystemEventHandler):
+    """Traduit les événements watchdog en dossiers à rescanner."""
+
+    def __init__(self, watcher: "SlideWatcher"):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+
+        paths = [event.src_path]
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            paths.append(dest_path)
+
+        for path in paths:
+            path = Path(os.fsdecode(path))
+            # Le dossier parent doit être relu (entrée ajoutée/supprimée/modifiée)
+            self._watcher.mark_dirty(path.parent)
+            if event.is_directory:
+                self._watcher.mark_dirty(path)
+
+
+class SlideWatcher:
+    """
+    Garde le catalogue synchronisé avec le filesystem.
+
+    Usage:
+        watcher = SlideWatcher(Path("../Slides").resolve())
+        watcher.start()
+        ...
+        watcher.stop()
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        catalog: SlideCatalog = slide_catalog,
+        mode: str = WATCH_MODE,
+        debounce: float = WATCH_DEBOUNCE,
+        poll_interval: float = WATCH_POLL_INTERVAL
+    ):
+        self.root = Path(root)
+        self.catalog = catalog
+        self.requested_mode = mode
+        self.mode: Optional[str] = None  # mode effectif après start()
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+        self._pending: Dict[Path, tuple] = {}  # {dir: (first_event, last_event)}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+
+    # =========================================================================
+    # CYCLE DE VIE
+    # =========================================================================
+
+    def start(self) -> str:
+        """
+        Démarre la surveillance.
+
+        Returns:
+            Mode effectif: "inotify", "poll" ou "off"
+
+        Technical Notes:
+            - "auto": watchdog si installé, sinon polling
+            - Si l'observer natif échoue (limite inotify atteinte, montage
+              non supporté): repli automatique sur le polling
+        """
+        if self.requested_mode == "off" or not self.root.exists():
+            if self.requested_mode != "off":
+                logger.warning(f"Slide watcher disabled: {self.root} not found")
+            self.mode = "off"
+            return self.mode
+
+        mode = self.requested_mode
+        if mode in ("auto", "inotify"):
+            mode = "inotify" if self._start_observer() else "poll"
+
+        self.mode = mode
+        target = self._debounce_loop if mode == "inotify" else self._poll_loop
+        self._thread = threading.Thread(target=target, name=f"slide-watcher-{mode}", daemon=True)
+        self._thread.start()
+        logger.info(f"Slide watcher started ({mode}) on {self.root}")
+        return self.mode
+
+    def stop(self):
+        """Arrête la surveillance (observer + thread de rescan)."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        logger.info("Slide watcher stopped")
+
+    def _start_observer(self) -> bool:
+        if not WATCHDOG_AVAILABLE:
+            if self.requested_mode == "inotify":
+                logger.warning("watchdog not installed: falling back to polling")
+            return False
+        try:
+            observer = Observer()
+            observer.schedule(_DirectoryEventHandler(self), str(self.root), recursive=True)
+            observer.start()
+        except OSError as e:
+            # Ex: "inotify watch limit reached" sur de très grosses archives
+            logger.warning(f"Filesystem observer failed ({e}): falling back to polling")
+            return False
+        self._observer = observer
+        return True
+
+    # =========================================================================
+    # ÉVÉNEMENTS → RESCANS CIBLÉS
+    # =========================================================================
+
+    def mark_dirty(self, dir_path: Path):
+        """Planifie le rescan d'un dossier (debounce)."""
+        now = time.monotonic()
+        with self._pending_lock:
+            first, _ = self._pending.get(dir_path, (now, now))
+            self._pending[dir_path] = (first, now)
+        self._wakeup.set()
+
+    def _take_ready_dirs(self) -> list:
+        """Retire et retourne les dossiers calmes depuis `debounce` secondes."""
+        now = time.monotonic()
+        max_delay = self.debounce * WATCH_MAX_DELAY_FACTOR
+        ready = []
+        with self._pending_lock:
+            for dir_path, (first, last) in list(self._pending.items()):
+                if now - last >= self.debounce or now - first >= max_delay:
+                    ready.append(dir_path)
+                    del self._pending[dir_path]
+        return ready
+
+    def _debounce_loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=self.debounce / 2 or 0.1)
+            self._wakeup.clear()
+
+            ready = self._take_ready_dirs()
+            if not ready:
+                continue
+            try:
+                self.catalog.refresh(self.root, dirs=ready)
+            except Exception as e:
+                logger.error(f"Watcher rescan failed: {e}")
+
+    def _poll_loop(self):
+        while not self._stop.wait(timeout=self.poll_interval):
+            try:
+                self.catalog.refresh(self.root)
+            except Exception as e:
+                logger.error(f"Watcher poll rescan failed: {e}")
@@ -8,6 +8,10 @@ Fonctionnalités:
 - Support multi-niveaux pyramidaux
 - Conversion RGBA → RGB (OpenSlide retourne RGBA)
 - Optimisation mémoire (pas de chargement complet)
+- Cache LRU des tuiles encodées, invalidable par slide
+- Second niveau optionnel partagé entre workers uvicorn (shared_tile_cache.py)
+- Mode dégradé optionnel (VARUNA_TILE_DEADLINE_MS): tuile d'un niveau plus
+  grossier déjà en cache, agrandie, si le rendu dépasse son échéance
 
 Formats supportés (Phase 2):
 - .bif (Ventana BIF)
@@ -18,33 +22,111 @@ Technical Notes:
 - OpenSlide utilise coordonnées niveau 0 pour read_region()
 - Tuiles retournées en JPEG (compression optimale)
 - Taille tuile standard: 256x256 pixels
+- Latence par étape, ratios de cache, handles ouverts et file d'attente
+  exposés par GET /metrics (utils/metrics.py)
 
 Voir: docs/CLAUDE.md section "Coordinate Mapping"
 """
 
+import asyncio
 import io
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
-from PIL import Image
-import openslide
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 import logging
 
+from services.shared_tile_cache import shared_tile_cache
+from services.slide_coherency import slide_coherency
+from utils.metrics import Counter, Gauge, Histogram
+from utils.openslide_loader import get_openslide
+
+if TYPE_CHECKING:
+    import openslide
+
 logger = logging.getLogger(__name__)
 
+# Budget mémoire du cache de tuiles JPEG encodées (Mo)
+TILE_CACHE_MAX_BYTES = int(float(os.environ.get("VARUNA_TILE_CACHE_MB", "256")) * 1024 * 1024)
+
+# Threads dédiés à l'extraction des tuiles (hors threadpool par défaut de Starlette)
+TILE_WORKERS = int(os.environ.get("VARUNA_TILE_WORKERS", min(32, (os.cpu_count() or 1) * 4)))
+
+# Échéance d'une tuile avant réponse dégradée (ms, 0 = toujours attendre le rendu)
+TILE_DEADLINE_MS = float(os.environ.get("VARUNA_TILE_DEADLINE_MS", "0"))
+
+# Niveaux plus grossiers examinés pour une tuile dégradée (3 → agrandissement max ~x8)
+DEGRADED_MAX_LEVELS = 3
+DEGRADED_JPEG_QUALITY = 75
+
+# =============================================================================
+# MÉTRIQUES (GET /metrics)
+# =============================================================================
+
+TILE_STAGE_SECONDS = Histogram(
+    "varuna_tile_stage_seconds",
+    "Tile latency per stage (queue, cache, shared_cache, checkout, read_region, convert, pad, encode)",
+    ("stage", "format", "level"),
+)
+TILE_REQUESTS = Counter(
+    "varuna_tile_requests_total", "Tile requests by outcome (hit, shared_hit, miss, out_of_bounds, error)",
+    ("outcome",)
+)
+TILE_BYTES_SERVED = Counter("varuna_tile_bytes_served_total", "JPEG tile bytes returned", ("format",))
+HANDLE_REQUESTS = Counter(
+    "varuna_slide_handle_requests_total", "OpenSlide handle checkouts (hit = already open)", ("result",)
+)
+TILE_QUEUE_DEPTH = Gauge("varuna_tile_queue_depth", "Tile requests waiting for a tile worker")
+TILE_DEGRADED = Counter(
+    "varuna_tile_degraded_total",
+    "Tiles past their deadline (served = upsampled coarser tile, unavailable = waited for the render)",
+    ("result",)
+)
+
 
 class TileServer:
     """
     Serveur de tuiles pour streaming OpenSeadragon.
 
     Gère l'ouverture des slides et l'extraction de tuiles à la demande.
+
+    Caches:
+        - Slides ouverts (max 5 handles)
+        - Tuiles JPEG encodées (LRU borné en octets)
+        - Tuiles partagées entre processus (optionnel, VARUNA_SHARED_TILE_CACHE_MB)
+        - Métadonnées DZI par slide
+    Tous invalidables par slide via invalidate() (fichier modifié/supprimé),
+    appelé dès qu'un fichier de la lame change (slide_coherency.check() avant
+    toute lecture de cache).
     """
 
-    def __init__(self):
-        """Initialize tile server with slide cache."""
+    def __init__(self, tile_cache_max_bytes: int = TILE_CACHE_MAX_BYTES, tile_deadline_ms: float = TILE_DEADLINE_MS):
+        """Initialize tile server with slide, tile and metadata caches."""
         self._slide_cache = {}  # Cache des slides ouverts {path: OpenSlide}
         self._max_cache_size = 5  # Max 5 slides en cache
-
-    def get_slide(self, slide_path: str) -> openslide.OpenSlide:
+        self._opening = {}  # {path: [Lock, threads en attente]} ouvertures en cours
+        self._tile_cache = OrderedDict()  # LRU {(path, level, col, row, tile_size): bytes}
+        self._tile_keys_by_slide = {}  # {path: set(keys)} pour invalidation O(k)
+        self._tile_cache_bytes = 0
+        self._tile_cache_max_bytes = tile_cache_max_bytes
+        self._dzi_cache = {}  # {path: dict}
+        self._format_by_path = {}  # {path: openslide.vendor} (label des métriques)
+        self._lock = threading.RLock()  # invalidate() appelé depuis le watcher
+        self._reads_started: Dict[int, float] = {}  # {id requête: début (monotonic)} en cours dans un worker
+        self._read_ids = itertools.count()
+        self._tile_workers = TILE_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix="tile")
+        self._tile_deadline = tile_deadline_ms / 1000
+        # Tuiles dégradées hors du pool principal (saturé quand l'échéance est dépassée)
+        self._degraded_executor = (
+            ThreadPoolExecutor(max_workers=2, thread_name_prefix="tile-degraded") if tile_deadline_ms > 0 else None
+        )
+
+    def get_slide(self, slide_path: str) -> "openslide.OpenSlide":
         """
         Récupère ou ouvre un slide (avec cache).
 
@@ -61,38 +143,226 @@ class TileServer:
         Technical Notes:
             - Cache les slides ouverts pour réutilisation
             - Limite à max_cache_size slides simultanés
-            - Ferme le plus ancien si cache plein
+            - Retire le plus ancien si cache plein, SANS le fermer (comme
+              invalidate()): une lecture peut être en cours dans un autre
+              worker, OpenSlide abort le processus si on ferme sous elle
+            - Une seule ouverture par chemin: les threads concurrents sur une
+              lame absente attendent le premier au lieu d'ouvrir chacun un handle
+            - Handle d'une lame modifiée sur disque jamais réutilisé (slide_coherency)
         """
-        if slide_path in self._slide_cache:
+        slide_coherency.check(slide_path)
+        with self._lock:
+            cached = self._slide_cache.get(slide_path)
+            if cached is None:
+                opening = self._opening.setdefault(slide_path, [threading.Lock(), 0])
+                opening[1] += 1
+        if cached is not None:
+            HANDLE_REQUESTS.inc(1, ("hit",))
             logger.debug(f"Slide cache hit: {Path(slide_path).name}")
-            return self._slide_cache[slide_path]
+            return cached
 
+        try:
+            with opening[0]:
+                with self._lock:
+                    cached = self._slide_cache.get(slide_path)
+                if cached is not None:
+                    # Ouvert par le thread qui tenait le verrou
+                    HANDLE_REQUESTS.inc(1, ("hit",))
+                    return cached
+                HANDLE_REQUESTS.inc(1, ("miss",))
+                return self._open_slide(slide_path)
+        finally:
+            with self._lock:
+                opening[1] -= 1
+                if opening[1] == 0:
+                    del self._opening[slide_path]
+
+    def _open_slide(self, slide_path: str) -> "openslide.OpenSlide":
+        """Ouvre un slide et l'ajoute au cache (appelé sous le verrou d'ouverture du chemin)."""
         # Vérifier que le fichier existe
         if not Path(slide_path).exists():
             raise FileNotFoundError(f"Slide not found: {slide_path}")
 
         # Ouvrir le slide
         logger.info(f"Opening slide: {Path(slide_path).name}")
+        openslide = get_openslide()
         slide = openslide.OpenSlide(slide_path)
 
         # Ajouter au cache
-        if len(self._slide_cache) >= self._max_cache_size:
-            # Cache plein, supprimer le plus ancien
-            oldest_path = next(iter(self._slide_cache))
-            logger.info(f"Cache full, closing: {Path(oldest_path).name}")
-            self._slide_cache[oldest_path].close()
-            del self._slide_cache[oldest_path]
-
-        self._slide_cache[slide_path] = slide
+        with self._lock:
+            self._format_by_path[slide_path] = slide.properties.get(openslide.PROPERTY_NAME_VENDOR, "unknown")
+            if len(self._slide_cache) >= self._max_cache_size:
+                # Cache plein, retirer le plus ancien (fermé au GC après la dernière lecture)
+                oldest_path = next(iter(self._slide_cache))
+                logger.info(f"Cache full, dropping handle: {Path(oldest_path).name}")
+                del self._slide_cache[oldest_path]
+
+            self._slide_cache[slide_path] = slide
         return slide
 
-    def get_tile(
+    async def get_tile_async(
+        self,
+        slide_path: str,
+        level: int,
+        col: int,
+        row: int,
+        tile_size: int = 256,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Optional[bytes]:
+        """
+        get_tile() exécuté dans le pool de threads des tuiles (routes async).
+
+        Technical Notes:
+            - Pool dédié (VARUNA_TILE_WORKERS): les tuiles ne concurrencent
+              pas les autres routes pour le threadpool par défaut
+            - Attente dans la file mesurée (étape "queue", jauge queue_depth)
+        - Requêtes en cours dans un worker suivies (reads_in_flight(), readiness)
+        """
+        enqueued = time.perf_counter()
+        TILE_QUEUE_DEPTH.inc()
+
+        def run():
+            TILE_QUEUE_DEPTH.dec()
+            waited = time.perf_counter() - enqueued
+            if timings is not None:
+                timings["queue"] = waited
+            TILE_STAGE_SECONDS.observe(waited, ("queue", self._format_by_path.get(slide_path, "unknown"), str(level)))
+            read_id = next(self._read_ids)
+            self._reads_started[read_id] = time.monotonic()
+            try:
+                return self.get_tile(slide_path, level, col, row, tile_size, timings)
+            finally:
+                del self._reads_started[read_id]
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+
+    async def get_tile_with_deadline(
+        self,
+        slide_path: str,
+        level: int,
+        col: int,
+        row: int,
+        tile_size: int = 256,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[Optional[bytes], Optional[int]]:
+        """
+        get_tile_async() borné par l'échéance VARUNA_TILE_DEADLINE_MS.
+
+        Returns:
+            (bytes JPEG ou None, niveau source si tuile dégradée sinon None)
+
+        Technical Notes:
+            - Échéance dépassée: crop agrandi d'une tuile plus grossière déjà
+              en cache (local ou partagé), JPEG non mis en cache
+            - Le rendu pleine qualité continue en arrière-plan et remplit les
+              caches: la requête suivante de la même tuile l'obtient
+            - Aucune tuile grossière disponible: attente du rendu (comme sans échéance)
+            - Sans échéance: get_tile_async() sans surcoût
+        """
+        if not self._tile_deadline:
+            return await self.get_tile_async(slide_path, level, col, row, tile_size, timings), None
+
+        # Dict propre au rendu: il peut finir après la réponse dégradée
+        render_timings: Dict[str, float] = {}
+        render = asyncio.ensure_future(
+            self.get_tile_async(slide_path, level, col, row, tile_size, render_timings)
+        )
+        try:
+            tile_bytes = await asyncio.wait_for(asyncio.shield(render), self._tile_deadline)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            if timings is not None:
+                timings.update(render_timings)
+            return tile_bytes, None
+
+        started = time.perf_counter()
+        degraded = await asyncio.get_running_loop().run_in_executor(
+            self._degraded_executor, self.get_degraded_tile, slide_path, level, col, row, tile_size
+        )
+        if timings is not None:
+            timings.update(render_timings)
+            timings["degraded"] = time.perf_counter() - started
+        if degraded is not None and not render.done():
+            TILE_DEGRADED.inc(1, ("served",))
+            # Rendu orphelin: son éventuelle exception ne doit pas être signalée comme non lue
+            render.add_done_callback(lambda task: task.cancelled() or task.exception())
+            return degraded
+        if degraded is None:
+            TILE_DEGRADED.inc(1, ("unavailable",))
+        tile_bytes = await render
+        if timings is not None:
+            timings.update(render_timings)
+        return tile_bytes, None
+
+    def get_degraded_tile(
         self,
         slide_path: str,
         level: int,
         col: int,
         row: int,
         tile_size: int = 256
+    ) -> Optional[Tuple[bytes, int]]:
+        """
+        Approximation d'une tuile à partir d'une tuile plus grossière en cache.
+
+        Returns:
+            (bytes JPEG, niveau source) ou None (métadonnées ou tuile grossière absentes)
+
+        Technical Notes:
+            - N'ouvre aucun slide et ne lit aucun fichier: métadonnées DZI et
+              tuiles déjà en cache seulement
+            - Niveaux level+1 .. level+DEGRADED_MAX_LEVELS, le plus fin d'abord
+            - La zone demandée doit tenir dans une seule tuile source (cas des
+              pyramides à facteur entier, alignées sur la grille)
+        """
+        slide_coherency.check(slide_path)
+        with self._lock:
+            metadata = self._dzi_cache.get(slide_path)
+        if metadata is None or not 0 <= level < metadata["levels"]:
+            return None
+        level_width, level_height = metadata["level_dimensions"][level]
+        x_tile = col * tile_size
+        y_tile = row * tile_size
+        if col < 0 or row < 0 or x_tile >= level_width or y_tile >= level_height:
+            return None
+
+        downsamples = metadata["level_downsamples"]
+        for source in range(level + 1, min(metadata["levels"], level + 1 + DEGRADED_MAX_LEVELS)):
+            ratio = downsamples[source] / downsamples[level]
+            left, top, span = x_tile / ratio, y_tile / ratio, tile_size / ratio
+            source_col, source_row = int(left // tile_size), int(top // tile_size)
+            left -= source_col * tile_size
+            top -= source_row * tile_size
+            if left + span > tile_size + 0.5 or top + span > tile_size + 0.5:
+                continue
+            source_key = (slide_path, source, source_col, source_row, tile_size)
+            with self._lock:
+                source_bytes = self._tile_cache.get(source_key)
+            if source_bytes is None and shared_tile_cache.enabled:
+                source_bytes = shared_tile_cache.get(*source_key)
+            if source_bytes is None:
+                continue
+
+            from PIL import Image
+            with Image.open(io.BytesIO(source_bytes)) as source_tile:
+                upsampled = source_tile.resize(
+                    (tile_size, tile_size), Image.BILINEAR,
+                    box=(left, top, min(left + span, tile_size), min(top + span, tile_size))
+                )
+            buffer = io.BytesIO()
+            upsampled.save(buffer, format='JPEG', quality=DEGRADED_JPEG_QUALITY)
+            return buffer.getvalue(), source
+        return None
+
+    def get_tile(
+        self,
+        slide_path: str,
+        level: int,
+        col: int,
+        row: int,
+        tile_size: int = 256,
+        timings: Optional[Dict[str, float]] = None
     ) -> Optional[bytes]:
         """
         Extrait une tuile depuis un slide.
@@ -103,6 +373,7 @@ class TileServer:
             col: Colonne de la tuile (x / tile_size)
             row: Ligne de la tuile (y / tile_size)
             tile_size: Taille de la tuile en pixels (défaut: 256)
+            timings: Si fourni, reçoit la durée de chaque étape (secondes)
 
         Returns:
             Bytes JPEG de la tuile, ou None si hors limites
@@ -112,17 +383,49 @@ class TileServer:
             - RGBA converti en RGB (OpenSlide retourne RGBA)
             - Tuiles hors limites retournent None (pas d'erreur)
             - JPEG quality=85 pour compromis taille/qualité
+            - Tuiles encodées gardées en cache LRU (TILE_CACHE_MAX_BYTES)
+            - Miss local: cache partagé entre workers consulté avant tout rendu,
+              tuile rendue publiée dans les deux niveaux
+            - Chaque étape (cache, checkout, read_region, convert, pad, encode)
+              alimente varuna_tile_stage_seconds{stage, format, level}
 
         Examples:
             >>> get_tile("slide.mrxs", level=2, col=5, row=3)
             b'\xff\xd8\xff\xe0...'  # JPEG bytes
         """
+        stages = _StageTimer(timings, self._format_by_path.get(slide_path, "unknown"), level)
+
+        slide_coherency.check(slide_path)
+        cache_key = (slide_path, level, col, row, tile_size)
+        with self._lock:
+            cached = self._tile_cache.get(cache_key)
+            if cached is not None:
+                self._tile_cache.move_to_end(cache_key)
+        stages.lap("cache")
+        if cached is not None:
+            TILE_REQUESTS.inc(1, ("hit",))
+            TILE_BYTES_SERVED.inc(len(cached), (stages.format,))
+            return cached
+
+        if shared_tile_cache.enabled:
+            shared = shared_tile_cache.get(slide_path, level, col, row, tile_size)
+            stages.lap("shared_cache")
+            if shared is not None:
+                self._store_tile(cache_key, shared)
+                TILE_REQUESTS.inc(1, ("shared_hit",))
+                TILE_BYTES_SERVED.inc(len(shared), (stages.format,))
+                return shared
+
+        openslide = get_openslide()
         try:
             slide = self.get_slide(slide_path)
+            stages.format = self._format_by_path.get(slide_path, "unknown")
+            stages.lap("checkout")
 
             # Vérifier que le niveau existe
             if level < 0 or level >= slide.level_count:
                 logger.warning(f"Invalid level {level} (max: {slide.level_count-1})")
+                TILE_REQUESTS.inc(1, ("out_of_bounds",))
                 return None
 
             # Calculer coordonnées niveau 0 (OpenSlide requirement)
@@ -142,6 +445,7 @@ class TileServer:
             # Vérifier si tuile hors limites
             if x_tile >= level_width or y_tile >= level_height:
                 logger.debug(f"Tile out of bounds: level={level}, col={col}, row={row}")
+                TILE_REQUESTS.inc(1, ("out_of_bounds",))
                 return None
 
             # Calculer taille réelle de la tuile (dernière tuile peut être plus petite)
@@ -155,28 +459,40 @@ class TileServer:
                 level=level,
                 size=(actual_width, actual_height)
             )
+            stages.lap("read_region")
 
             # Convertir RGBA → RGB (OpenSeadragon préfère RGB)
             rgb_region = region.convert('RGB')
+            stages.lap("convert")
 
             # Si tuile incomplète (bord), créer image complète avec fond noir
             if actual_width < tile_size or actual_height < tile_size:
+                from PIL import Image  # déjà chargé par openslide
                 full_tile = Image.new('RGB', (tile_size, tile_size), (0, 0, 0))
                 full_tile.paste(rgb_region, (0, 0))
                 rgb_region = full_tile
+                stages.lap("pad")
 
             # Encoder en JPEG
             buffer = io.BytesIO()
             rgb_region.save(buffer, format='JPEG', quality=85, optimize=True)
             buffer.seek(0)
 
-            return buffer.getvalue()
+            tile_bytes = buffer.getvalue()
+            stages.lap("encode")
+            self._store_tile(cache_key, tile_bytes)
+            shared_tile_cache.put(slide_path, level, col, row, tile_size, tile_bytes)
+            TILE_REQUESTS.inc(1, ("miss",))
+            TILE_BYTES_SERVED.inc(len(tile_bytes), (stages.format,))
+            return tile_bytes
 
         except openslide.OpenSlideError as e:
             logger.error(f"OpenSlide error extracting tile: {e}")
+            TILE_REQUESTS.inc(1, ("error",))
             return None
         except Exception as e:
             logger.error(f"Unexpected error extracting tile: {e}")
+            TILE_REQUESTS.inc(1, ("error",))
             return None
 
     def get_dzi_metadata(self, slide_path: str) -> dict:
@@ -202,12 +518,19 @@ class TileServer:
             - Format compatible OpenSeadragon DziTileSource
             - Overlap=0 pour simplifier (pas de chevauchement tuiles)
             - tile_size=256 (standard OpenSeadragon)
+            - Mis en cache par slide (invalidé avec invalidate())
         """
+        slide_coherency.check(slide_path)
+        with self._lock:
+            cached = self._dzi_cache.get(slide_path)
+        if cached is not None:
+            return cached
+
         slide = self.get_slide(slide_path)
 
         width, height = slide.dimensions  # Niveau 0
 
-        return {
+        metadata = {
             "width": width,
             "height": height,
             "tile_size": 256,
@@ -218,17 +541,162 @@ class TileServer:
             "level_downsamples": list(slide.level_downsamples)
         }
 
+        with self._lock:
+            self._dzi_cache[slide_path] = metadata
+        return metadata
+
+    def prime_dzi_metadata(self, slide_path: str, metadata: dict):
+        """
+        Restaure des métadonnées DZI connues (warmup) sans ouvrir le slide.
+
+        Technical Notes:
+            - L'appelant garantit que le fichier n'a pas changé (taille/mtime)
+        """
+        with self._lock:
+            self._dzi_cache.setdefault(slide_path, metadata)
+
+    @property
+    def max_open_slides(self) -> int:
+        return self._max_cache_size
+
+    @property
+    def open_slides(self) -> int:
+        return len(self._slide_cache)
+
+    @property
+    def max_tile_cache_bytes(self) -> int:
+        return self._tile_cache_max_bytes
+
+    @property
+    def tile_workers(self) -> int:
+        return self._tile_workers
+
+    def reads_in_flight(self) -> Tuple[int, float]:
+        """(requêtes en cours dans un worker, âge de la plus ancienne en secondes)."""
+        started = list(self._reads_started.values())
+        if not started:
+            return 0, 0.0
+        return len(started), time.monotonic() - min(started)
+
+    def tile_cache_usage(self) -> Tuple[int, int]:
+        """(nombre de tuiles, octets) dans le cache de tuiles."""
+        with self._lock:
+            return len(self._tile_cache), self._tile_cache_bytes
+
+    def _store_tile(self, cache_key: tuple, tile_bytes: bytes):
+        """Ajoute une tuile au cache LRU et évince jusqu'à respecter le budget."""
+        size = len(tile_bytes)
+        if size > self._tile_cache_max_bytes:
+            return
+
+        with self._lock:
+            if cache_key in self._tile_cache:
+                return
+            self._tile_cache[cache_key] = tile_bytes
+            self._tile_keys_by_slide.setdefault(cache_key[0], set()).add(cache_key)
+            self._tile_cache_bytes += size
+
+            while self._tile_cache_bytes > self._tile_cache_max_bytes:
+                old_key, old_bytes = self._tile_cache.popitem(last=False)
+                self._tile_cache_bytes -= len(old_bytes)
+                keys = self._tile_keys_by_slide.get(old_key[0])
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._tile_keys_by_slide[old_key[0]]
+
+    def invalidate(self, slide_path: str):
+        """
+        Oublie tout ce qui est en cache pour un slide (fichier modifié/supprimé).
+
+        Technical Notes:
+            - Handle retiré du cache mais PAS fermé explicitement: une lecture
+              peut être en cours dans un autre thread; OpenSlide ferme le
+              handle au garbage collection une fois la dernière référence lâchée
+            - Tuiles et métadonnées DZI du slide supprimées
+            - Cache partagé: la clé inclut la version des fichiers de la lame
+              (slide_coherency), les anciennes tuiles sont inatteignables
+        """
+        with self._lock:
+            handle = self._slide_cache.pop(slide_path, None)
+            self._dzi_cache.pop(slide_path, None)
+            self._format_by_path.pop(slide_path, None)
+            keys = self._tile_keys_by_slide.pop(slide_path, set())
+            for key in keys:
+                tile_bytes = self._tile_cache.pop(key, None)
+                if tile_bytes is not None:
+                    self._tile_cache_bytes -= len(tile_bytes)
+
+        if handle is not None or keys:
+            logger.info(f"Invalidated cache for {Path(slide_path).name} ({len(keys)} tiles)")
+
     def close_all(self):
-        """Ferme tous les slides en cache."""
-        for path, slide in self._slide_cache.items():
-            logger.info(f"Closing cached slide: {Path(path).name}")
-            slide.close()
-        self._slide_cache.clear()
+        """
+        Ferme tous les slides en cache (arrêt du serveur).
+
+        Technical Notes:
+            - Pools de threads arrêtés d'abord (tuiles en file annulées, lectures
+              en cours attendues): rendus orphelins de get_tile_with_deadline et
+              requêtes annulées peuvent encore être dans read_region, et OpenSlide
+              abort le processus si on ferme le handle sous eux
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._degraded_executor is not None:
+            self._degraded_executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            for path, slide in self._slide_cache.items():
+                logger.info(f"Closing cached slide: {Path(path).name}")
+                slide.close()
+            self._slide_cache.clear()
+            self._dzi_cache.clear()
 
     def __del__(self):
         """Cleanup au garbage collection."""
         self.close_all()
 
 
+class _StageTimer:
+    """
+    Chronométrage des étapes d'une tuile (chemin critique: un perf_counter
+    et une observation d'histogramme par étape).
+    """
+
+    __slots__ = ("timings", "format", "level", "_last")
+
+    def __init__(self, timings: Optional[Dict[str, float]], slide_format: str, level: int):
+        self.timings = timings
+        self.format = slide_format
+        self.level = str(level)
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        TILE_STAGE_SECONDS.observe(elapsed, (stage, self.format, self.level))
+        if self.timings is not None:
+            self.timings[stage] = elapsed
+
+
 # Instance globale (singleton)
 tile_server = TileServer()
+slide_coherency.add_listener(tile_server.invalidate)
+
+
+def _hit_ratio(counter: Counter) -> float:
+    hits = counter.value(("hit",))
+    total = hits + counter.value(("miss",))
+    return hits / total if total else 0.0
+
+
+Gauge("varuna_tile_cache_hit_ratio", "Tile cache hits / (hits + misses)",
+      callback=lambda: _hit_ratio(TILE_REQUESTS))
+Gauge("varuna_slide_handle_hit_ratio", "Open handle reuse / all handle checkouts",
+      callback=lambda: _hit_ratio(HANDLE_REQUESTS))
+Gauge("varuna_open_slide_handles", "OpenSlide handles kept open", callback=lambda: tile_server.open_slides)
+Gauge("varuna_tile_reads_in_flight", "Tile requests running in a tile worker",
+      callback=lambda: tile_server.reads_in_flight()[0])
+Gauge("varuna_tile_cache_entries", "Encoded tiles in cache", callback=lambda: tile_server.tile_cache_usage()[0])
+Gauge("varuna_tile_cache_bytes", "Encoded tile cache size in bytes", callback=lambda: tile_server.tile_cache_usage()[1])
+Gauge("varuna_shared_tile_cache_bytes", "Bytes used in the cross-process tile cache arena",
+      callback=lambda: min(*shared_tile_cache.usage()))
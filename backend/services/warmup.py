@@ -0,0 +1,221 @@
+"""
+Warmup Service
+
+Préchauffage du backend au démarrage (appelé par le lifespan de main.py).
+
+Pourquoi:
+Sans préchauffage, la première requête /api/slides/ paie le scan complet et
+la première tuile de chaque lame paie l'ouverture OpenSlide (parsing des
+IFDs, Slidedat.ini MIRAX, etc.: parfois plusieurs secondes).
+
+Étapes (thread d'arrière-plan, le serveur accepte déjà les requêtes):
+0. Watcher /Slides (l'observer inotify pose ses watches récursivement dans
+   le thread appelant: plusieurs secondes sur une grosse arborescence)
+1. Catalogue: chargement de l'index (scan complet uniquement s'il est vide)
+2. Cache ID->Path, index de recherche et statistiques remplis depuis le catalogue
+3. Lames "chaudes": configurées + récemment consultées, ouvertes à l'avance;
+   métadonnées DZI restaurées depuis l'historique (si fichier inchangé)
+
+Readiness:
+`state` passe de "starting" à "ready" (ou "degraded" si une étape échoue).
+GET /api/ready répond 503 tant que le backend n'est pas chaud, pour que les
+load balancers n'y envoient du trafic qu'une fois prêt.
+
+Configuration (variables d'environnement):
+- VARUNA_WARMUP: "1" (défaut) ou "0" pour désactiver
+- VARUNA_WARMUP_SLIDES: IDs ou chemins relatifs à /Slides, séparés par des virgules
+- VARUNA_WARMUP_RECENT: nombre de lames récemment consultées à pré-ouvrir (défaut: 3)
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from services.archive_stats import archive_stats
+from services.slide_catalog import slide_catalog
+from services.slide_scanner import SLIDES_DIR, get_slide_path_by_id, load_id_map
+from services.slide_search import slide_search_index
+from services.tile_server import tile_server
+
+if TYPE_CHECKING:
+    from services.slide_watcher import SlideWatcher
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get("VARUNA_WARMUP", "1") != "0"
+WARMUP_SLIDES = [s.strip() for s in os.environ.get("VARUNA_WARMUP_SLIDES", "").split(",") if s.strip()]
+WARMUP_RECENT = int(os.environ.get("VARUNA_WARMUP_RECENT", "3"))
+
+# États de readiness
+STATE_STARTING = "starting"
+STATE_LOADING_CATALOG = "loading_catalog"
+STATE_WARMING_SLIDES = "warming_slides"
+STATE_READY = "ready"
+STATE_DEGRADED = "degraded"
+STATE_STOPPED = "stopped"
+
+
+class Warmup:
+    """
+    Préchauffage asynchrone + état de readiness.
+
+    Usage:
+        warmup.start(slide_watcher)  # lifespan: démarrage
+        warmup.is_ready     # /api/ready
+        warmup.stop()       # lifespan: arrêt
+    """
+
+    def __init__(
+        self,
+        slides_dir: str = SLIDES_DIR,
+        hot_slides: Optional[List[str]] = None,
+        recent_count: int = WARMUP_RECENT,
+        enabled: bool = WARMUP_ENABLED
+    ):
+        self.slides_dir = slides_dir
+        self.hot_slides = WARMUP_SLIDES if hot_slides is None else hot_slides
+        self.recent_count = recent_count
+        self.enabled = enabled
+
+        self.state = STATE_STARTING
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.slides_opened: List[str] = []
+        self._started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watcher: Optional["SlideWatcher"] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state in (STATE_READY, STATE_DEGRADED)
+
+    def start(self, watcher: Optional["SlideWatcher"] = None):
+        """
+        Lance le préchauffage dans un thread (ne bloque pas le démarrage).
+
+        Args:
+            watcher: Watcher /Slides à démarrer dans ce thread (aussi quand
+                     le préchauffage est désactivé)
+        """
+        self._started_at = time.perf_counter()
+        self._watcher = watcher
+        if not self.enabled:
+            self.state = STATE_READY
+            if watcher is not None:
+                self._thread = threading.Thread(target=self._start_watcher, name="warmup", daemon=True)
+                self._thread.start()
+            return
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Interrompt le préchauffage (entre deux étapes) et attend le thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.state = STATE_STOPPED
+
+    def status(self) -> Dict:
+        """État détaillé (réponse de /api/ready)."""
+        return {
+            "ready": self.is_ready,
+            "state": self.state,
+            "error": self.error,
+            "timings_ms": {step: round(seconds * 1000, 1) for step, seconds in self.timings.items()},
+            "slides_opened": len(self.slides_opened),
+        }
+
+    # =========================================================================
+    # ÉTAPES
+    # =========================================================================
+
+    def _run(self):
+        try:
+            self._timed("watcher", self._start_watcher)
+            if self._stop.is_set():
+                return
+
+            self.state = STATE_LOADING_CATALOG
+            self._timed("catalog", self._load_catalog)
+            if self._stop.is_set():
+                return
+
+            self.state = STATE_WARMING_SLIDES
+            self._timed("slides", self._open_hot_slides)
+            if self._stop.is_set():
+                return
+
+            self.state = STATE_READY
+        except Exception as e:
+            logger.error(f"Warmup failed: {e}")
+            self.error = str(e)
+            self.state = STATE_DEGRADED
+
+        self.timings["total"] = time.perf_counter() - self._started_at
+        logger.info(f"Warmup {self.state} in {self.timings['total']:.2f}s ({len(self.slides_opened)} slides opened)")
+
+    def _timed(self, step: str, func):
+        start = time.perf_counter()
+        func()
+        self.timings[step] = time.perf_counter() - start
+
+    def _start_watcher(self):
+        if self._watcher is not None and not self._stop.is_set():
+            self._watcher.start()
+
+    def _load_catalog(self):
+        count = load_id_map(self.slides_dir)
+        root = Path(self.slides_dir).resolve()
+        if root.exists():
+            slide_search_index.ensure_built(root)
+            archive_stats.ensure_built(root)
+        logger.info(f"Warmup: {count} slides in catalog")
+
+    def _open_hot_slides(self):
+        """
+        Ouvre les lames configurées puis les plus récemment consultées.
+
+        Technical Notes:
+            - Limité au nombre de handles gardés par tile_server (LRU)
+            - Une lame qui échoue à l'ouverture est ignorée (pas bloquant)
+        """
+        budget = tile_server.max_open_slides
+        targets: Dict[str, Optional[Dict]] = {}
+
+        for ref in self.hot_slides:
+            path = self._resolve(ref)
+            if path is None:
+                logger.warning(f"Warmup: slide not found: {ref}")
+                continue
+            targets.setdefault(path, None)
+
+        for path, metadata in slide_catalog.recent_views(self.recent_count):
+            if metadata is not None:
+                tile_server.prime_dzi_metadata(path, metadata)
+            targets.setdefault(path, metadata)
+
+        for path in list(targets)[:budget]:
+            if self._stop.is_set():
+                return
+            try:
+                tile_server.get_slide(path)
+                tile_server.get_dzi_metadata(path)
+                self.slides_opened.append(path)
+            except Exception as e:
+                logger.warning(f"Warmup: cannot open {Path(path).name}: {e}")
+
+    def _resolve(self, ref: str) -> Optional[str]:
+        """ID de lame ou chemin relatif à /Slides → chemin absolu."""
+        candidate = Path(self.slides_dir).resolve() / ref.replace("\\", "/").lstrip("/")
+        if candidate.is_file():
+            return str(candidate)
+        return get_slide_path_by_id(ref, self.slides_dir)
+
+
+# Instance globale (singleton)
+warmup = Warmup()
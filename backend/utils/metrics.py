@@ -0,0 +1,225 @@
+"""
+Metrics
+
+Compteurs, jauges et histogrammes en mémoire, exposés au format texte
+Prometheus (GET /metrics dans main.py).
+
+Pourquoi pas prometheus_client:
+Le besoin se limite à quelques métriques du chemin des tuiles et du scan;
+ce module n'ajoute aucune dépendance et garde l'enregistrement minimal
+(un verrou + quelques additions par observation).
+
+Usage:
+    from utils.metrics import Counter, Histogram
+
+    TILE_BYTES = Counter("varuna_tile_bytes_served_total", "Octets de tuiles servis", ("format",))
+    TILE_BYTES.inc(len(data), ("mirax",))
+
+    STAGE = Histogram("varuna_tile_stage_seconds", "Durée par étape", ("stage",))
+    STAGE.observe(0.004, ("encode",))
+
+Technical Notes:
+    - Labels passés en tuple de valeurs (ordre de `labels`), pas de dict:
+      aucune allocation d'objet enfant par observation
+    - Jauges calculées à la lecture (callback): rien à maintenir sur le
+      chemin critique
+    - Métriques enregistrées à la création dans REGISTRY (ordre d'exposition)
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bornes par défaut des histogrammes de latence (secondes): 100 µs → 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Bornes des durées de scan / rescan (secondes): 1 ms → 30 min
+SCAN_BUCKETS = (
+    0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0,
+)
+
+REGISTRY: List["_Metric"] = []
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """Base: nom, aide, noms de labels, enregistrement global."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def _label_text(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    """Compteur monotone (par combinaison de labels)."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def total(self) -> float:
+        """Somme sur tous les labels (ratios calculés côté serveur)."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(labels)} {_number(value)}" for labels, value in items]
+
+
+class Gauge(_Metric):
+    """
+    Jauge: valeur posée (set) ou calculée à la lecture (callback).
+
+    Le callback retourne une valeur, ou un dict {tuple de labels: valeur}.
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], object]] = None
+    ):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: LabelValues = ()):
+        self.inc(-amount, labels)
+
+    def value(self, labels: LabelValues = ()) -> float:
+        if self._callback is not None:
+            value = self._callback()
+            return value.get(labels, 0) if isinstance(value, dict) else value
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> List[str]:
+        if self._callback is not None:
+            value = self._callback()
+            items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(labels)} {_number(value)}" for labels, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Histogramme à bornes fixes (cumulées à l'exposition seulement).
+
+    Technical Notes:
+        - observe(): une recherche dichotomique + 3 additions sous verrou
+        - Bornes "le" cumulées au rendu, pas à chaque observation
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [compte par borne..., compte +Inf, somme]}
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[int, float]]:
+        """{labels: (nombre d'observations, somme)}."""
+        with self._lock:
+            return {labels: (sum(series[:-1]), series[-1]) for labels, series in self._values.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = self._label_text(labels, 'le="%s"' % _number(bound))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            bucket_labels = self._label_text(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Toutes les métriques enregistrées, format texte Prometheus 0.0.4."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
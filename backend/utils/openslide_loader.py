@@ -0,0 +1,61 @@
+"""
+OpenSlide Loader
+
+Import différé d'OpenSlide (et configuration des DLLs Windows) au premier usage.
+
+Pourquoi:
+`import openslide` charge la bibliothèque C (libopenslide + dépendances:
+libtiff, libjpeg, glib, ...) et Pillow. Fait au chargement des modules, ce
+coût est payé par chaque démarrage de worker, même si aucune lame n'est
+ouverte (health checks, listing servi depuis le catalogue). Ici il n'est payé
+qu'à la première détection / ouverture de lame.
+
+Usage:
+    from utils.openslide_loader import get_openslide
+
+    openslide = get_openslide()
+    slide = openslide.OpenSlide(path)
+"""
+
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_openslide = None
+_lock = threading.Lock()
+
+# Durée du premier import (rapport de démarrage, voir utils/startup_report.py)
+load_seconds = None
+
+
+def get_openslide():
+    """
+    Retourne le module openslide (importé une seule fois, thread-safe).
+
+    Technical Notes:
+        - config_openslide (os.add_dll_directory sur Windows) exécuté juste
+          avant le premier import, comme l'exigeait l'import en tête de main.py
+        - Appels suivants: simple lecture d'une variable globale
+    """
+    global _openslide, load_seconds
+    if _openslide is not None:
+        return _openslide
+
+    with _lock:
+        if _openslide is None:
+            start = time.perf_counter()
+            config_openslide = importlib.import_module("config_openslide")
+            config_openslide.configure_openslide_path()
+            module = importlib.import_module("openslide")
+            load_seconds = time.perf_counter() - start
+            logger.info(f"OpenSlide loaded in {load_seconds * 1000:.0f} ms")
+            _openslide = module
+    return _openslide
+
+
+def is_loaded() -> bool:
+    """True si OpenSlide a déjà été importé."""
+    return _openslide is not None
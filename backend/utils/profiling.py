@@ -0,0 +1,455 @@
+"""
+Profiling
+
+Profilage à la demande d'un worker en production (routes /api/admin/profile):
+échantillonnage ou cProfile pendant N secondes ou N requêtes sur des chemins
+ciblés, et instantanés tracemalloc attribués par composant.
+
+Pourquoi:
+Un worker chaud ne peut pas être relancé sous py-spy ou cProfile. Les
+sessions s'activent par API, sur le process qui pose problème, et ne
+coûtent rien tant qu'elles ne tournent pas.
+
+Modes:
+- sampling: un thread relève la pile des threads en cours dans une cible
+  toutes les `interval` secondes → piles repliées (collapsed stacks,
+  format de flamegraph.pl / speedscope / inferno)
+- deterministic: cProfile dans chaque thread qui entre dans une cible →
+  fichier pstats (snakeviz, flameprof, gprof2dot) + résumé texte
+
+Cibles: méthodes remplacées par un wrapper le temps de la session, puis
+restaurées (aucun wrapper, aucun thread quand rien ne tourne).
+
+Usage:
+    profiler.start("sampling", {"tile": [(TileServer, "get_tile")]}, seconds=30)
+    ...
+    profiler.result("collapsed")
+
+    memory.start(frames=16)
+    memory.report({"tile_cache": [TileServer._store_tile]}, top=20)
+"""
+
+import cProfile
+import functools
+import inspect
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter as CallCounter
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+MODES = ("sampling", "deterministic")
+
+# Intervalle d'échantillonnage par défaut (secondes)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Durée max d'une session (le profilage ne doit pas rester actif par oubli)
+MAX_SESSION_SECONDS = 600
+
+# Attente max des appels profilés encore en cours à l'arrêt (secondes)
+STOP_GRACE_SECONDS = 5.0
+
+# Cible: (classe ou module, nom de l'attribut); la première de chaque groupe compte les requêtes
+Target = Tuple[object, str]
+
+
+class ProfilerBusy(RuntimeError):
+    """Une session de profilage est déjà en cours."""
+
+
+class Profiler:
+    """
+    Session de profilage unique du process (thread-safe).
+
+    Technical Notes:
+        - Wrapper: appels imbriqués dans le même thread non re-comptés
+          (detect_format appelé par refresh, get_tile par get_tile_async)
+        - N requêtes: appels terminés de la première cible de chaque groupe
+        - Fin de session: durée, nombre de requêtes, ou stop()
+        - cProfile par thread (enable() ne couvre que le thread appelant),
+          profils fusionnés à la fin
+        - Résultat gardé jusqu'à la session suivante
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._session = 0
+        self._state = "idle"
+        self._config: Dict = {}
+        self._patched: List[Tuple[object, str, object]] = []
+        self._active_threads: Dict[int, str] = {}   # sampling: {thread id: groupe}
+        self._wrapper_codes = set()
+        self._profiles: List[cProfile.Profile] = []
+        self._stacks: CallCounter = CallCounter()
+        self._samples = 0
+        self._requests = 0
+        self._inflight = 0
+        self._started = 0.0
+        self._stopped = 0.0
+        self._sampler: Optional[threading.Thread] = None
+        self._timer: Optional[threading.Timer] = None
+        self._stats: Optional[pstats.Stats] = None
+
+    @property
+    def running(self) -> bool:
+        return self._state == "running"
+
+    def start(
+        self,
+        mode: str,
+        targets: Dict[str, Sequence[Target]],
+        seconds: Optional[float] = None,
+        requests: Optional[int] = None,
+        interval: float = DEFAULT_SAMPLE_INTERVAL
+    ) -> Dict:
+        """
+        Démarre une session.
+
+        Args:
+            mode: "sampling" ou "deterministic"
+            targets: {groupe: [(classe ou module, attribut), ...]}
+            seconds: Durée max (défaut et plafond: MAX_SESSION_SECONDS)
+            requests: Arrêt après N requêtes (première cible de chaque groupe)
+            interval: Période d'échantillonnage (mode sampling)
+
+        Raises:
+            ProfilerBusy: Session déjà en cours
+            ValueError: Mode inconnu
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r} (expected one of {MODES})")
+        seconds = min(seconds or MAX_SESSION_SECONDS, MAX_SESSION_SECONDS)
+
+        with self._lock:
+            if self._state in ("running", "stopping"):
+                raise ProfilerBusy("A profiling session is already running")
+            self._session += 1
+            self._state = "running"
+            self._config = {
+                "mode": mode, "targets": sorted(targets), "seconds": seconds,
+                "requests": requests, "interval": interval,
+            }
+            self._profiles = []
+            self._stacks = CallCounter()
+            self._samples = 0
+            self._requests = 0
+            self._stats = None
+            self._active_threads.clear()
+            self._started = time.time()
+            self._stopped = 0.0
+            for group, group_targets in targets.items():
+                for index, (owner, attr) in enumerate(group_targets):
+                    original = owner.__dict__[attr]
+                    wrapper = self._wrap(group, original, counts=index == 0)
+                    self._wrapper_codes.add(wrapper.__code__)
+                    self._patched.append((owner, attr, original))
+                    setattr(owner, attr, wrapper)
+
+            if mode == "sampling":
+                self._sampler = threading.Thread(
+                    target=self._sample_loop, args=(self._session, interval), name="profiler-sampler", daemon=True
+                )
+                self._sampler.start()
+            self._timer = threading.Timer(seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        return self.status()
+
+    def stop(self) -> Dict:
+        """Termine la session en cours (sans effet sinon) et prépare le résultat."""
+        with self._lock:
+            if self._state != "running":
+                return self.status()
+            for owner, attr, original in reversed(self._patched):
+                setattr(owner, attr, original)
+            self._patched.clear()
+            self._state = "stopping"
+            self._stopped = time.time()
+            timer, self._timer = self._timer, None
+            sampler, self._sampler = self._sampler, None
+
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        if sampler is not None:
+            sampler.join()
+        # Appels en cours: leur profil doit être désactivé par leur propre thread
+        deadline = time.monotonic() + STOP_GRACE_SECONDS
+        while self._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self._config["mode"] == "deterministic":
+            self._stats = self._merge_profiles()
+        self._state = "done"
+        return self.status()
+
+    def status(self) -> Dict:
+        end = self._stopped or time.time()
+        return {
+            "state": self._state,
+            **self._config,
+            "started_at": self._started or None,
+            "elapsed_s": round(end - self._started, 3) if self._started else None,
+            "requests_seen": self._requests,
+            "samples": self._samples,
+        }
+
+    def result(self, output: str) -> Union[str, bytes]:
+        """
+        Résultat de la dernière session terminée.
+
+        Args:
+            output: "collapsed" (sampling), "pstats" ou "text" (deterministic)
+
+        Raises:
+            LookupError: Pas de résultat dans ce format (aucune session, session en cours, autre mode)
+        """
+        if self._state != "done":
+            raise LookupError("No finished profiling session")
+        mode = self._config["mode"]
+        if output == "collapsed" and mode == "sampling":
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+        if output in ("pstats", "text") and mode == "deterministic" and self._stats is not None:
+            if output == "pstats":
+                # Format de pstats.Stats.dump_stats (relu par pstats.Stats(fichier))
+                return marshal.dumps(self._stats.stats)
+            buffer = io.StringIO()
+            self._stats.stream = buffer
+            self._stats.sort_stats("cumulative").print_stats(60)
+            return buffer.getvalue()
+        raise LookupError(f"No {output!r} result for a {mode} session")
+
+    def _wrap(self, group: str, func: Callable, counts: bool) -> Callable:
+        profiler = self
+        local = self._local
+        session = self._session
+        deterministic = self._config["mode"] == "deterministic"
+
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            if getattr(local, "depth", 0) or profiler._session != session:
+                return func(*args, **kwargs)
+            local.depth = 1
+            with profiler._lock:
+                profiler._inflight += 1
+            profile = profiler._thread_profile(session) if deterministic else None
+            thread_id = threading.get_ident()
+            if profile is not None:
+                profile.enable()
+            else:
+                profiler._active_threads[thread_id] = group
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                else:
+                    profiler._active_threads.pop(thread_id, None)
+                local.depth = 0
+                with profiler._lock:
+                    profiler._inflight -= 1
+                if counts:
+                    profiler._count_request(session)
+
+        return profiled
+
+    def _thread_profile(self, session: int) -> Optional[cProfile.Profile]:
+        """cProfile du thread courant pour cette session (créé au premier appel)."""
+        profile = getattr(self._local, "profile", None)
+        if profile is None or self._local.profile_session != session:
+            profile = cProfile.Profile()
+            self._local.profile = profile
+            self._local.profile_session = session
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def _count_request(self, session: int):
+        with self._lock:
+            if self._session != session or self._state != "running":
+                return
+            self._requests += 1
+            limit = self._config["requests"]
+            if limit is None or self._requests < limit:
+                return
+        # Hors du thread de la requête: stop() attend le sampler
+        threading.Thread(target=self.stop, name="profiler-stop", daemon=True).start()
+
+    def _sample_loop(self, session: int, interval: float):
+        own_thread = threading.get_ident()
+        while self._session == session and self._state == "running":
+            frames = sys._current_frames()
+            for thread_id, group in list(self._active_threads.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None and frame.f_code not in self._wrapper_codes:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(group)
+                self._stacks[";".join(reversed(stack))] += 1
+                self._samples += 1
+            del frames
+            time.sleep(interval)
+
+    def _merge_profiles(self) -> Optional[pstats.Stats]:
+        stats = None
+        for profile in self._profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        self._profiles = []
+        return stats
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+# =============================================================================
+# MÉMOIRE (TRACEMALLOC)
+# =============================================================================
+
+# Composant: fonctions (lignes de leur code) ou modules (fichier, ou dossier d'un package)
+Component = Sequence[Union[Callable, ModuleType]]
+
+
+class MemoryProfiler:
+    """
+    Instantanés tracemalloc attribués par composant (tile cache, handles, catalogue...).
+
+    Technical Notes:
+        - Seules les allocations faites APRÈS start() sont tracées: démarrer
+          puis laisser le cache se remplir (ou l'invalider) avant l'instantané
+        - Attribution: premier cadre de la pile d'allocation (du plus interne
+          au plus externe) qui tombe dans un composant
+        - Mémoire native (OpenSlide, libjpeg) invisible pour tracemalloc: seuls
+          les objets Python sont attribués
+        - Surcoût (x1.5 à x3 sur les allocations) uniquement entre start() et stop()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 16) -> Dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> Dict:
+        with self._lock:
+            tracemalloc.stop()
+        return self.status()
+
+    def status(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        }
+
+    def report(self, components: Dict[str, Component], top: int = 20) -> Dict:
+        """
+        Instantané des allocations vivantes, par composant.
+
+        Returns:
+            {
+                "tracing", "traced_bytes", "peak_bytes", ...,
+                "components": {nom: {"bytes": int, "blocks": int}},   # + "other"
+                "top": [{"location": "fichier:ligne", "component", "bytes", "blocks"}]
+            }
+
+        Raises:
+            LookupError: tracemalloc non démarré
+        """
+        if not tracemalloc.is_tracing():
+            raise LookupError("tracemalloc is not running")
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        matchers = _component_matchers(components)
+
+        totals = {name: {"bytes": 0, "blocks": 0} for name in list(components) + ["other"]}
+        by_location: Dict[Tuple[str, str], List[int]] = {}
+        for statistic in snapshot.statistics("traceback"):
+            component = _classify(statistic.traceback, matchers)
+            totals[component]["bytes"] += statistic.size
+            totals[component]["blocks"] += statistic.count
+            frame = statistic.traceback[-1]  # Cadres du plus ancien au plus récent
+            location = (f"{_short_path(frame.filename)}:{frame.lineno}", component)
+            entry = by_location.setdefault(location, [0, 0])
+            entry[0] += statistic.size
+            entry[1] += statistic.count
+
+        largest = sorted(by_location.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        return {
+            **self.status(),
+            "components": totals,
+            "top": [
+                {"location": location, "component": component, "bytes": size, "blocks": blocks}
+                for (location, component), (size, blocks) in largest
+            ],
+        }
+
+
+def _component_matchers(components: Dict[str, Component]) -> List[Tuple[str, str, Optional[frozenset], bool]]:
+    """[(composant, fichier ou dossier, lignes ou None, préfixe?)]"""
+    matchers = []
+    for name, members in components.items():
+        for member in members:
+            if isinstance(member, ModuleType):
+                filename = getattr(member, "__file__", None)
+                if not filename:
+                    continue
+                if Path(filename).name == "__init__.py":
+                    matchers.append((name, os.path.dirname(filename) + os.sep, None, True))
+                else:
+                    matchers.append((name, filename, None, False))
+            else:
+                code = inspect.unwrap(member).__code__
+                lines = frozenset(line for _, _, line in code.co_lines() if line is not None)
+                matchers.append((name, code.co_filename, lines, False))
+    return matchers
+
+
+def _classify(traceback: tracemalloc.Traceback, matchers) -> str:
+    for frame in reversed(traceback):
+        for name, filename, lines, prefix in matchers:
+            if prefix:
+                if frame.filename.startswith(filename):
+                    return name
+            elif frame.filename == filename and (lines is None or frame.lineno in lines):
+                return name
+    return "other"
+
+
+def _short_path(filename: str) -> str:
+    parts = Path(filename).parts
+    return "/".join(parts[-2:]) if len(parts) > 1 else filename
+
+
+# Instances globales (routes admin)
+profiler = Profiler()
+memory = MemoryProfiler()
@@ -0,0 +1,160 @@
+"""
+Request Timing
+
+Décomposition par étape des requêtes du viewer: en-tête `Server-Timing`
+(visible dans l'onglet Réseau du navigateur) + échantillonnage des requêtes
+lentes dans un buffer circulaire (GET /api/admin/slow-requests).
+
+Pourquoi:
+"Le viewer est lent sur la lame X" peut venir du disque, d'OpenSlide, de
+l'encodage JPEG ou du réseau. Server-Timing donne la part serveur de chaque
+requête côté navigateur; le buffer garde le détail des requêtes lentes
+(lame, niveau, coordonnées) pour analyse après coup.
+
+Usage:
+    timing = RequestTiming("tile", slide_id=slide_id, level=level)
+    ...
+    timing.lap("lookup")
+    timing.add(tile_timings)          # étapes mesurées par le service
+    timing.cache = "miss"
+    return timing.finish(Response(...))
+
+Configuration (variables d'environnement):
+- VARUNA_SLOW_REQUEST_MS: seuil d'enregistrement (défaut: 500 ms, 0 = tout)
+- VARUNA_SLOW_REQUEST_BUFFER: requêtes lentes gardées (défaut: 200)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+SLOW_REQUEST_MS = float(os.environ.get("VARUNA_SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_BUFFER = int(os.environ.get("VARUNA_SLOW_REQUEST_BUFFER", "200"))
+
+
+class RequestTiming:
+    """
+    Étapes d'une requête (secondes) + état du cache + contexte (lame, tuile).
+
+    Technical Notes:
+        - lap(): durée depuis l'étape précédente (un perf_counter par étape)
+        - add(): étapes mesurées ailleurs (ex: tile_server), ajoutées telles quelles
+        - Étapes mesurées dans un autre thread: la somme peut différer du total
+    """
+
+    __slots__ = ("route", "context", "stages", "cache", "_start", "_last")
+
+    def __init__(self, route: str, **context):
+        self.route = route
+        self.context = context
+        self.stages: Dict[str, float] = {}
+        self.cache: Optional[str] = None
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def add(self, stages: Dict[str, float]):
+        for stage, seconds in stages.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self._last = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._start
+
+    def server_timing(self, total: float) -> str:
+        """
+        Valeur de l'en-tête Server-Timing (durées en ms).
+
+        L'état du cache est ajouté à l'étape "cache" si elle existe
+        (cache;dur=0.01;desc="hit"), sinon en entrée séparée.
+        """
+        parts = []
+        for stage, seconds in self.stages.items():
+            part = f"{stage};dur={seconds * 1000:.2f}"
+            if stage == "cache" and self.cache is not None:
+                part += f';desc="{self.cache}"'
+            parts.append(part)
+        if self.cache is not None and "cache" not in self.stages:
+            parts.append(f'cache;desc="{self.cache}"')
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+    def finish(self, response):
+        """
+        Pose l'en-tête Server-Timing et enregistre la requête si elle est lente.
+
+        Returns:
+            La réponse (chaînable: `return timing.finish(Response(...))`)
+        """
+        response.headers.update(self.close(response.status_code))
+        return response
+
+    def close(self, status_code: int = 200) -> Dict[str, str]:
+        """
+        Termine la mesure (enregistrement si lente) et retourne les en-têtes.
+
+        Usage (erreurs): raise HTTPException(404, ..., headers=timing.close(404))
+        """
+        total = self.total
+        slow_requests.record(self, total, status_code)
+        return {"Server-Timing": self.server_timing(total)}
+
+
+class SlowRequestLog:
+    """
+    Buffer circulaire borné des requêtes au-dessus du seuil.
+
+    Technical Notes:
+        - deque(maxlen): les plus anciennes sont écrasées, mémoire constante
+        - Sous le seuil: une comparaison, rien n'est alloué
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_MS, capacity: int = SLOW_REQUEST_BUFFER):
+        self.threshold_ms = threshold_ms
+        self._entries: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._entries.maxlen
+
+    def record(self, timing: RequestTiming, total: float, status_code: int):
+        total_ms = total * 1000
+        if total_ms < self.threshold_ms:
+            return
+        entry = {
+            "at": time.time(),
+            "route": timing.route,
+            "status": status_code,
+            "total_ms": round(total_ms, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in timing.stages.items()},
+            "cache": timing.cache,
+            **timing.context,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    def entries(self, limit: Optional[int] = None, route: Optional[str] = None) -> List[Dict]:
+        """Requêtes lentes, plus récentes d'abord."""
+        with self._lock:
+            items = list(self._entries)
+        items.reverse()
+        if route:
+            items = [e for e in items if e["route"] == route]
+        return items[:limit] if limit else items
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Instance globale (singleton)
+slow_requests = SlowRequestLog()
@@ -0,0 +1,183 @@
+"""
+Slide Affinity
+
+Hachage cohérent des IDs de lame vers des backends (workers ou nœuds), avec
+débordement à charge bornée pour les lames très demandées. Utilisé par le
+routeur frontal affinity_router.py.
+
+Pourquoi:
+Un load balancer aléatoire répartit les tuiles d'une lame sur tous les
+workers: chacun ouvre ses handles et chauffe ses caches pour la même lame.
+En envoyant toutes les requêtes d'une lame au même backend, une lame n'est
+ouverte et mise en cache qu'une fois.
+
+Algorithme ("consistent hashing with bounded loads", Mirrokni et al. 2018):
+- Anneau: chaque backend placé REPLICAS fois (BLAKE2 de "backend#i")
+- Lame → premier backend de l'anneau après BLAKE2(ID de lame)
+- Capacité d'un backend = ceil(load_factor x (requêtes en cours + 1) / backends)
+  Backend plein → suivant sur l'anneau (ordre stable par lame: la lame chaude
+  déborde toujours vers les mêmes backends)
+- Ajout/retrait d'un backend: seules ~1/N des lames changent de backend
+
+Usage:
+    balancer = AffinityBalancer(["http://127.0.0.1:8001", "http://127.0.0.1:8002"])
+    backend, spilled = balancer.acquire("a1b2c3d4e5f6")
+    try: ...
+    finally: balancer.release(backend)
+"""
+
+import math
+import re
+import threading
+import time
+from bisect import bisect_right
+from hashlib import blake2b
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Points par backend sur l'anneau (écart de répartition ~ 1/sqrt(REPLICAS))
+REPLICAS = 160
+
+# Requêtes rattachées à une lame: /api/slides/{slide_id}/... (segment suivant
+# obligatoire: /api/slides/search, /stream, /browse, /stats, /enrichment n'en ont pas)
+SLIDE_PATH = re.compile(r"^/api/slides/([^/]+)/")
+
+
+def slide_id_from_path(path: str) -> Optional[str]:
+    """ID de lame d'une URL de l'API, None pour les routes sans lame (liste, scan, admin)."""
+    match = SLIDE_PATH.match(path)
+    return match.group(1) if match else None
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Anneau de hachage cohérent (immutable)."""
+
+    def __init__(self, nodes: Sequence[str], replicas: int = REPLICAS):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = list(dict.fromkeys(nodes))
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def walk(self, key: str) -> List[str]:
+        """Backends distincts dans l'ordre de l'anneau à partir de la clé (préférence de la clé)."""
+        start = bisect_right(self._points, _hash(key))
+        order: List[str] = []
+        seen = set()
+        count = len(self._owners)
+        for index in range(count):
+            node = self._owners[(start + index) % count]
+            if node not in seen:
+                seen.add(node)
+                order.append(node)
+                if len(order) == len(self.nodes):
+                    break
+        return order
+
+
+class AffinityBalancer:
+    """
+    Choix du backend d'une requête (thread-safe).
+
+    Technical Notes:
+        - Compteurs de requêtes en cours locaux au routeur: un seul processus
+          routeur (pas de --workers), sinon chaque processus a sa vue partielle
+        - Backend en erreur de connexion écarté DOWN_SECONDS puis réessayé
+        - Requêtes sans lame: backend le moins chargé (pas d'affinité à préserver)
+    """
+
+    DOWN_SECONDS = 5.0
+
+    def __init__(self, nodes: Sequence[str], load_factor: float = 1.25, replicas: int = REPLICAS):
+        if load_factor < 1.0:
+            raise ValueError("load_factor must be >= 1.0")
+        self.ring = HashRing(nodes, replicas)
+        self.load_factor = load_factor
+        self._in_flight: Dict[str, int] = {node: 0 for node in self.ring.nodes}
+        self._down_until: Dict[str, float] = {}
+        self._routed: Dict[str, int] = {node: 0 for node in self.ring.nodes}
+        self._spilled = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, slide_id: Optional[str], exclude: Sequence[str] = ()) -> Tuple[str, bool]:
+        """
+        Réserve un backend pour une requête (à rendre par release()).
+
+        Args:
+            slide_id: ID de lame (None = pas d'affinité)
+            exclude: Backends déjà essayés pour cette requête
+
+        Returns:
+            (backend, débordement): débordement = True si le backend préféré
+            de la lame était plein ou indisponible
+
+        Raises:
+            LookupError: Aucun backend disponible
+        """
+        with self._lock:
+            now = time.monotonic()
+            up = [
+                node for node in self.ring.nodes
+                if node not in exclude and self._down_until.get(node, 0.0) <= now
+            ]
+            if not up:
+                # Tous écartés: on retente quand même ceux qui ne sont pas exclus
+                up = [node for node in self.ring.nodes if node not in exclude]
+            if not up:
+                raise LookupError("No backend available")
+
+            if slide_id is None:
+                node = min(up, key=lambda candidate: self._in_flight[candidate])
+                spilled = False
+            else:
+                total = sum(self._in_flight[candidate] for candidate in up)
+                capacity = math.ceil(self.load_factor * (total + 1) / len(up))
+                preference = self.ring.walk(slide_id)
+                candidates = [candidate for candidate in preference if candidate in up]
+                node = next(
+                    (candidate for candidate in candidates if self._in_flight[candidate] < capacity),
+                    candidates[0]
+                )
+                spilled = node != preference[0]
+                self._spilled += spilled
+            self._in_flight[node] += 1
+            self._routed[node] += 1
+            return node, spilled
+
+    def release(self, node: str):
+        with self._lock:
+            self._in_flight[node] -= 1
+
+    def mark_down(self, node: str):
+        """Backend injoignable: écarté DOWN_SECONDS."""
+        with self._lock:
+            self._down_until[node] = time.monotonic() + self.DOWN_SECONDS
+
+    def mark_up(self, node: str):
+        with self._lock:
+            self._down_until.pop(node, None)
+
+    def status(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "load_factor": self.load_factor,
+                "spilled": self._spilled,
+                "backends": [
+                    {
+                        "url": node,
+                        "in_flight": self._in_flight[node],
+                        "routed": self._routed[node],
+                        "down": self._down_until.get(node, 0.0) > now,
+                    }
+                    for node in self.ring.nodes
+                ],
+            }
@@ -0,0 +1,131 @@
+"""
+Startup Report
+
+Mesure du démarrage à froid d'un worker API.
+
+Mesures:
+- Temps d'import de main.py (toujours)
+- Temps d'import par module (si VARUNA_STARTUP_PROFILE=1): hook d'import
+  équivalent à `python -X importtime`, sans relancer le process
+- Démarrage du lifespan et première requête servie (middleware de main.py)
+- Chargement différé d'OpenSlide (utils/openslide_loader.py)
+
+Le rapport est loggé à la première requête et exposé par GET /api/startup.
+Le budget de démarrage est vérifié par benchmarks/cold_start.py.
+"""
+
+import importlib.abc
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE = os.environ.get("VARUNA_STARTUP_PROFILE", "0") == "1"
+
+# Nombre de modules les plus lents dans le rapport
+REPORT_TOP_MODULES = 15
+
+# Référence: chargement de ce module (premier import de main.py)
+_t0 = time.perf_counter()
+_marks: Dict[str, float] = {}
+_module_times: Dict[str, float] = {}  # {module: temps propre en secondes}
+_first_request_logged = False
+_lock = threading.Lock()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Enveloppe un loader pour chronométrer exec_module (temps propre)."""
+
+    _stack: List[float] = []  # temps des sous-imports, par niveau d'imbrication
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        _TimedLoader._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = _TimedLoader._stack.pop()
+            _module_times[module.__name__] = elapsed - children
+            if _TimedLoader._stack:
+                _TimedLoader._stack[-1] += elapsed
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Finder placé en tête de sys.meta_path: délègue puis enveloppe le loader."""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def install_import_timer():
+    """Active le chronométrage par module (VARUNA_STARTUP_PROFILE=1)."""
+    if STARTUP_PROFILE and not any(isinstance(f, _TimingFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _TimingFinder())
+
+
+def mark(event: str):
+    """Enregistre un jalon (secondes depuis le début du démarrage), une seule fois."""
+    with _lock:
+        _marks.setdefault(event, time.perf_counter() - _t0)
+
+
+def first_request_done():
+    """Jalon + log du rapport, à la fin de la première requête (AdmissionMiddleware)."""
+    global _first_request_logged
+    if _first_request_logged:
+        return
+    mark("first_request")
+    _first_request_logged = True
+    logger.info(format_report())
+
+
+def report() -> Dict:
+    """Rapport de démarrage (JSON)."""
+    from utils import openslide_loader
+
+    slowest = sorted(_module_times.items(), key=lambda item: -item[1])[:REPORT_TOP_MODULES]
+    return {
+        "milestones_ms": {event: round(seconds * 1000, 1) for event, seconds in _marks.items()},
+        "openslide_loaded": openslide_loader.is_loaded(),
+        "openslide_load_ms": (
+            round(openslide_loader.load_seconds * 1000, 1)
+            if openslide_loader.load_seconds is not None else None
+        ),
+        "import_profile": STARTUP_PROFILE,
+        "slowest_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in slowest},
+    }
+
+
+def format_report() -> str:
+    """Rapport lisible (une ligne par jalon / module)."""
+    data = report()
+    lines = ["Startup report:"]
+    for event, ms in data["milestones_ms"].items():
+        lines.append(f"  {event:<24} {ms:>8.1f} ms")
+    lines.append(f"  openslide loaded: {data['openslide_loaded']}")
+    for name, ms in data["slowest_imports_ms"].items():
+        lines.append(f"  import {name:<40} {ms:>8.1f} ms")
+    return "\n".join(lines)
+
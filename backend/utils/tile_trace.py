@@ -0,0 +1,275 @@
+"""
+Tile Trace
+
+Enregistrement optionnel des requêtes de tuiles du viewer dans un journal
+binaire compact en ajout seul, relu hors ligne par benchmarks/trace_replay.py
+pour dimensionner le cache de tuiles et évaluer le préchargement.
+
+Pourquoi:
+Les parcours synthétiques (pan, zoom, random) ne disent pas comment les
+pathologistes naviguent vraiment. Une trace réelle (lame, niveau, tuile,
+instant, client) rejouée contre différents budgets et politiques de cache
+donne des ratios de hit sans avoir besoin des utilisateurs.
+
+Format (little endian):
+    En-tête:  b"VTRACE1\\n" + f64 instant de début (Unix)
+    Lame:     b"S" + u32 index + u16 longueur + ID (UTF-8)
+    Client:   b"C" + u32 index + u16 longueur + client (UTF-8)
+    Tuile:    b"T" + u32 ms depuis le début + u32 lame + u8 niveau + u32 col
+              + u32 ligne + u16 taille tuile + u32 client + u32 octets + u8 flags
+    Les IDs de lame et de client sont écrits une fois par fichier (table
+    d'index), chaque tuile coûte 29 octets.
+
+Configuration (variables d'environnement):
+- VARUNA_TILE_TRACE: fichier de trace (vide = enregistrement désactivé); chaque
+  processus écrit son propre fichier, PID inséré avant l'extension
+  (tiles.trace → tiles.<pid>.trace): les workers uvicorn ne se renomment pas
+  leurs fichiers les uns les autres
+- VARUNA_TILE_TRACE_MAX_MB: taille avant rotation (fichier.1, une génération)
+
+Usage:
+    tile_trace.record(slide_id, level, col, row, 256, client, size, hit=True)
+    for record in read_trace([Path("tiles.4242.trace.1"), Path("tiles.4242.trace")]): ...
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TILE_TRACE_PATH = os.environ.get("VARUNA_TILE_TRACE", "")
+TILE_TRACE_MAX_BYTES = int(float(os.environ.get("VARUNA_TILE_TRACE_MAX_MB", "256")) * 1024 * 1024)
+
+# Données bufferisées au plus une seconde avant écriture
+FLUSH_INTERVAL = 1.0
+
+MAGIC = b"VTRACE1\n"
+_HEADER = struct.Struct("<d")
+_NAME = struct.Struct("<IH")
+_TILE = struct.Struct("<IIBIIHIIB")
+
+FLAG_HIT = 1           # Servie depuis le cache de tuiles
+FLAG_OUT_OF_BOUNDS = 2  # 404 hors limites (aucun rendu)
+
+
+@dataclass(frozen=True)
+class TraceRecord:
+    """Une requête de tuile relue depuis une trace."""
+    timestamp: float
+    slide_id: str
+    level: int
+    col: int
+    row: int
+    tile_size: int
+    client: str
+    size: int
+    hit: bool
+    out_of_bounds: bool
+
+
+class TileTraceRecorder:
+    """
+    Journal des requêtes de tuiles (un fichier ouvert en ajout, thread-safe).
+
+    Technical Notes:
+        - record() n'écrit que dans un buffer mémoire (64 Ko): coût d'un
+          struct.pack sur le chemin de la requête, écriture disque groupée
+        - Buffer vidé au plus tard FLUSH_INTERVAL après une écriture (thread
+          de vidage, démarré avec le fichier) et à close(); un arrêt brutal
+          perd au plus ce délai (le lecteur ignore l'enregistrement tronqué
+          en fin de fichier)
+        - Un fichier par processus (file_path): un worker qui démarre ne
+          fait tourner que sa propre trace
+        - Rotation à TILE_TRACE_MAX_BYTES: fichier renommé en .1 (écrase
+          l'ancien .1), nouveau fichier avec ses propres tables d'index
+        - Clients pseudonymisés (empreinte BLAKE2 de l'adresse): sessions
+          distinguables, adresses non conservées
+    """
+
+    def __init__(self, path: str = TILE_TRACE_PATH, max_bytes: int = TILE_TRACE_MAX_BYTES):
+        self.path = Path(path) if path else None
+        self.file_path: Optional[Path] = None  # Fichier de ce processus (premier record())
+        self.max_bytes = max_bytes
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._slides: Dict[str, int] = {}
+        self._clients: Dict[str, int] = {}
+        self._started = 0.0
+        self._written = 0
+        self._dirty = False
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(
+        self,
+        slide_id: str,
+        level: int,
+        col: int,
+        row: int,
+        tile_size: int,
+        client: Optional[str],
+        size: int,
+        hit: bool = False,
+        out_of_bounds: bool = False
+    ):
+        """Ajoute une requête de tuile à la trace (sans effet si désactivé)."""
+        if self.path is None:
+            return
+        if not (0 <= level <= 0xFF and 0 <= col <= 0xFFFFFFFF and 0 <= row <= 0xFFFFFFFF and 0 < tile_size <= 0xFFFF):
+            return  # Coordonnées invalides (404 de la route), hors format
+        flags = (FLAG_HIT if hit else 0) | (FLAG_OUT_OF_BOUNDS if out_of_bounds else 0)
+        now = time.time()
+        try:
+            with self._lock:
+                if self._file is None or self._written >= self.max_bytes:
+                    self._open(now)
+                data = bytearray()
+                slide_index = self._index(self._slides, b"S", slide_id, data)
+                client_index = self._index(self._clients, b"C", _pseudonym(client), data)
+                data += b"T" + _TILE.pack(
+                    min(int((now - self._started) * 1000), 0xFFFFFFFF), slide_index, level, col, row,
+                    tile_size, client_index, min(size, 0xFFFFFFFF), flags
+                )
+                self._file.write(data)
+                self._written += len(data)
+                self._dirty = True
+                self.recorded += 1
+        except (OSError, struct.error) as e:
+            logger.warning(f"Tile trace disabled: {e}")
+            self.close()
+            self.path = None
+
+    def close(self):
+        """Vide le buffer et ferme le fichier (arrêt du serveur)."""
+        self._closed.set()
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                self._file = None
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.file_path or self.path) if self.path else None,
+            "recorded": self.recorded,
+            "bytes": self._written,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _open(self, now: float):
+        """Ouvre le fichier courant (rotation si plein ou format inconnu)."""
+        if self.file_path is None:
+            # PID lu ici, pas à l'import: process maître préchargé puis forké
+            self.file_path = self.path.with_name(f"{self.path.stem}.{os.getpid()}{self.path.suffix}")
+        rotated = self.file_path.with_name(self.file_path.name + ".1")
+        if self._file is not None:
+            self._file.close()
+            os.replace(self.file_path, rotated)
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Un fichier existant ne peut pas être prolongé: ses tables d'index sont perdues
+        if self.file_path.exists() and self.file_path.stat().st_size:
+            os.replace(self.file_path, rotated)
+        self._file = open(self.file_path, "ab", buffering=64 * 1024)
+        self._slides.clear()
+        self._clients.clear()
+        self._started = now
+        header = MAGIC + _HEADER.pack(now)
+        self._file.write(header)
+        self._written = len(header)
+        self._dirty = True
+        if self._flusher is None or not self._flusher.is_alive():
+            self._closed.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="tile-trace-flush", daemon=True)
+            self._flusher.start()
+        logger.info(f"Recording tile trace to {self.file_path}")
+
+    def _flush_loop(self):
+        """Vide le buffer toutes les FLUSH_INTERVAL secondes s'il a reçu des données."""
+        while not self._closed.wait(FLUSH_INTERVAL):
+            with self._lock:
+                if self._file is None or not self._dirty:
+                    continue
+                try:
+                    self._file.flush()
+                except OSError as e:
+                    logger.warning(f"Tile trace flush failed: {e}")
+                self._dirty = False
+
+    @staticmethod
+    def _index(table: Dict[str, int], tag: bytes, name: str, data: bytearray) -> int:
+        index = table.get(name)
+        if index is None:
+            index = table[name] = len(table)
+            encoded = name.encode()[:0xFFFF]
+            data += tag + _NAME.pack(index, len(encoded)) + encoded
+        return index
+
+
+def read_trace(paths: Iterable[Path]) -> Iterator[TraceRecord]:
+    """
+    Relit une ou plusieurs traces dans l'ordre donné (ex: fichier.1 puis fichier).
+
+    Raises:
+        ValueError: Fichier qui n'est pas une trace de tuiles
+
+    Technical Notes:
+        - Enregistrement tronqué en fin de fichier (arrêt brutal) ignoré
+    """
+    for path in paths:
+        data = Path(path).read_bytes()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"Not a tile trace: {path}")
+        (started,) = _HEADER.unpack_from(data, len(MAGIC))
+        offset = len(MAGIC) + _HEADER.size
+        slides: Dict[int, str] = {}
+        clients: Dict[int, str] = {}
+        end = len(data)
+        while offset < end:
+            tag = data[offset:offset + 1]
+            offset += 1
+            if tag == b"T":
+                if offset + _TILE.size > end:
+                    break
+                elapsed_ms, slide, level, col, row, tile_size, client, size, flags = _TILE.unpack_from(data, offset)
+                offset += _TILE.size
+                yield TraceRecord(
+                    started + elapsed_ms / 1000, slides.get(slide, ""), level, col, row, tile_size,
+                    clients.get(client, ""), size, bool(flags & FLAG_HIT), bool(flags & FLAG_OUT_OF_BOUNDS)
+                )
+            elif tag in (b"S", b"C"):
+                if offset + _NAME.size > end:
+                    break
+                index, length = _NAME.unpack_from(data, offset)
+                offset += _NAME.size
+                if offset + length > end:
+                    break
+                name = data[offset:offset + length].decode()
+                offset += length
+                (slides if tag == b"S" else clients)[index] = name
+            else:
+                raise ValueError(f"Corrupt tile trace {path} at byte {offset - 1}")
+
+
+def _pseudonym(client: Optional[str]) -> str:
+    if not client:
+        return ""
+    return hashlib.blake2b(client.encode(), digest_size=6).hexdigest()
+
+
+# Instance globale (route des tuiles)
+tile_trace = TileTraceRecorder()